@@ -0,0 +1,182 @@
+# agent.py - remote probe agent
+#
+# Runs the same probes as the server (app/services/fetcher.py) from another
+# machine and pushes results in batches to /api/ingest/batch.
+#
+#   python agent.py --server http://127.0.0.1:5000 --token XXX --shard 0/3
+#
+# Several agents split the target list by id (--shard i/n). Set LOCAL_POLLING=0
+# on the server if it should stop probing itself.
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+from app.services import dnscache
+from app.services.dispatch import HostLimiter, host_key, stagger_offset
+from app.services.fetcher import probe_key, run_probe
+
+# results kept in memory while the server is unreachable
+MAX_PENDING = 50000
+
+
+def parse_shard(s: str) -> tuple[int, int]:
+    i, n = s.split("/", 1)
+    i, n = int(i), int(n)
+    if n < 1 or not (0 <= i < n):
+        raise argparse.ArgumentTypeError("shard must be i/n with 0 <= i < n")
+    return i, n
+
+
+def fetch_work(args) -> list[dict]:
+    shard, shards = args.shard
+    r = requests.get(
+        f"{args.server}/api/ingest/targets",
+        params={"shard": shard, "shards": shards},
+        headers=_auth(args),
+        timeout=30,
+    )
+    r.raise_for_status()
+    return r.json().get("targets", [])
+
+
+def probe_all(args, targets: list[dict]) -> list[dict]:
+    """
+    Same dispatch as the server poll cycle: hash offset in window + per-host caps,
+    and targets sharing the same probe URL get one request.
+    """
+    limiter = HostLimiter(args.host_concurrency, args.host_min_interval)
+    t0 = time.monotonic()
+
+    results: list[dict] = []
+    groups: dict[str, list[dict]] = {}
+    for t in targets:
+        if not t.get("probe", True):
+            continue  # circuit open on the server: no request, nothing to report
+        key = probe_key(t.get("probe_type") or "json", t["base_url"], t.get("stats_path") or "")
+        groups.setdefault(key, []).append(t)
+
+    def one(members: list[dict]) -> list[dict]:
+        t = members[0]
+        delay = t0 + stagger_offset(t["id"], t["base_url"], args.window) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        with limiter.slot(host_key(t["base_url"])):
+            try:
+                res = run_probe(
+                    t.get("probe_type") or "json", t["base_url"], t.get("stats_path") or "/api/stats",
+                    timeout_s=max(float(m.get("timeout_s") or 8) for m in members),
+                    retries=max(int(m.get("retries") or 0) for m in members),
+                )
+            except Exception:
+                res = {"ok": False, "reason": "probe_error"}
+        return [_item(m["id"], res) for m in members]
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="probe") as ex:
+        for items in ex.map(one, groups.values()):
+            results.extend(items)
+    return results
+
+
+def push(args, pending: list[dict]) -> list[dict]:
+    """Send pending results in batches; returns what could not be delivered."""
+    while pending:
+        batch = pending[: args.batch_size]
+        try:
+            r = requests.post(
+                f"{args.server}/api/ingest/batch",
+                json={"agent": args.name, "results": batch},
+                headers=_auth(args),
+                timeout=60,
+            )
+            r.raise_for_status()
+        except requests.RequestException as e:
+            print(f"[agent {args.name}] push failed ({e}); {len(pending)} result(s) kept for next cycle")
+            return pending[-MAX_PENDING:]
+
+        out = r.json()
+        if out.get("rejected"):
+            print(f"[agent {args.name}] rejected: {out['rejected']}")
+        pending = pending[len(batch):]
+    return pending
+
+
+def run_cycle(args, pending: list[dict]) -> list[dict]:
+    try:
+        targets = fetch_work(args)
+    except requests.RequestException as e:
+        print(f"[agent {args.name}] cannot load targets: {e}")
+        return pending
+
+    t = time.monotonic()
+    results = probe_all(args, targets)
+    print(f"[agent {args.name}] probed {len(results)} target(s) in {time.monotonic() - t:.1f}s")
+    return push(args, pending + results)
+
+
+def _item(target_id: int, res: dict) -> dict:
+    return {
+        "target_id": target_id,
+        "polled_at": datetime.now(timezone.utc).isoformat(),
+        "ok": bool(res.get("ok")),
+        "http_status": res.get("http_status"),
+        "latency_ms": res.get("latency_ms"),
+        "cpu_percent": res.get("cpu_percent"),
+        "mem_percent": res.get("mem_percent"),
+        "disk_percent": res.get("disk_percent"),
+        "swap_percent": res.get("swap_percent"),
+        "raw_json": res.get("raw_json"),
+        "reason": res.get("reason"),
+        "timings": res.get("timings") or {},
+    }
+
+
+def _auth(args) -> dict:
+    return {"Authorization": f"Bearer {args.token}", "User-Agent": f"DotStatus-agent/{args.name}"}
+
+
+def _sleep_until_next(interval_s: int):
+    # align to the interval (3600 => minute 0, same as the server cron)
+    now = time.time()
+    time.sleep(interval_s - (now % interval_s))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="DotStatus probe agent")
+    ap.add_argument("--server", default=os.getenv("AGENT_SERVER", "http://127.0.0.1:5000"))
+    ap.add_argument("--token", default=os.getenv("INGEST_TOKEN", ""))
+    ap.add_argument("--name", default=os.getenv("AGENT_NAME", os.uname().nodename if hasattr(os, "uname") else "agent"))
+    ap.add_argument("--shard", type=parse_shard, default=parse_shard(os.getenv("AGENT_SHARD", "0/1")))
+    ap.add_argument("--interval", type=int, default=3600, help="seconds between cycles (aligned)")
+    ap.add_argument("--window", type=float, default=float(os.getenv("POLL_WINDOW_S", "600")))
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--host-concurrency", type=int, default=2)
+    ap.add_argument("--host-min-interval", type=float, default=0.5)
+    ap.add_argument("--batch-size", type=int, default=200)
+    ap.add_argument("--dns-ttl", type=float, default=float(os.getenv("DNS_CACHE_TTL_S", "300")),
+                    help="DNS cache TTL when the record TTL is unknown (0 = no cache)")
+    ap.add_argument("--once", action="store_true", help="run one cycle now and exit")
+    args = ap.parse_args()
+
+    args.server = args.server.rstrip("/")
+    dnscache.configure(ttl_s=args.dns_ttl)
+    if not args.token:
+        print("Missing --token / INGEST_TOKEN")
+        sys.exit(2)
+
+    if args.once:
+        left = run_cycle(args, [])
+        sys.exit(1 if left else 0)
+
+    pending: list[dict] = []
+    while True:
+        pending = run_cycle(args, pending)
+        _sleep_until_next(args.interval)
+
+
+if __name__ == "__main__":
+    main()
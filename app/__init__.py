@@ -14,7 +14,8 @@ csrf = CSRFProtect()
 login_manager = LoginManager()
 login_manager.login_view = "owner.login"
 
-def create_app():
+def create_app(with_scheduler: bool = True):
+    """with_scheduler=False: no poller / startup poll (manage.py commands)."""
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(Config)
 
@@ -27,7 +28,13 @@ def create_app():
 
     with app.app_context():
         from . import models  # noqa
-        db.create_all()
+        from .services.schema import startup_lock, upgrade_schema
+        from .services import counters
+        counters.install(app)
+        with startup_lock():
+            db.create_all()
+            upgrade_schema()
+            counters.seed()
 
         # Optional seed target
         _seed_target_if_needed(app)
@@ -35,14 +42,27 @@ def create_app():
     # Register blueprints
     from .routes.public import bp as public_bp
     from .routes.owner import bp as owner_bp
+    from .routes.ingest import bp as ingest_bp, push_bp
+    csrf.exempt(ingest_bp)  # token auth, called by agents
+    csrf.exempt(push_bp)  # per-target token, called by pushing targets
     app.register_blueprint(public_bp)
     app.register_blueprint(owner_bp)
+    app.register_blueprint(ingest_bp)
+    app.register_blueprint(push_bp)
+
+    # Hashed static URLs (asset_url) + response compression
+    from .services import assets, dnscache, profiler
+    assets.init_app(app)
+    profiler.init_app(app)  # PROFILE_ENABLED=1 only
+    dnscache.init_app(app)
 
     # Start scheduler (avoid double-run in Flask reloader)
     from .services.scheduler import start_scheduler, poll_all
-    if (not app.debug) or (os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
+    with_scheduler = with_scheduler and app.config.get("RUN_SCHEDULER", True)
+    if with_scheduler and ((not app.debug) or (os.environ.get("WERKZEUG_RUN_MAIN") == "true")):
         start_scheduler(app)
-        poll_all(app)  # chạy 1 lần ngay lập tức
+        if app.config.get("LOCAL_POLLING", True):
+            poll_all(app, spread=False)  # chạy 1 lần ngay lập tức
 
 
     return app
@@ -9,6 +9,10 @@ class Target(db.Model):
     name = db.Column(db.String(120), nullable=False)
     base_url = db.Column(db.String(512), nullable=False)
     stats_path = db.Column(db.String(256), nullable=False, default="/api/stats")
+    # "json" (GET stats_path + parse) / "http_head" / "tcp" / "tls" - see services/fetcher.py PROBES
+    # "push": no outbound probe, target posts heartbeats to /api/push/<id> with push_token
+    probe_type = db.Column(db.String(20), nullable=False, default="json", server_default="json")
+    push_token = db.Column(db.String(64), nullable=True)
 
     enabled = db.Column(db.Boolean, nullable=False, default=True)
     public_click = db.Column(db.Boolean, nullable=False, default=True)
@@ -31,6 +35,12 @@ class Snapshot(db.Model):
     ok = db.Column(db.Boolean, nullable=False, default=False)
     http_status = db.Column(db.Integer, nullable=True)
     latency_ms = db.Column(db.Integer, nullable=True)
+    # latency breakdown (ms) when the probe reports it: DNS lookup (0 = cached) / TCP connect /
+    # TLS handshake / request sent -> response headers. NULL for push + circuit-open samples.
+    dns_ms = db.Column(db.Integer, nullable=True)
+    connect_ms = db.Column(db.Integer, nullable=True)
+    tls_ms = db.Column(db.Integer, nullable=True)
+    ttfb_ms = db.Column(db.Integer, nullable=True)
 
     cpu_percent = db.Column(db.Float, nullable=True)
     mem_percent = db.Column(db.Float, nullable=True)
@@ -42,7 +52,11 @@ class Snapshot(db.Model):
     target = db.relationship("Target", back_populates="snapshots")
 
     __table_args__ = (
-        db.Index("ix_snapshots_target_hour", "target_id", "hour_bucket"),
+        # covering: uptime / latency / bars / status / breaker read only these columns,
+        # never the table rows (raw_json). Checked by `manage.py plan-check`.
+        db.Index("ix_snapshots_target_hour_ok_latency", "target_id", "hour_bucket", "ok", "latency_ms"),
+        # DB viewer / CSV export across all targets (newest first / date range)
+        db.Index("ix_snapshots_hour", "hour_bucket"),
     )
 
 
@@ -62,5 +76,72 @@ class Event(db.Model):
     target = db.relationship("Target", back_populates="events")
 
     __table_args__ = (
-        db.Index("ix_events_target_started", "target_id", "started_at"),
+        # history paging + incident stats (state / ended_at read from the index)
+        db.Index("ix_events_target_started_state", "target_id", "started_at", "state", "ended_at"),
+        # dashboard "recent events" across all targets
+        db.Index("ix_events_started", "started_at"),
+    )
+
+
+class IngestKey(db.Model):
+    """Idempotency keys of accepted push heartbeats (pruned after PUSH_KEY_RETENTION_HOURS)."""
+    __tablename__ = "ingest_keys"
+
+    id = db.Column(db.Integer, primary_key=True)
+    target_id = db.Column(db.Integer, db.ForeignKey("targets.id", ondelete="CASCADE"), nullable=False)
+    key = db.Column(db.String(128), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("target_id", "key", name="uq_ingest_keys_target_key"),
+        db.Index("ix_ingest_keys_created", "created_at"),
+    )
+
+
+class LiveEvent(db.Model):
+    """
+    Notification cursor for the SSE stream.
+    Poller writes 1 row per change, every web worker tails the table by id.
+    """
+    __tablename__ = "live_events"
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    kind = db.Column(db.String(20), nullable=False)  # "snapshot" / "status" / "event"
+    target_id = db.Column(db.Integer, nullable=True)
+    payload = db.Column(db.Text, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_live_events_created", "created_at"),
+    )
+
+
+class Counter(db.Model):
+    """
+    Cached row counts / DB size for the owner DB page (no COUNT(*) per visit).
+    Row counts follow ORM inserts/deletes, written in batches per process (services/counters.py).
+    """
+    __tablename__ = "counters"
+
+    name = db.Column(db.String(40), primary_key=True)  # "targets" / "snapshots" / "events" / "db_bytes"
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class BackgroundJob(db.Model):
+    """Owner background jobs (services/jobs.py); in the DB so every web worker can report them."""
+    __tablename__ = "jobs"
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)  # "test_target" / "import_test" / "update_check"
+    status = db.Column(db.String(10), nullable=False, default="queued")  # queued / running / done / error
+    target_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON
+    error = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_jobs_created", "created_at"),
     )
@@ -0,0 +1,104 @@
+import hmac
+import json
+
+from flask import Blueprint, current_app, request, jsonify, abort
+from sqlalchemy.exc import IntegrityError
+
+from ..models import Target
+from ..services import ingest
+
+bp = Blueprint("ingest", __name__, url_prefix="/api/ingest")
+push_bp = Blueprint("push", __name__, url_prefix="/api/push")
+
+
+def _bearer_ok(token: str, allow_query: bool = False) -> bool:
+    """Authorization: Bearer <token>; ?token= only when allow_query (ends up in access/proxy logs)."""
+    if not token:
+        return False
+    auth = request.headers.get("Authorization", "")
+    given = auth[len("Bearer "):] if auth.startswith("Bearer ") else ""
+    if not given and allow_query:
+        given = request.args.get("token", "")
+    return bool(given) and hmac.compare_digest(given.encode("utf-8"), token.encode("utf-8"))
+
+
+def _authorized() -> bool:
+    """Bearer INGEST_TOKEN. Empty token => ingest API disabled."""
+    return _bearer_ok(current_app.config.get("INGEST_TOKEN") or "")
+
+
+@bp.before_request
+def _require_token():
+    if not _authorized():
+        abort(401)
+
+
+@bp.get("/targets")
+def agent_targets():
+    """/api/ingest/targets?shard=0&shards=3"""
+    shards = max(1, request.args.get("shards", 1, type=int))
+    shard = request.args.get("shard", 0, type=int)
+    if not (0 <= shard < shards):
+        abort(400)
+    return jsonify(ingest.agent_targets(current_app._get_current_object(), shard, shards))
+
+
+@bp.post("/batch")
+def batch():
+    """Body: {"agent": "name", "results": [...]} (see services/ingest.store_batch)."""
+    data = request.get_json(silent=True) or {}
+    items = data.get("results")
+    if not isinstance(items, list):
+        abort(400)
+    if len(items) > int(current_app.config.get("INGEST_MAX_BATCH", 1000)):
+        abort(413)
+
+    out = ingest.store_batch(current_app._get_current_object(), items)
+    return jsonify(out)
+
+
+# ---- Push mode: targets report themselves ----
+@push_bp.post("/<int:target_id>")
+def push(target_id: int):
+    """
+    POST /api/push/<id>   (Authorization: Bearer <push_token>;
+                           ?token= only with PUSH_QUERY_TOKEN=1, for clients that cannot set headers)
+      single : stats payload, e.g. {"cpu_percent": 12, "mem": {"percent": 40}}
+               optional header Idempotency-Key
+      batch  : {"heartbeats": [{"ts": "...", "key": "...", "stats": {...}}, ...]}
+    """
+    t = Target.query.get(target_id)
+    if not t or t.probe_type != "push" or not t.enabled:
+        abort(404)
+    if not _bearer_ok(t.push_token or "", allow_query=current_app.config.get("PUSH_QUERY_TOKEN", False)):
+        abort(401)
+
+    max_body = int(current_app.config.get("FETCH_MAX_BODY_BYTES", 256 * 1024))
+    if (request.content_length or 0) > max_body:
+        abort(413)
+    body = request.get_data(cache=False)
+    if len(body) > max_body:
+        abort(413)
+
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        abort(400)
+    if not isinstance(data, dict):
+        abort(400)
+
+    raw_body = None
+    if isinstance(data.get("heartbeats"), list):
+        beats = data["heartbeats"]
+        if len(beats) > int(current_app.config.get("INGEST_MAX_BATCH", 1000)):
+            abort(413)
+    else:
+        beats = [{"stats": data, "key": request.headers.get("Idempotency-Key"), "ok": data.get("ok", True)}]
+        raw_body = body.decode("utf-8", errors="replace")
+
+    try:
+        out = ingest.store_heartbeats(current_app._get_current_object(), t, beats, raw_body=raw_body)
+    except IntegrityError:
+        # still racing another request for the same keys: nothing stored, client resends
+        return jsonify({"error": "conflict, retry"}), 409
+    return jsonify(out)
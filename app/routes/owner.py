@@ -1,20 +1,24 @@
 import os
+import secrets
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
 from flask import (
     Blueprint, current_app, render_template, redirect, url_for,
-    request, flash, send_file, Response
+    request, flash, send_file, send_from_directory, Response, jsonify, abort, stream_with_context
 )
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField
+from flask_wtf.file import FileField, FileRequired
+from wtforms import StringField, PasswordField, SelectField
 from wtforms.validators import DataRequired, Length
 from werkzeug.security import check_password_hash
 from flask_login import login_user, logout_user, login_required, UserMixin
+from sqlalchemy import and_, or_
 
 from .. import db, login_manager
 from ..models import Target, Snapshot
-from ..services.scheduler import poll_target
+from ..services import archive, breaker, counters, jobs, live, profiler, targets_io, tsstore, updates
+from ..services.scheduler import test_target, test_targets, last_cycle_stats
 from ..services.updates import check_update
 
 bp = Blueprint("owner", __name__, url_prefix="/owner")
@@ -50,6 +54,17 @@ class TargetForm(FlaskForm):
     name = StringField("Name", validators=[DataRequired(), Length(max=120)])
     base_url = StringField("Base URL", validators=[DataRequired(), Length(max=512)])
     stats_path = StringField("Stats Path", validators=[DataRequired(), Length(max=256)])
+    probe_type = SelectField("Probe", choices=[
+        ("json", "JSON stats (GET + parse)"),
+        ("http_head", "HTTP HEAD"),
+        ("tcp", "TCP connect"),
+        ("tls", "TLS handshake"),
+        ("push", "Push heartbeat (target posts to us)"),
+    ], default="json")
+
+
+class ImportForm(FlaskForm):
+    file = FileField("File (.json / .csv)", validators=[FileRequired()])
 
 
 # ---- Login / Logout ----
@@ -87,7 +102,23 @@ def logout():
 def targets():
     form = TargetForm()
     targets_list = Target.query.order_by(Target.id.asc()).all()
-    return render_template("owner_targets.html", targets=targets_list, form=form)
+    job = jobs.get(request.args.get("job", ""))
+    return render_template(
+        "owner_targets.html",
+        targets=targets_list,
+        form=form,
+        cycle=last_cycle_stats(current_app),
+        job=job,
+    )
+
+
+@bp.get("/jobs/<job_id>")
+@login_required
+def job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
 
 
 @bp.post("/targets/add")
@@ -97,21 +128,38 @@ def targets_add():
     if not form.validate_on_submit():
         flash("Invalid data.", "bad")
         return redirect(url_for("owner.targets"))
+    error = targets_io.base_url_error(form.probe_type.data, form.base_url.data.strip().rstrip("/"))
+    if error:
+        flash(error, "bad")
+        return redirect(url_for("owner.targets"))
 
     t = Target(
         name=form.name.data.strip(),
         base_url=form.base_url.data.strip().rstrip("/"),
         stats_path=form.stats_path.data.strip(),
+        probe_type=form.probe_type.data,
         enabled=True,
     )
+    if t.probe_type == "push":
+        t.push_token = secrets.token_urlsafe(24)
     db.session.add(t)
+    db.session.flush()
+    live.publish("target", t.id, {"target_id": t.id, "change": "added"})
     db.session.commit()
 
-    # poll thử 1 lần ngay khi add (để lên xanh liền)
-    poll_target(current_app._get_current_object(), t.id, force=True)
+    if t.probe_type == "push":
+        flash(f"Push target added. POST heartbeats to /api/push/{t.id} (token in list).", "ok")
+        return redirect(url_for("owner.targets"))
+
+    # poll thử 1 lần ngay khi add (để lên xanh liền) - chạy nền, trang tự hỏi trạng thái
+    try:
+        job = jobs.submit(current_app._get_current_object(), "test_target", test_target, t.id, target_id=t.id)
+    except jobs.QueueFull:
+        flash("Target added. Test queue is full, it will be polled in the next cycle.", "ok")
+        return redirect(url_for("owner.targets"))
 
-    flash("Target added + tested.", "ok")
-    return redirect(url_for("owner.targets"))
+    flash("Target added, testing in background…", "ok")
+    return redirect(url_for("owner.targets", job=job.id))
 
 
 @bp.post("/targets/<int:target_id>/toggle")
@@ -119,6 +167,7 @@ def targets_add():
 def targets_toggle(target_id: int):
     t = Target.query.get_or_404(target_id)
     t.enabled = not bool(t.enabled)
+    live.publish("target", t.id, {"target_id": t.id, "change": "updated"})
     db.session.commit()
     flash("Updated.", "ok")
     return redirect(url_for("owner.targets"))
@@ -129,6 +178,7 @@ def targets_toggle(target_id: int):
 def targets_toggle_click(target_id: int):
     t = Target.query.get_or_404(target_id)
     t.public_click = not bool(t.public_click)
+    live.publish("target", t.id, {"target_id": t.id, "change": "updated"})
     db.session.commit()
     flash("Public click updated.", "ok")
     return redirect(url_for("owner.targets"))
@@ -139,68 +189,255 @@ def targets_toggle_click(target_id: int):
 def targets_delete(target_id: int):
     t = Target.query.get_or_404(target_id)
     db.session.delete(t)
+    live.publish("target", target_id, {"target_id": target_id, "change": "deleted"})
     db.session.commit()
+    breaker.forget(target_id)
+    tsstore.drop(current_app, target_id)
     flash("Deleted.", "ok")
     return redirect(url_for("owner.targets"))
 
 
+# ---- Bulk import / export ----
+@bp.get("/targets/export")
+@login_required
+def targets_export():
+    """
+    /owner/targets/export?format=json|csv
+    push tokens are not exported (new ones are issued on import)
+    """
+    rows = targets_io.export_rows()
+    if request.args.get("format") == "csv":
+        return Response(
+            targets_io.export_csv(rows),
+            mimetype="text/csv",
+            headers={"Content-Disposition": "attachment; filename=targets.csv"},
+        )
+    resp = jsonify({"targets": rows})
+    resp.headers["Content-Disposition"] = "attachment; filename=targets.json"
+    return resp
+
+
+@bp.get("/targets/import")
+@login_required
+def targets_import():
+    return render_template("owner_import.html", form=ImportForm(), results=None, job=None)
+
+
+@bp.post("/targets/import")
+@login_required
+def targets_import_post():
+    form = ImportForm()
+    if not form.validate_on_submit():
+        flash("Choose a .json or .csv file.", "bad")
+        return redirect(url_for("owner.targets_import"))
+
+    f = form.file.data
+    try:
+        rows = targets_io.parse_upload(f.filename or "", f.read())
+    except (ValueError, UnicodeDecodeError) as e:
+        flash(f"Cannot read file: {e}", "bad")
+        return redirect(url_for("owner.targets_import"))
+
+    results = targets_io.import_rows(rows)
+    # probe tất cả target mới 1 lần, song song trên pool (chạy nền)
+    ids = [r["target_id"] for r in results if r["status"] == "created" and r["probe_type"] != "push"]
+
+    job = None
+    if ids:
+        try:
+            job = jobs.submit(current_app._get_current_object(), "import_test", test_targets, ids)
+        except jobs.QueueFull:
+            flash("Test queue is full, new targets will be polled in the next cycle.", "bad")
+
+    created = sum(1 for r in results if r["status"] == "created")
+    flash(f"Imported {created} of {len(results)} row(s).", "ok" if created else "bad")
+    return render_template("owner_import.html", form=ImportForm(), results=results, job=job)
+
+
+# ---- Profiles (services/profiler.py) ----
+@bp.get("/profiles")
+@login_required
+def profiles_page():
+    app = current_app._get_current_object()
+    return render_template(
+        "owner_profiles.html",
+        profiles=profiler.list_profiles(app),
+        enabled=profiler.enabled(app),
+        request_ms=app.config.get("PROFILE_REQUEST_MS"),
+        poll_budget_s=profiler.poll_budget_s(app),
+    )
+
+
+@bp.get("/profiles/<name>")
+@login_required
+def profile_download(name: str):
+    if not profiler.is_profile_name(name):
+        abort(404)
+    return send_from_directory(profiler.profile_dir(current_app), name, as_attachment=True, mimetype="text/plain")
+
+
+@bp.post("/profiles/clear")
+@login_required
+def profiles_clear():
+    for p in profiler.list_profiles(current_app):
+        try:
+            os.remove(os.path.join(profiler.profile_dir(current_app), p["name"]))
+        except OSError:
+            pass
+    flash("Profiles deleted.", "ok")
+    return redirect(url_for("owner.profiles_page"))
+
+
 # ---- Update checker (GitHub latest release) ----
 @bp.get("/update")
 @login_required
 def update_page():
+    """Served from the release cache; a stale/empty cache is refreshed in the background."""
+    app = current_app._get_current_object()
     info = None
     err = None
+    configured = True
     try:
-        info = check_update(current_app)
+        info = check_update(app)
         if info is None:
+            configured = False
             err = 'Missing GITHUB_REPO env. Set: GITHUB_REPO="TroLyAmazon/VietUptime"'
-    except Exception as e:
-        err = str(e)
-    return render_template("owner_update.html", info=info, err=err)
+    except RuntimeError as e:
+        err = str(e)  # nothing cached yet
 
+    if configured and updates.is_stale(app):
+        _submit_update_check(app, force=False)
+    return render_template("owner_update.html", info=info, err=err, state=updates.cache_state())
+
+
+@bp.post("/update/refresh")
+@login_required
+def update_refresh():
+    if _submit_update_check(current_app._get_current_object(), force=True):
+        flash("Checking GitHub in background, reload in a moment.", "ok")
+    else:
+        flash("Background queue is full, try again later.", "bad")
+    return redirect(url_for("owner.update_page"))
+
+
+def _submit_update_check(app, force: bool) -> bool:
+    try:
+        jobs.submit(app, "update_check", updates.refresh, force)
+        return True
+    except jobs.QueueFull:
+        return False
 
 
 # ---- DB viewer / export ----
+DB_PAGE_SIZE = 100
+
+
 @bp.get("/db")
 @login_required
 def db_page():
-    uri = current_app.config["SQLALCHEMY_DATABASE_URI"]
-    db_path = None
-    if uri.startswith("sqlite:///"):
-        rel = uri.replace("sqlite:///", "", 1)
-        db_path = os.path.join(current_app.instance_path, rel)
-
-    size = os.path.getsize(db_path) if (db_path and os.path.exists(db_path)) else 0
-    targets_count = Target.query.count()
-    snaps_count = Snapshot.query.count()
-
-    latest_snaps = (
-        Snapshot.query
-        .order_by(Snapshot.hour_bucket.desc())
-        .limit(100)
-        .all()
+    """
+    /owner/db?target_id=1&status=down&start=2026-01-01&end=2026-01-22&before=<cursor>
+    Keyset pagination on (hour_bucket, id) desc, columns only (raw_json on demand).
+    Counts / size come from the counters cache.
+    """
+    filters = {
+        "target_id": request.args.get("target_id", type=int),
+        "status": request.args.get("status", "").strip(),
+        "start": request.args.get("start", "").strip(),
+        "end": request.args.get("end", "").strip(),
+    }
+    limit = min(max(request.args.get("limit", DB_PAGE_SIZE, type=int), 1), 500)
+
+    q = db.session.query(
+        Snapshot.id, Snapshot.target_id, Snapshot.hour_bucket, Snapshot.polled_at,
+        Snapshot.ok, Snapshot.http_status, Snapshot.latency_ms,
     )
+    if filters["target_id"]:
+        q = q.filter(Snapshot.target_id == filters["target_id"])
+    if filters["status"] in ("up", "down"):
+        q = q.filter(Snapshot.ok.is_(filters["status"] == "up"))
+    try:
+        if filters["start"]:
+            start_d = datetime.fromisoformat(filters["start"]).date()
+            q = q.filter(Snapshot.hour_bucket >= datetime.combine(start_d, datetime.min.time()))
+        if filters["end"]:
+            end_d = datetime.fromisoformat(filters["end"]).date()
+            q = q.filter(Snapshot.hour_bucket < datetime.combine(end_d, datetime.min.time()) + timedelta(days=1))
+        before = _parse_cursor(request.args.get("before", ""))
+    except ValueError:
+        flash("Invalid filter.", "bad")
+        return redirect(url_for("owner.db_page"))
+
+    if before:
+        hb, sid = before
+        q = q.filter(or_(
+            Snapshot.hour_bucket < hb,
+            and_(Snapshot.hour_bucket == hb, Snapshot.id < sid),
+        ))
+
+    rows = q.order_by(Snapshot.hour_bucket.desc(), Snapshot.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = f"{last.hour_bucket.isoformat()}~{last.id}"
+
+    names = dict(db.session.query(Target.id, Target.name).all())
+    args = {k: v for k, v in filters.items() if v}
 
     return render_template(
         "owner_db.html",
-        db_path=db_path,
-        db_size=size,
-        targets_count=targets_count,
-        snaps_count=snaps_count,
-        latest_snaps=latest_snaps,
+        db_path=_sqlite_path(),
+        db_url=db.engine.url.render_as_string(hide_password=True),
+        counts=counters.get_all(),
+        archived=archive.summary(),
+        snaps=rows,
+        names=names,
+        filters=filters,
+        next_url=url_for("owner.db_page", before=next_cursor, **args) if next_cursor else None,
+        first_url=url_for("owner.db_page", **args),
+        paged=bool(before),
     )
 
 
+@bp.get("/db/snapshots/<int:snapshot_id>/raw")
+@login_required
+def snapshot_raw(snapshot_id: int):
+    raw = db.session.query(Snapshot.raw_json).filter(Snapshot.id == snapshot_id).scalar()
+    return Response(raw or "", mimetype="text/plain")
+
+
+@bp.post("/db/recount")
+@login_required
+def db_recount():
+    counters.seed(force=True)
+    flash("Counts refreshed.", "ok")
+    return redirect(url_for("owner.db_page"))
+
+
+def _sqlite_path() -> str | None:
+    """File of the SQLite DB (Flask-SQLAlchemy already made it absolute), None for server databases."""
+    url = db.engine.url
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        return None
+    return url.database
+
+
+def _parse_cursor(s: str):
+    if not s:
+        return None
+    hb, _, sid = s.partition("~")
+    return datetime.fromisoformat(hb), int(sid)
+
+
 @bp.get("/db/export")
 @login_required
 def db_export():
-    uri = current_app.config["SQLALCHEMY_DATABASE_URI"]
-    if not uri.startswith("sqlite:///"):
-        flash("Export only supported for SQLite.", "bad")
+    db_path = _sqlite_path()
+    if db_path is None:
+        flash("Server database: back up with pg_dump or `python manage.py db-copy --to backup.sqlite`.", "bad")
         return redirect(url_for("owner.db_page"))
 
-    rel = uri.replace("sqlite:///", "", 1)
-    db_path = os.path.join(current_app.instance_path, rel)
     if not os.path.exists(db_path):
         flash("DB not found.", "bad")
         return redirect(url_for("owner.db_page"))
@@ -214,9 +451,11 @@ def snapshots_csv():
     """
     /owner/db/snapshots.csv?target_id=1&start=2026-01-01&end=2026-01-22
     dates are in Asia/Bangkok (day boundaries)
+    archived months (cold storage) come first when the range reaches them
     """
     tz = ZoneInfo(current_app.config["TIMEZONE"])
     q = Snapshot.query
+    start_dt = end_dt = None
 
     target_id = request.args.get("target_id", type=int)
     if target_id:
@@ -235,31 +474,42 @@ def snapshots_csv():
         end_dt = (datetime.combine(end_d, datetime.min.time(), tzinfo=tz) + timedelta(days=1)).replace(tzinfo=None)
         q = q.filter(Snapshot.hour_bucket < end_dt)
 
-    q = q.order_by(Snapshot.hour_bucket.asc()).limit(200000)
+    max_rows = 200000
+    q = q.order_by(Snapshot.hour_bucket.asc())
+    horizon = archive.horizon()
+    archived = horizon is not None and (start_dt is None or start_dt < horizon)
+
+    header = [
+        "target_id", "hour_bucket", "polled_at", "ok", "http_status", "latency_ms",
+        "cpu_percent", "mem_percent", "disk_percent", "swap_percent",
+        "dns_ms", "connect_ms", "tls_ms", "ttfb_ms",
+    ]
+
+    def line(get):
+        row = ["" if get(c) is None else str(get(c)) for c in header]
+        row[3] = "1" if get("ok") else "0"
+        return ",".join(row) + "\n"
 
     def generate():
-        header = [
-            "target_id", "hour_bucket", "polled_at", "ok", "http_status", "latency_ms",
-            "cpu_percent", "mem_percent", "disk_percent", "swap_percent"
-        ]
         yield ",".join(header) + "\n"
-        for s in q.all():
-            row = [
-                str(s.target_id),
-                s.hour_bucket.isoformat(),
-                s.polled_at.isoformat(),
-                "1" if s.ok else "0",
-                "" if s.http_status is None else str(s.http_status),
-                "" if s.latency_ms is None else str(s.latency_ms),
-                "" if s.cpu_percent is None else str(s.cpu_percent),
-                "" if s.mem_percent is None else str(s.mem_percent),
-                "" if s.disk_percent is None else str(s.disk_percent),
-                "" if s.swap_percent is None else str(s.swap_percent),
-            ]
-            yield ",".join(row) + "\n"
+        n = 0
+        if archived:
+            end = horizon if end_dt is None else min(end_dt, horizon)
+            for r in archive.iter_rows(start_dt, end, target_id):
+                if n >= max_rows:
+                    return
+                n += 1
+                yield line(r.get)
+        for s in q.limit(max_rows - n).yield_per(1000):
+            yield line(lambda c: _csv_value(s, c))
 
     return Response(
-        generate(),
+        stream_with_context(generate()),
         mimetype="text/csv",
         headers={"Content-Disposition": "attachment; filename=snapshots.csv"},
     )
+
+
+def _csv_value(s: Snapshot, col: str):
+    v = getattr(s, col)
+    return v.isoformat() if isinstance(v, datetime) else v
@@ -1,8 +1,11 @@
-from flask import Blueprint, current_app, render_template, jsonify, abort
+from flask import Blueprint, current_app, render_template, jsonify, abort, request, Response
+from datetime import datetime, timedelta
+from types import SimpleNamespace
 from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
 
 from ..models import Target, Event
-from ..services import metrics
+from ..services import assets, board as status_board, embeds, metrics, live
 
 bp = Blueprint("public", __name__)
 
@@ -14,54 +17,354 @@ def _host_only(url: str) -> str:
     return host.rstrip("/")
 
 
+CARDS_PAGE_SIZE = 24
+
+
 @bp.get("/")
 def index():
+    """
+    Shell only: summary header + chart + events (from the status board when fresh,
+    else 1 aggregate query + 3 small ones). Service cards are loaded page by page from /api/cards,
+    the chart <select> gets its options from those pages (only the default target is rendered here).
+    """
     tz = current_app.config["TIMEZONE"]
-    targets = Target.query.order_by(Target.id.asc()).all()
-
-    cards = []
-    for t in targets:
-        last = metrics.get_latest_snapshot(t.id)
-
-        cards.append({
-            "target": t,
-            "host": _host_only(t.base_url),
-            "clickable": bool(getattr(t, "public_click", True)),
-            "href": t.base_url,
-
-            "last": last,
-            "uptime_24h": metrics.uptime_percent(t.id, 24, tz),
-            "uptime_7d": metrics.uptime_percent(t.id, 24 * 7, tz),
-            "uptime_30d": metrics.uptime_percent(t.id, 24 * 30, tz),
-            "uptime_90d": metrics.uptime_percent(t.id, 24 * 90, tz),
-            "bars_90d": metrics.bars_90d(t.id, tz),
-        })
-
-    events = (
-        Event.query
-        .order_by(Event.started_at.desc())
-        .limit(20)
-        .all()
-    )
+    board = status_board.current()
+    if board is not None:
+        # first enabled target, else the first one
+        default = next((c for c in board["targets"] if c["enabled"]), None) or next(iter(board["targets"]), None)
+        default = SimpleNamespace(id=default["id"], name=default["name"], enabled=default["enabled"]) if default else None
+        events = [_board_event(e) for e in board["events"]]
+        summary = board["summary"]
+    else:
+        q = Target.query.with_entities(Target.id, Target.name, Target.enabled)
+        default = (
+            q.filter(Target.enabled.is_(True)).order_by(Target.id.asc()).first()
+            or q.order_by(Target.id.asc()).first()
+        )
 
-    enabled_targets = [t for t in targets if t.enabled]
-    default_target_id = enabled_targets[0].id if enabled_targets else (targets[0].id if targets else None)
+        events = (
+            Event.query
+            .order_by(Event.started_at.desc())
+            .limit(20)
+            .all()
+        )
+        summary = metrics.status_summary()
 
+    status = request.args.get("status", "")
     return render_template(
         "index.html",
-        cards=cards,
+        summary=summary,
+        status=status if status in ("up", "down", "unknown") else "",
+        page_size=CARDS_PAGE_SIZE,
         events=events,
         tz=tz,
-        default_target_id=default_target_id,
-        targets=targets,
+        default_target=default,
+    )
+
+
+def _board_event(e: dict) -> SimpleNamespace:
+    """Board event -> same attributes the template reads from an Event row."""
+    return SimpleNamespace(
+        id=e["id"],
+        target_id=e["target_id"],
+        target=SimpleNamespace(name=e["target_name"]) if e["target_name"] else None,
+        started_at=datetime.fromisoformat(e["started_at"]),
+        ended_at=datetime.fromisoformat(e["ended_at"]) if e["ended_at"] else None,
+        reason=e["reason"],
+        http_status=e["http_status"],
     )
 
 
+@bp.get("/api/cards")
+def api_cards():
+    """
+    /api/cards?status=up|down|unknown&after=<last target id>&limit=24
+    -> {"cards": [...], "next": <after for the next page> | null, "summary": {...} (first page only)}
+    Served from the status board when it is fresh (no DB query).
+    """
+    tz = current_app.config["TIMEZONE"]
+    status = request.args.get("status", "")
+    after = request.args.get("after", 0, type=int)
+    limit = min(max(request.args.get("limit", CARDS_PAGE_SIZE, type=int), 1), 100)
+
+    board = status_board.current()
+    if board is not None:
+        entries, more = status_board.cards(board, status=status, after=after, limit=limit)
+        cards = [
+            _card(e["id"], e["name"], e["enabled"], e["base_url"], e["public_click"], e["status"], e["last"],
+                  {"uptime": e["uptime"], "bars_90d": status_board.bars(board, e)})
+            for e in entries
+        ]
+        payload = {"cards": cards, "next": entries[-1]["id"] if (more and entries) else None}
+        if not after:
+            payload["summary"] = board["summary"]
+        return jsonify(payload)
+
+    rows = metrics.card_page(status=status, after=after, limit=limit + 1)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    stats = metrics.card_stats([r.id for r in rows], tz)
+
+    cards = []
+    for r in rows:
+        last = None if r.status == "unknown" else {
+            "ok": bool(r.ok),
+            "latency_ms": r.latency_ms,
+            "hour_bucket": r.hour_bucket.isoformat() if r.hour_bucket else None,
+        }
+        cards.append(_card(r.id, r.name, r.enabled, r.base_url, r.public_click, r.status, last, stats[r.id]))
+
+    payload = {"cards": cards, "next": rows[-1].id if (more and rows) else None}
+    if not after:
+        payload["summary"] = metrics.status_summary()
+    return jsonify(payload)
+
+
+def _card(tid, name, enabled, base_url, public_click, status, last, stats) -> dict:
+    return {
+        "id": tid,
+        "name": name,
+        "enabled": bool(enabled),
+        "host": _host_only(base_url),
+        "href": base_url if public_click else None,
+        "status": status,
+        "last": last,
+        **stats,
+    }
+
+
+@bp.get("/api/status")
+def api_status():
+    """
+    Compact current status of every target: summary, newest sample, uptime windows, open incident.
+    From the status board (ETag = board version, 304 until something changes); otherwise built
+    from SQL at most once per BOARD_FALLBACK_TTL_S per process (status_board.fallback).
+    """
+    board = status_board.current()
+    fresh = board is not None
+    if not fresh:
+        board = status_board.fallback(current_app._get_current_object())
+    else:
+        etag = f"board-{board['version']}"
+        if assets.etag_matches(etag):
+            return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    resp = jsonify({
+        "version": board["version"] if fresh else None,
+        "built_at": board["built_at"],
+        "summary": board["summary"],
+        "targets": [
+            {
+                "id": e["id"],
+                "name": e["name"],
+                "status": e["status"],
+                "last": e["last"],
+                "uptime": e["uptime"],
+                "incident": e["incident"],
+            }
+            for e in board["targets"]
+        ],
+    })
+    if fresh:
+        resp.set_etag(etag)
+    return resp
+
+
 @bp.get("/api/target/<int:target_id>/latency")
 def api_latency(target_id: int):
     tz = current_app.config["TIMEZONE"]
     t = Target.query.get(target_id)
     if not t:
         abort(404)
-    payload = metrics.latency_series(target_id, hours=48, tz_name=tz)
+    # ?phases=1 => + dns / connect / tls / ttfb / total per point
+    phases = request.args.get("phases", "") in ("1", "true")
+    payload = metrics.latency_series(target_id, hours=48, tz_name=tz, phases=phases)
     return jsonify(payload)
+
+
+@bp.get("/api/target/<int:target_id>/events")
+def api_events(target_id: int):
+    """
+    /api/target/1/events?limit=50&before=<cursor>
+    -> {"events": [...newest first], "next": <cursor for older events> | null}
+    """
+    if not Target.query.get(target_id):
+        abort(404)
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 200)
+    before = None
+    cursor = request.args.get("before", "")
+    if cursor:
+        try:
+            started, _, eid = cursor.partition("~")
+            before = (datetime.fromisoformat(started), int(eid))
+        except ValueError:
+            abort(400)
+
+    rows = metrics.event_page(target_id, before=before, limit=limit + 1)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        "events": [
+            {
+                "id": e.id,
+                "started_at": e.started_at.isoformat(),
+                "ended_at": e.ended_at.isoformat() if e.ended_at else None,
+                "reason": e.reason,
+                "http_status": e.http_status,
+            }
+            for e in rows
+        ],
+        "next": f"{rows[-1].started_at.isoformat()}~{rows[-1].id}" if (more and rows) else None,
+    })
+
+
+@bp.get("/api/target/<int:target_id>/incidents")
+def api_incidents(target_id: int):
+    """
+    /api/target/1/incidents            -> windows 1, 7, 30, 90 days
+    /api/target/1/incidents?days=30    -> one window
+    incidents, downtime_min, mttr_min, mtbf_min per window.
+    """
+    tz = current_app.config["TIMEZONE"]
+    if not Target.query.get(target_id):
+        abort(404)
+    days = request.args.get("days", type=int)
+    windows = [min(max(days, 1), 3650)] if days else [1, 7, 30, 90]
+    return jsonify({"target_id": target_id, "windows": [metrics.incident_stats(target_id, d, tz) for d in windows]})
+
+
+@bp.get("/api/target/<int:target_id>/uptime")
+def api_uptime(target_id: int):
+    """
+    /api/target/1/uptime?start=2024-01-01&end=2024-12-31   (days in TIMEZONE, end inclusive)
+    Long ranges include archived months (services/archive.py).
+    """
+    if not Target.query.get(target_id):
+        abort(404)
+    try:
+        start = datetime.fromisoformat(request.args.get("start", "")).date()
+        end = datetime.fromisoformat(request.args.get("end", "")).date()
+    except ValueError:
+        abort(400)
+    if end < start:
+        abort(400)
+    s = datetime(start.year, start.month, start.day)
+    e = datetime(end.year, end.month, end.day) + timedelta(days=1)
+    out = metrics.uptime_range(target_id, s, e)
+    return jsonify({"target_id": target_id, "start": start.isoformat(), "end": end.isoformat(), **out})
+
+
+# ---- Embeds: SVG images for other pages ----
+@bp.get("/embed/<int:target_id>/uptime.svg")
+def embed_uptime(target_id: int):
+    """90 day bars."""
+    board = status_board.current()
+    return _embed(
+        target_id, "bars",
+        lambda: embeds.uptime_bars(_target_stats(target_id, board)["bars_90d"]),
+        board=board,
+    )
+
+
+@bp.get("/embed/<int:target_id>/latency.svg")
+def embed_latency(target_id: int):
+    """/embed/1/latency.svg?hours=48 (max 168) - latency sparkline."""
+    hours = min(max(request.args.get("hours", 48, type=int), 1), 168)
+    tz = current_app.config["TIMEZONE"]
+    return _embed(
+        target_id, f"latency{hours}",
+        lambda: embeds.sparkline(metrics.latency_series(target_id, hours=hours, tz_name=tz)["values"]),
+    )
+
+
+@bp.get("/embed/<int:target_id>/badge.svg")
+def embed_badge(target_id: int):
+    """/embed/1/badge.svg?window=30d (24h / 7d / 30d / 90d) - uptime badge."""
+    window = request.args.get("window", "30d")
+    if window not in metrics.UPTIME_WINDOWS:
+        abort(400)
+    board = status_board.current()
+
+    def render():
+        pct = _target_stats(target_id, board)["uptime"][window]
+        if pct is None:
+            return embeds.badge(f"uptime {window}", "—", "unk")
+        return embeds.badge(f"uptime {window}", f"{pct}%", metrics._classify(pct))
+
+    return _embed(target_id, f"badge{window}", render, board=board)
+
+
+def _embed(target_id: int, kind: str, render, board: dict | None = None) -> Response:
+    """
+    ETag = newest poll of the target + current hour (uptime windows / bars move each hour),
+    304 when unchanged; the SVG itself is rendered once per ETag (services/embeds.py).
+    Drawn from the board: the poll the board entry was built from (it catches up a few
+    seconds after the DB), so polls of other targets do not change this ETag.
+    """
+    if not Target.query.get(target_id):
+        abort(404)
+    entry = _board_entry(target_id, board)
+    if entry is not None:
+        last = entry["last"] and (entry["last"].get("polled_at") or entry["last"]["hour_bucket"])
+        last = f"b{last}" if last else "none"
+    else:
+        last = metrics.last_poll(target_id)
+        last = last.isoformat() if last else "none"
+    hour = datetime.now(ZoneInfo(current_app.config["TIMEZONE"]))
+    etag = f"{kind}-{target_id}-{last}-{hour:%Y%m%d%H}"
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": f"public, max-age={int(current_app.config.get('EMBED_MAX_AGE_S', 60))}",
+        "Access-Control-Allow-Origin": "*",
+    }
+    if assets.etag_matches(etag):
+        return Response(status=304, headers=headers)
+    return Response(embeds.cached(etag, render), mimetype="image/svg+xml", headers=headers)
+
+
+def _target_stats(target_id: int, board: dict | None) -> dict:
+    """{"uptime": {...}, "bars_90d": [...]} from the status board, or 2 grouped queries."""
+    entry = _board_entry(target_id, board)
+    if entry is not None:
+        return {"uptime": entry["uptime"], "bars_90d": status_board.bars(board, entry)}
+    return metrics.card_stats([target_id], current_app.config["TIMEZONE"])[target_id]
+
+
+def _board_entry(target_id: int, board: dict | None) -> dict | None:
+    if board is None:
+        return None
+    return next((e for e in board["targets"] if e["id"] == target_id), None)
+
+
+@bp.get("/api/stream")
+def api_stream():
+    """
+    Server-Sent Events: snapshot / status / event messages pushed by the poller.
+    Reconnect resumes from the Last-Event-ID header (or ?last_id=).
+    """
+    app = current_app._get_current_object()
+    hub = live.get_hub(app)
+    heartbeat = int(app.config.get("LIVE_HEARTBEAT_S", 15))
+
+    last_id = request.headers.get("Last-Event-ID", type=int)
+    if last_id is None:
+        last_id = request.args.get("last_id", type=int)
+    if last_id is None:
+        last_id = hub.cursor
+
+    def generate():
+        last, seq = last_id, None
+        yield f"retry: {heartbeat * 1000}\n\n"
+        while True:
+            msgs, last, seq = hub.wait(last, timeout=heartbeat, seq=seq)
+            if not msgs:
+                yield ": ping\n\n"
+                continue
+            for m in msgs:
+                yield live.format_sse(m)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,294 @@
+# app/services/archive.py
+"""
+Cold storage for old snapshots (ARCHIVE_AFTER_DAYS > 0).
+
+Whole months older than the horizon are moved out of the live DB into
+    <ARCHIVE_DIR>/<YYYY-MM>.jsonl.gz   1 snapshot per line (all columns), sorted by hour_bucket
+    <ARCHIVE_DIR>/index.json           per month: file, rows, per target rows/ok per day
+The index answers uptime over archived days without opening a file; only
+partial days (hour windows) and CSV export read the month files.
+Order: file written (tmp + replace) -> index -> rows deleted from the DB,
+so a crash in between only means the month is merged again next run (dedup on id).
+"""
+import gzip
+import heapq
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+
+COLUMNS = (
+    "id", "target_id", "hour_bucket", "polled_at", "ok", "http_status", "latency_ms",
+    "cpu_percent", "mem_percent", "disk_percent", "swap_percent", "raw_json",
+    "dns_ms", "connect_ms", "tls_ms", "ttfb_ms",
+)
+# dashboards read up to 90 days: keep those in the live DB
+MIN_AFTER_DAYS = 100
+# ids per DELETE ... WHERE id IN (...) (SQLite caps bound parameters)
+DELETE_CHUNK = 500
+
+_lock = threading.Lock()
+_index_cache: dict = {}  # root -> (mtime, index)
+
+
+def enabled(app=None) -> bool:
+    app = app or current_app
+    return int(app.config.get("ARCHIVE_AFTER_DAYS", 0)) > 0
+
+
+def horizon(app=None) -> datetime | None:
+    """Everything before this (naive local hour_bucket) lives in the archive, None = nothing archived."""
+    through = load_index(app).get("through")
+    return datetime.fromisoformat(through) if through else None
+
+
+def load_index(app=None) -> dict:
+    app = app or current_app
+    root = _root(app)
+    path = os.path.join(root, "index.json")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {"through": None, "months": {}}
+    with _lock:
+        cached = _index_cache.get(root)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    with _lock:
+        _index_cache[root] = (mtime, index)
+    return index
+
+
+def summary(app=None) -> dict:
+    """Owner DB page: months / rows / bytes on disk."""
+    months = load_index(app)["months"]
+    return {
+        "months": len(months),
+        "rows": sum(m["rows"] for m in months.values()),
+        "bytes": sum(m["bytes"] for m in months.values()),
+        "first": min(months, default=None),
+        "last": max(months, default=None),
+    }
+
+
+# ---- write ----
+def cutoff(app, now: datetime | None = None) -> datetime:
+    """First day of the month containing (today - ARCHIVE_AFTER_DAYS): older months are archived."""
+    days = max(int(app.config.get("ARCHIVE_AFTER_DAYS", 0)), MIN_AFTER_DAYS)
+    now = now or datetime.now(ZoneInfo(app.config.get("TIMEZONE", "Asia/Bangkok"))).replace(tzinfo=None)
+    d = (now - timedelta(days=days)).date()
+    return datetime(d.year, d.month, 1)
+
+
+def run(app, dry_run: bool = False) -> list[dict]:
+    """
+    Archive every month before cutoff() that still has rows in the DB (inside app context).
+    Returns [{"month", "moved", "rows"}] - moved = rows deleted from the DB, rows = total in the file.
+    """
+    from sqlalchemy import func
+
+    from .. import db
+    from ..models import Snapshot
+
+    end = cutoff(app)
+    first = db.session.query(func.min(Snapshot.hour_bucket)).filter(Snapshot.hour_bucket < end).scalar()
+    out = []
+    if first is None:
+        return out
+
+    month = datetime(first.year, first.month, 1)
+    while month < end:
+        nxt = _next_month(month)
+        n = (
+            db.session.query(func.count(Snapshot.id))
+            .filter(Snapshot.hour_bucket >= month, Snapshot.hour_bucket < nxt)
+            .scalar()
+        )
+        if n:
+            if dry_run:
+                out.append({"month": month.strftime("%Y-%m"), "moved": n, "rows": None})
+            else:
+                out.append(_archive_month(app, month, nxt))
+        month = nxt
+
+    if out and not dry_run:
+        from . import tsstore
+
+        tsstore.trim(app, end)
+    return out
+
+
+def _archive_month(app, start: datetime, end: datetime) -> dict:
+    from .. import db
+    from ..models import Snapshot
+    from . import counters
+
+    root = _root(app)
+    os.makedirs(root, exist_ok=True)
+    key = start.strftime("%Y-%m")
+    path = os.path.join(root, f"{key}.jsonl.gz")
+
+    month = (Snapshot.hour_bucket >= start, Snapshot.hour_bucket < end)
+    q = (
+        db.session.query(*[getattr(Snapshot, c) for c in COLUMNS])
+        .filter(*month)
+        .order_by(Snapshot.hour_bucket.asc(), Snapshot.target_id.asc(), Snapshot.id.asc())
+    )
+    written: list[int] = []  # only these are deleted (PostgreSQL: a late commit may sit below them)
+
+    def live():
+        for r in q.yield_per(5000):
+            written.append(r.id)
+            yield _encode(r)
+
+    # merge with an existing file (late rows / rerun after a crash): same id = same row,
+    # the DB copy wins (it may have been updated since)
+    old = iter(())
+    if os.path.exists(path):
+        in_db = {i for (i,) in db.session.query(Snapshot.id).filter(*month)}
+        old = (r for r in _read_file(path) if r["id"] not in in_db)
+    merged = heapq.merge(old, live(), key=lambda r: (r["hour_bucket"], r["target_id"], r["id"]))
+
+    stats: dict[str, dict] = {}
+    rows = 0
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=9) as f:
+        for r in merged:
+            f.write(json.dumps(r, separators=(",", ":")) + "\n")
+            rows += 1
+            t = stats.setdefault(str(r["target_id"]), {"rows": 0, "ok": 0, "days": {}})
+            day = t["days"].setdefault(r["hour_bucket"][:10], [0, 0])
+            t["rows"] += 1
+            day[0] += 1
+            if r["ok"]:
+                t["ok"] += 1
+                day[1] += 1
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+    index = json.loads(json.dumps(load_index(app)))  # copy, the cached one is shared
+    index["months"][key] = {
+        "file": os.path.basename(path),
+        "rows": rows,
+        "bytes": os.path.getsize(path),
+        "targets": stats,
+    }
+    through = index.get("through")
+    if not through or datetime.fromisoformat(through) < end:
+        index["through"] = end.isoformat()
+    _save_index(app, index)
+
+    # bulk delete skips the ORM flush hooks: adjust the cached count in the same transaction
+    moved = 0
+    for i in range(0, len(written), DELETE_CHUNK):
+        moved += (
+            db.session.query(Snapshot)
+            .filter(Snapshot.id.in_(written[i:i + DELETE_CHUNK]))
+            .delete(synchronize_session=False)
+        )
+    counters.adjust("snapshots", -moved)
+    db.session.commit()
+    app.logger.info("archive: %s moved %d row(s), %d in file", key, moved, rows)
+    return {"month": key, "moved": moved, "rows": rows}
+
+
+def _save_index(app, index: dict):
+    path = os.path.join(_root(app), "index.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ---- read ----
+def iter_rows(start: datetime | None = None, end: datetime | None = None,
+              target_id: int | None = None, app=None):
+    """Archived snapshots (dicts, same keys as COLUMNS) with start <= hour_bucket < end, oldest first."""
+    app = app or current_app
+    index = load_index(app)
+    lo = start.isoformat() if start else ""
+    hi = end.isoformat() if end else "~"
+    tkey = str(target_id) if target_id else None
+    for key in sorted(index["months"]):
+        m = index["months"][key]
+        m_start = datetime.strptime(key, "%Y-%m")
+        if (end and m_start >= end) or (start and _next_month(m_start) <= start):
+            continue
+        if tkey and tkey not in m["targets"]:
+            continue
+        for r in _read_file(os.path.join(_root(app), m["file"])):
+            if r["hour_bucket"] < lo:
+                continue
+            if r["hour_bucket"] >= hi:
+                break
+            if tkey and str(r["target_id"]) != tkey:
+                continue
+            yield r
+
+
+def ok_counts(target_id: int, start: datetime, end: datetime, app=None) -> tuple[int, int]:
+    """
+    (rows, ok rows) of one target in the archive for start <= hour_bucket < end.
+    Whole days come from the index; a partial first/last day is counted from its month file.
+    """
+    app = app or current_app
+    months = load_index(app)["months"]
+    tkey = str(target_id)
+    total = ok = 0
+    partial: list[tuple[datetime, datetime]] = []
+
+    d = start.date()
+    while datetime(d.year, d.month, d.day) < end:
+        day_s = datetime(d.year, d.month, d.day)
+        day_e = day_s + timedelta(days=1)
+        m = months.get(d.strftime("%Y-%m"))
+        t = m["targets"].get(tkey) if m else None
+        if t and d.isoformat() in t["days"]:
+            if day_s >= start and day_e <= end:
+                n, k = t["days"][d.isoformat()]
+                total += n
+                ok += k
+            else:
+                partial.append((max(start, day_s), min(end, day_e)))
+        d += timedelta(days=1)
+
+    for s, e in partial:
+        for r in iter_rows(s, e, target_id, app=app):
+            total += 1
+            ok += 1 if r["ok"] else 0
+    return total, ok
+
+
+def _read_file(path: str):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _encode(r) -> dict:
+    out = {}
+    for c in COLUMNS:
+        v = getattr(r, c)
+        if isinstance(v, datetime):
+            v = v.isoformat()
+        elif c == "ok":
+            v = bool(v)
+        out[c] = v
+    return out
+
+
+def _next_month(d: datetime) -> datetime:
+    return datetime(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def _root(app) -> str:
+    return app.config.get("ARCHIVE_DIR") or os.path.join(app.instance_path, "archive")
@@ -0,0 +1,157 @@
+# app/services/assets.py
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import request, url_for
+
+try:  # optional: pip install brotli
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# mimetypes worth compressing (images/fonts are already compressed)
+COMPRESSIBLE = {
+    "text/html", "text/css", "text/plain", "text/csv",
+    "application/json", "application/javascript", "text/javascript", "image/svg+xml",
+}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_hashes: dict[str, tuple[float, str]] = {}  # filename -> (mtime, short sha256)
+_packed: dict[tuple[str, str, str], bytes] = {}  # (filename, hash, encoding) -> compressed body
+_lock = threading.Lock()
+
+
+def init_app(app):
+    """
+    - {{ asset_url('css/app.css') }} in templates => /static/css/app.css?v=<hash>
+      (versioned URLs get a 1 year immutable Cache-Control)
+    - gzip / br for text responses >= COMPRESS_MIN_BYTES when the client accepts it
+    No build step: hashes are computed on first use and again when the file changes.
+    """
+    app.add_template_global(lambda filename: asset_url(app, filename), name="asset_url")
+    app.after_request(_after_request(app))
+
+
+def asset_url(app, filename: str) -> str:
+    return url_for("static", filename=filename, v=_file_hash(app, filename))
+
+
+def etag_matches(etag: str) -> bool:
+    """If-None-Match vs an ETag set before compression (the hook below appends -gzip / -br)."""
+    inm = request.if_none_match
+    return inm.contains(etag) or inm.contains(f"{etag}-gzip") or inm.contains(f"{etag}-br")
+
+
+def _file_hash(app, filename: str) -> str:
+    path = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return ""
+    with _lock:
+        cached = _hashes.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(path, "rb") as f:
+        h = hashlib.sha256(f.read()).hexdigest()[:12]
+    with _lock:
+        _hashes[filename] = (mtime, h)
+    return h
+
+
+def _pick_encoding(app) -> str | None:
+    accept = request.headers.get("Accept-Encoding", "").lower()
+    offered = {}
+    for part in accept.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            offered[name] = q
+    if brotli is not None and app.config.get("COMPRESS_BROTLI", True) and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def _compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=min(level, 9), mtime=0)
+
+
+def _after_request(app):
+    min_bytes = int(app.config.get("COMPRESS_MIN_BYTES", 1024))
+    level = int(app.config.get("COMPRESS_LEVEL", 6))
+
+    def hook(resp):
+        is_static = request.endpoint == "static"
+        if is_static and resp.status_code == 200 and request.args.get("v"):
+            filename = request.view_args.get("filename", "")
+            if request.args["v"] == _file_hash(app, filename):
+                resp.cache_control.no_cache = None
+                resp.headers["Cache-Control"] = IMMUTABLE
+
+        if (
+            resp.status_code != 200
+            or resp.mimetype not in COMPRESSIBLE
+            or "Content-Encoding" in resp.headers
+            or resp.is_streamed and not is_static  # SSE / CSV exports stream, leave them alone
+        ):
+            return resp
+
+        resp.vary.add("Accept-Encoding")
+        encoding = _pick_encoding(app)
+        if encoding is None:
+            return resp
+
+        # the client revalidates with the ETag it got from us, i.e. the compressed one
+        etag, weak = resp.get_etag()
+        if etag and request.if_none_match.contains_weak(f"{etag}-{encoding}"):
+            return _not_modified(app, resp, f"{etag}-{encoding}", weak)
+
+        if is_static:
+            # files are small and change rarely: compress once per version
+            filename = request.view_args.get("filename", "")
+            key = (filename, _file_hash(app, filename), encoding)
+            with _lock:
+                body = _packed.get(key)
+            if body is None:
+                with open(os.path.join(app.static_folder, filename), "rb") as f:
+                    raw = f.read()
+                if len(raw) < min_bytes:
+                    return resp
+                body = _compress(raw, encoding, 9 if encoding == "gzip" else 11)
+                with _lock:
+                    _packed[key] = body
+            resp.direct_passthrough = False
+            resp.set_data(body)
+        else:
+            raw = resp.get_data()
+            if len(raw) < min_bytes:
+                return resp
+            resp.set_data(_compress(raw, encoding, level))
+
+        resp.headers["Content-Encoding"] = encoding
+        if etag:
+            resp.set_etag(f"{etag}-{encoding}", weak=weak)
+        return resp
+
+    return hook
+
+
+def _not_modified(app, resp, etag: str, weak: bool):
+    out = app.response_class(status=304)
+    out.set_etag(etag, weak=weak)
+    for h in ("Cache-Control", "Vary", "Expires", "Last-Modified"):
+        if h in resp.headers:
+            out.headers[h] = resp.headers[h]
+    resp.close()  # static: releases the file
+    return out
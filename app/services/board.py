@@ -0,0 +1,302 @@
+# app/services/board.py
+"""
+Materialized status board (BOARD_ENABLED=1).
+
+The scheduler process keeps one JSON document with everything the public
+dashboard needs - per target: newest snapshot, uptime windows, 90 day bars,
+open incident; plus the summary counts and the recent events - and writes it
+to instance/board.json (tmp + replace). Web workers read the file (parsed once
+per change) instead of querying the DB.
+
+Kept current by tailing live_events (every snapshot / event / target change
+is published there, from any process; rows committed after a higher id are
+picked up with live.Seen): changed targets are recomputed every
+BOARD_SYNC_S, everything at each hour (uptime windows move) and every
+BOARD_REBUILD_S. The writer touches board.alive on every sync; readers fall
+back to SQL when the board is from another hour or the writer has stopped.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+
+from .. import db
+from ..models import Event, LiveEvent
+from . import live, metrics
+
+RECENT_EVENTS = 20
+# more changes than this since the last sync => full rebuild
+MAX_DIRTY = 1000
+STATS_CHUNK = 200
+
+_lock = threading.Lock()
+_cache: dict = {}  # path -> (mtime_ns, board)
+_built: dict = {}  # path -> monotonic time of the last full build (writer)
+_seen: dict = {}  # path -> live.Seen of the writer
+_fallback_lock = threading.Lock()
+_fallback: dict = {}  # "board" -> (monotonic, board built by a reader)
+
+
+def enabled(app=None) -> bool:
+    app = app or current_app
+    return bool(app.config.get("BOARD_ENABLED"))
+
+
+# ---- read (any process) ----
+def current(app=None) -> dict | None:
+    """The board if it is fresh (this hour, writer alive), else None => caller uses SQL."""
+    app = app or current_app
+    if not enabled(app):
+        return None
+    path = _path(app)
+    try:
+        alive = os.path.getmtime(path + ".alive")
+    except OSError:
+        return None
+    if time.time() - alive > float(app.config.get("BOARD_MAX_AGE_S", 120)):
+        return None
+
+    board = _load(path)
+    if board is None or board.get("hour") != _hour(app).isoformat():
+        return None
+    return board
+
+
+def fallback(app=None) -> dict:
+    """
+    build() for readers while there is no fresh board (writer down / disabled):
+    one build per process every BOARD_FALLBACK_TTL_S, concurrent callers wait for it.
+    """
+    app = app or current_app
+    ttl = float(app.config.get("BOARD_FALLBACK_TTL_S", 30))
+    with _fallback_lock:
+        hit = _fallback.get("board")
+        if hit is not None and time.monotonic() - hit[0] < ttl:
+            return hit[1]
+        board = build(app)
+        _fallback["board"] = (time.monotonic(), board)
+        return board
+
+
+def cards(board: dict, status: str = "", after: int = 0, limit: int = 24) -> tuple[list, bool]:
+    """Same page as metrics.card_page + card_stats, from the board. Returns (entries, more)."""
+    out = []
+    for c in board["targets"]:  # sorted by id
+        if c["id"] <= after or (status in ("up", "down", "unknown") and c["status"] != status):
+            continue
+        if len(out) == limit:
+            return out, True
+        out.append(c)
+    return out, False
+
+
+def bars(board: dict, entry: dict) -> list:
+    """Compact bars (pct per day, oldest first) -> bars_90d() format."""
+    today = datetime.fromisoformat(board["day"]).date()
+    out = []
+    for i, pct in enumerate(entry["bars"]):
+        d = (today - timedelta(days=len(entry["bars"]) - 1 - i)).isoformat()
+        if pct is None:
+            out.append({"date": d, "pct": None, "cls": "unk"})
+        else:
+            out.append({"date": d, "pct": pct, "cls": metrics._classify(pct)})
+    return out
+
+
+# ---- write (scheduler process) ----
+def sync(app):
+    """Scheduler job: apply changes since the last sync, or rebuild when needed."""
+    if not enabled(app):
+        return
+    path = _path(app)
+    with app.app_context():
+        try:
+            board = _load(path)
+            hour = _hour(app).isoformat()
+            rebuild_s = float(app.config.get("BOARD_REBUILD_S", 600))
+            stale = time.monotonic() - _built.get(path, 0) > rebuild_s
+
+            seen = _seen.get(path)
+            if seen is None or board is None or board.get("hour") != hour or stale:
+                _rebuild(app, path, board)
+            else:
+                missed = seen.missed(board["cursor"])
+                late = (
+                    db.session.query(LiveEvent.id, LiveEvent.target_id, LiveEvent.created_at)
+                    .filter(LiveEvent.id.in_(missed))
+                    .all()
+                    if missed else []
+                )
+                rows = (
+                    db.session.query(LiveEvent.id, LiveEvent.target_id, LiveEvent.created_at)
+                    .filter(LiveEvent.id > board["cursor"])
+                    .order_by(LiveEvent.id.asc())
+                    .limit(MAX_DIRTY + 1)
+                    .all()
+                )
+                if len(rows) + len(late) > MAX_DIRTY:
+                    _rebuild(app, path, board)
+                elif rows or late:
+                    seen.add(late)
+                    seen.add(rows)
+                    dirty = {r.target_id for r in late + rows if r.target_id is not None}
+                    cursor = rows[-1].id if rows else board["cursor"]
+                    _write(app, _update(app, board, dirty, cursor))
+        finally:
+            db.session.remove()
+        _touch(path + ".alive")
+
+
+def _rebuild(app, path: str, board: dict | None):
+    # seed first: a row it marks read was committed before build() reads the cards
+    seen = live.Seen(float(app.config.get("LIVE_LATE_WINDOW_S", live.LATE_WINDOW_S)))
+    seen.seed(db.session.query(db.func.max(LiveEvent.id)).scalar() or 0)
+    _write(app, build(app, board))
+    _built[path] = time.monotonic()
+    _seen[path] = seen
+
+
+def build(app, prev: dict | None = None) -> dict:
+    """Whole board from the DB (inside app context), not written."""
+    cursor = db.session.query(db.func.max(LiveEvent.id)).scalar() or 0
+    rows = metrics.card_page(limit=None)
+    board = {
+        "version": (prev or {}).get("version", 0) + 1,
+        "cursor": cursor,
+        "targets": _entries(app, rows),
+    }
+    return _finish(app, board)
+
+
+def _update(app, board: dict, dirty: set, cursor: int) -> dict:
+    rows = metrics.card_page(limit=None, ids=sorted(dirty))
+    fresh = {e["id"]: e for e in _entries(app, rows)}
+    targets = [e for e in board["targets"] if e["id"] not in dirty]  # deleted targets drop out
+    targets.extend(fresh.values())
+    targets.sort(key=lambda e: e["id"])
+    return _finish(app, {"version": board["version"] + 1, "cursor": cursor, "targets": targets})
+
+
+def _finish(app, board: dict) -> dict:
+    summary = {"up": 0, "down": 0, "unknown": 0}
+    for e in board["targets"]:
+        summary[e["status"]] += 1
+    summary["total"] = len(board["targets"])
+
+    names = {e["id"]: e["name"] for e in board["targets"]}
+    events = Event.query.order_by(Event.started_at.desc()).limit(RECENT_EVENTS).all()
+
+    tz = ZoneInfo(app.config.get("TIMEZONE", "Asia/Bangkok"))
+    board.update({
+        "hour": _hour(app).isoformat(),
+        "day": datetime.now(tz).date().isoformat(),
+        "built_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "summary": summary,
+        "events": [
+            {
+                "id": e.id,
+                "target_id": e.target_id,
+                "target_name": names.get(e.target_id),
+                "started_at": e.started_at.isoformat(),
+                "ended_at": e.ended_at.isoformat() if e.ended_at else None,
+                "reason": e.reason,
+                "http_status": e.http_status,
+            }
+            for e in events
+        ],
+    })
+    return board
+
+
+def _entries(app, rows: list) -> list:
+    """card_page rows -> board entries (stats in chunks, open incidents in one query)."""
+    tz_name = app.config.get("TIMEZONE", "Asia/Bangkok")
+    ids = [r.id for r in rows]
+    stats = {}
+    for i in range(0, len(ids), STATS_CHUNK):
+        stats.update(metrics.card_stats(ids[i:i + STATS_CHUNK], tz_name))
+
+    incidents = {}
+    if ids:
+        q = (
+            Event.query
+            .filter(Event.state == "down", Event.ended_at.is_(None))
+            .order_by(Event.started_at.asc())
+        )
+        if len(ids) <= STATS_CHUNK:
+            q = q.filter(Event.target_id.in_(ids))
+        for e in q.all():  # newest open one wins
+            incidents[e.target_id] = {
+                "id": e.id,
+                "started_at": e.started_at.isoformat(),
+                "reason": e.reason,
+                "http_status": e.http_status,
+            }
+
+    out = []
+    for r in rows:
+        st = stats[r.id]
+        out.append({
+            "id": r.id,
+            "name": r.name,
+            "enabled": bool(r.enabled),
+            "base_url": r.base_url,
+            "public_click": bool(r.public_click),
+            "status": r.status,
+            "last": None if r.status == "unknown" else {
+                "ok": bool(r.ok),
+                "latency_ms": r.latency_ms,
+                "hour_bucket": r.hour_bucket.isoformat() if r.hour_bucket else None,
+                "polled_at": r.polled_at.isoformat() if r.polled_at else None,
+            },
+            "uptime": st["uptime"],
+            "bars": [b["pct"] for b in st["bars_90d"]],
+            "incident": incidents.get(r.id),
+        })
+    return out
+
+
+def _write(app, board: dict):
+    path = _path(app)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(board, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp, path)
+    with _lock:
+        _cache[path] = (os.stat(path).st_mtime_ns, board)
+
+
+def _load(path: str) -> dict | None:
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+        with _lock:
+            cached = _cache.get(path)
+        if cached and cached[0] == mtime_ns:
+            return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            board = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with _lock:
+        _cache[path] = (mtime_ns, board)
+    return board
+
+
+def _touch(path: str):
+    with open(path, "a"):
+        pass
+    os.utime(path, None)
+
+
+def _hour(app) -> datetime:
+    tz = ZoneInfo(app.config.get("TIMEZONE", "Asia/Bangkok"))
+    return datetime.now(tz).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def _path(app) -> str:
+    return app.config.get("BOARD_PATH") or os.path.join(app.instance_path, "board.json")
@@ -0,0 +1,129 @@
+# app/services/breaker.py
+import math
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from ..models import Snapshot
+
+# samples used for the latency distribution / to seed the failure streak
+LATENCY_SAMPLES = 50
+STREAK_SAMPLES = 64
+
+
+@dataclass
+class ProbePlan:
+    probe: bool  # False => circuit open, no network call this cycle
+    state: str  # "closed" / "open" / "half_open"
+    timeout_s: float
+    retries: int
+
+
+@dataclass
+class _State:
+    failures: int = 0  # consecutive failed probes
+    next_probe_at: datetime | None = None  # set while circuit is open
+
+
+_states: dict[int, _State] = {}
+_lock = threading.Lock()
+
+
+def plan(app, target_id: int, now: datetime, manual: bool = False) -> ProbePlan:
+    """
+    Decide how (and whether) to probe a target this cycle.
+      closed    : normal probe, adaptive timeout, retries=1
+      open      : skip probe (exponential backoff after BREAKER_THRESHOLD failures)
+      half_open : backoff expired -> single attempt, no retry
+    manual=True (owner "test now") always probes.
+    """
+    timeout_s = adaptive_timeout(app, target_id)
+    threshold = int(app.config.get("BREAKER_THRESHOLD", 3))
+
+    with _lock:
+        st = _states.get(target_id)
+    if st is None:
+        st = _State(failures=_seed_failures(target_id))
+        with _lock:
+            st = _states.setdefault(target_id, st)
+
+    if manual or st.failures < threshold:
+        return ProbePlan(probe=True, state="closed", timeout_s=timeout_s, retries=1 if st.failures == 0 else 0)
+
+    if st.next_probe_at is not None and now < st.next_probe_at:
+        return ProbePlan(probe=False, state="open", timeout_s=timeout_s, retries=0)
+
+    return ProbePlan(probe=True, state="half_open", timeout_s=timeout_s, retries=0)
+
+
+def record(app, target_id: int, ok: bool, now: datetime):
+    """Feed back the result of a real probe (skipped cycles are not recorded)."""
+    threshold = int(app.config.get("BREAKER_THRESHOLD", 3))
+    max_backoff_h = int(app.config.get("BREAKER_MAX_BACKOFF_HOURS", 24))
+
+    with _lock:
+        st = _states.setdefault(target_id, _State())
+        if ok:
+            st.failures = 0
+            st.next_probe_at = None
+            return
+
+        st.failures += 1
+        if st.failures >= threshold:
+            # 1h, 2h, 4h, ... between probes (poll period is 1h), capped
+            backoff_h = min(2 ** (st.failures - threshold), max_backoff_h)
+            st.next_probe_at = now + timedelta(hours=backoff_h)
+
+
+def forget(target_id: int):
+    with _lock:
+        _states.pop(target_id, None)
+
+
+def adaptive_timeout(app, target_id: int) -> float:
+    """
+    Timeout from the target's own latency distribution:
+      p95(latency of recent OK samples) * PROBE_TIMEOUT_FACTOR,
+    clamped to [PROBE_TIMEOUT_MIN_S, PROBE_TIMEOUT_MAX_S].
+    No history => PROBE_TIMEOUT_MAX_S (old fixed 8s).
+    """
+    t_min = float(app.config.get("PROBE_TIMEOUT_MIN_S", 2))
+    t_max = float(app.config.get("PROBE_TIMEOUT_MAX_S", 8))
+    factor = float(app.config.get("PROBE_TIMEOUT_FACTOR", 3))
+
+    rows = (
+        Snapshot.query
+        .with_entities(Snapshot.latency_ms)
+        .filter(
+            Snapshot.target_id == target_id,
+            Snapshot.ok.is_(True),
+            Snapshot.latency_ms.isnot(None),
+        )
+        .order_by(Snapshot.hour_bucket.desc())
+        .limit(LATENCY_SAMPLES)
+        .all()
+    )
+    if len(rows) < 5:
+        return t_max
+
+    values = sorted(v for (v,) in rows)
+    p95 = values[min(len(values) - 1, math.ceil(0.95 * len(values)) - 1)]
+    return round(min(t_max, max(t_min, p95 / 1000.0 * factor)), 2)
+
+
+def _seed_failures(target_id: int) -> int:
+    """After a restart: rebuild the failure streak from the latest snapshots."""
+    rows = (
+        Snapshot.query
+        .with_entities(Snapshot.ok)
+        .filter(Snapshot.target_id == target_id)
+        .order_by(Snapshot.hour_bucket.desc())
+        .limit(STREAK_SAMPLES)
+        .all()
+    )
+    n = 0
+    for (ok,) in rows:
+        if ok:
+            break
+        n += 1
+    return n
@@ -0,0 +1,186 @@
+# app/services/counters.py
+"""
+Cached row counts for the owner DB page.
+
+Writers do not touch the counters row themselves (one hot row every ingest / push /
+poll transaction would wait on): ORM inserts/deletes are summed per session, handed
+to this process on commit (dropped on rollback), and a daemon thread adds them to
+the counters table every COUNTER_FLUSH_S. Counts lag by that much, and the
+deltas of a process that dies before its flush are lost: the scheduler recounts
+(seed(force=True), same as the owner "Recount") at start and every COUNTER_RECOUNT_H.
+"""
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..models import Counter, Target, Snapshot, Event
+
+# counter name -> model; counts follow ORM inserts/deletes (cascades included)
+TRACKED = {"targets": Target, "snapshots": Snapshot, "events": Event}
+_BY_MODEL = {m: name for name, m in TRACKED.items()}
+_INFO_KEY = "counter_delta"
+
+_installed = False
+_pending: dict[str, int] = {}  # committed, not yet written
+_pending_lock = threading.Lock()
+
+
+def install(app):
+    """Hook the write path (per session deltas) + start the flusher of this process."""
+    global _installed
+    if _installed:
+        return
+    event.listen(Session, "after_flush", _after_flush)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    _installed = True
+
+    interval = max(float(app.config.get("COUNTER_FLUSH_S", 5)), 0.5)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush(app)
+            except Exception:
+                pass  # DB busy: deltas stay pending, next tick
+
+    threading.Thread(target=run, name="counters", daemon=True).start()
+    atexit.register(lambda: _flush_quietly(app))
+
+
+def flush(app=None):
+    """Write the pending deltas of this process (one short transaction)."""
+    with _pending_lock:
+        delta = {k: v for k, v in _pending.items() if v}
+        _pending.clear()
+    if not delta:
+        return
+    try:
+        if app is not None:
+            with app.app_context():
+                _write(delta)
+        else:
+            _write(delta)
+    except Exception:
+        _queue(delta)  # keep them for the next try
+        raise
+
+
+def seed(force: bool = False):
+    """
+    COUNT(*) once for counters that do not exist yet (new DB / first start),
+    or for all of them with force=True (owner "Recount"). Call inside app context.
+    """
+    if force:
+        with _pending_lock:
+            _pending.clear()  # included in the recount
+    have = {c.name: c for c in Counter.query.all()}
+    now = datetime.utcnow()
+    for name, model in TRACKED.items():
+        if name in have and not force:
+            continue
+        n = db.session.query(func.count(model.id)).scalar() or 0
+        c = have.get(name) or Counter(name=name)
+        c.value, c.updated_at = n, now
+        db.session.add(c)
+    db.session.commit()
+    refresh_db_size()
+
+
+def refresh_db_size():
+    """SQLite: page_count * page_size, PostgreSQL: pg_database_size (cheap, no file path needed). Writes only on change."""
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        pages = db.session.execute(text("PRAGMA page_count")).scalar() or 0
+        page_size = db.session.execute(text("PRAGMA page_size")).scalar() or 0
+        size = pages * page_size
+    elif dialect == "postgresql":
+        size = db.session.execute(text("SELECT pg_database_size(current_database())")).scalar() or 0
+    else:
+        return
+    c = db.session.get(Counter, "db_bytes") or Counter(name="db_bytes")
+    if c.value == size:
+        db.session.rollback()
+        return
+    c.value, c.updated_at = size, datetime.utcnow()
+    db.session.add(c)
+    db.session.commit()
+
+
+def adjust(name: str, delta: int):
+    """For bulk UPDATE/DELETE statements (no ORM flush): counted when the caller commits."""
+    if delta:
+        _add(db.session.info, {name: delta})
+
+
+def get_all() -> dict:
+    """{name: value, ..., "updated_at": newest update} - one small SELECT (after this process's deltas)."""
+    try:
+        flush()
+    except Exception:
+        pass
+    rows = Counter.query.all()
+    out = {c.name: c.value for c in rows}
+    out["updated_at"] = max((c.updated_at for c in rows), default=None)
+    return out
+
+
+def _after_flush(session, flush_context):
+    delta: dict[str, int] = {}
+    for obj in session.new:
+        name = _BY_MODEL.get(type(obj))
+        if name:
+            delta[name] = delta.get(name, 0) + 1
+    for obj in session.deleted:
+        name = _BY_MODEL.get(type(obj))
+        if name:
+            delta[name] = delta.get(name, 0) - 1
+
+    if delta:
+        _add(session.info, delta)
+
+
+def _after_commit(session):
+    delta = session.info.pop(_INFO_KEY, None)
+    if delta:
+        _queue(delta)
+
+
+def _after_rollback(session):
+    session.info.pop(_INFO_KEY, None)
+
+
+def _add(info: dict, delta: dict):
+    acc = info.setdefault(_INFO_KEY, {})
+    for name, d in delta.items():
+        acc[name] = acc.get(name, 0) + d
+
+
+def _queue(delta: dict):
+    with _pending_lock:
+        for name, d in delta.items():
+            _pending[name] = _pending.get(name, 0) + d
+
+
+def _write(delta: dict):
+    now = datetime.utcnow()
+    with db.engine.begin() as conn:
+        for name, d in sorted(delta.items()):  # same order in every process: no deadlock
+            conn.execute(
+                Counter.__table__.update()
+                .where(Counter.name == name)
+                .values(value=Counter.value + d, updated_at=now)
+            )
+
+
+def _flush_quietly(app):
+    try:
+        flush(app)
+    except Exception:
+        pass
@@ -0,0 +1,83 @@
+# app/services/dbcopy.py
+"""
+Copy every table between two databases (SQLite -> PostgreSQL and back), ids kept.
+Used by `manage.py db-copy`. Counters are not copied: the destination recounts.
+"""
+import os
+
+from sqlalchemy import create_engine, func, inspect, select, text
+
+from .. import db
+from ..config import normalize_db_url
+
+SKIP_TABLES = {"counters"}
+
+
+def engine_for(url_or_path: str, app):
+    """A URL, or a plain path to a SQLite file (relative to the current directory)."""
+    if "://" not in url_or_path:
+        url_or_path = f"sqlite:///{os.path.abspath(url_or_path)}"
+    url_or_path = normalize_db_url(url_or_path)
+    if url_or_path.startswith("sqlite:///") and not url_or_path.startswith("sqlite:////"):
+        # same rule as the app: relative SQLite paths live in instance/
+        url_or_path = "sqlite:///" + os.path.join(app.instance_path, url_or_path[len("sqlite:///"):])
+    return create_engine(url_or_path)
+
+
+def copy(src, dst, batch: int = 2000, truncate: bool = False, log=print) -> dict:
+    """
+    Copy all model tables src -> dst in dependency order, one transaction per table.
+    dst gets the current schema (create_all); it must be empty unless truncate=True.
+    Returns {table: rows copied}. Raises RuntimeError if dst has data or counts differ.
+    """
+    tables = [t for t in db.metadata.sorted_tables if t.name not in SKIP_TABLES]
+    db.metadata.create_all(dst)
+    src_tables = set(inspect(src).get_table_names())
+
+    with dst.begin() as conn:
+        busy = [t.name for t in tables if conn.execute(select(1).select_from(t).limit(1)).first()]
+        if busy and not truncate:
+            raise RuntimeError(f"destination not empty: {', '.join(busy)} (use --truncate)")
+        for t in reversed(tables):
+            conn.execute(t.delete())
+
+    out = {}
+    for t in tables:
+        if t.name not in src_tables:
+            out[t.name] = 0
+            continue
+        # older source DB: copy the columns it has, the rest get model defaults
+        have = {c["name"] for c in inspect(src).get_columns(t.name)}
+        cols = [c for c in t.columns if c.name in have]
+        q = select(*cols).order_by(*t.primary_key.columns)
+
+        n = 0
+        with src.connect() as s, dst.begin() as d:
+            result = s.execution_options(yield_per=batch).execute(q)
+            for part in result.partitions():
+                d.execute(t.insert(), [dict(r._mapping) for r in part])
+                n += len(part)
+            _reset_sequence(d, t)
+        out[t.name] = n
+        log(f"{t.name}: {n} row(s)")
+
+    with dst.connect() as d:
+        for t in tables:
+            have = d.execute(select(func.count()).select_from(t)).scalar()
+            if have != out[t.name]:
+                raise RuntimeError(f"{t.name}: copied {out[t.name]} row(s), destination has {have}")
+    return out
+
+
+def _reset_sequence(conn, table):
+    """PostgreSQL: explicit ids do not advance SERIAL sequences."""
+    if conn.dialect.name != "postgresql":
+        return
+    pk = list(table.primary_key.columns)
+    if len(pk) != 1 or not pk[0].autoincrement or pk[0].type.python_type is not int:
+        return
+    name, col = table.name, pk[0].name
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence(:t, :c), COALESCE(MAX({col}), 1), MAX({col}) IS NOT NULL) "
+        f"FROM {conn.dialect.identifier_preparer.quote(name)}"
+    ), {"t": name, "c": col})
@@ -0,0 +1,56 @@
+# app/services/dispatch.py
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+def stagger_offset(target_id: int, base_url: str, window_s: float) -> float:
+    """
+    Deterministic start offset (seconds) of a target inside the poll window.
+    Same target => same offset every hour, targets spread evenly by hash.
+    """
+    if window_s <= 0:
+        return 0.0
+    h = zlib.crc32(f"{target_id}:{base_url}".encode("utf-8"))
+    return (h / 0xFFFFFFFF) * window_s
+
+
+def host_key(base_url: str) -> str:
+    p = urlparse(base_url or "")
+    return (p.hostname or base_url or "").lower()
+
+
+class HostLimiter:
+    """
+    Per-host caps shared by all probe workers of a poll cycle:
+      - at most `concurrency` in-flight requests per host
+      - at least `min_interval_s` between two request starts on the same host
+    """
+
+    def __init__(self, concurrency: int = 2, min_interval_s: float = 0.0):
+        self.concurrency = max(1, int(concurrency))
+        self.min_interval_s = max(0.0, float(min_interval_s))
+        self._lock = threading.Lock()
+        self._sems: dict[str, threading.BoundedSemaphore] = {}
+        self._next_start: dict[str, float] = {}
+
+    @contextmanager
+    def slot(self, host: str):
+        with self._lock:
+            sem = self._sems.get(host)
+            if sem is None:
+                sem = self._sems[host] = threading.BoundedSemaphore(self.concurrency)
+
+        sem.acquire()
+        try:
+            with self._lock:
+                now = time.monotonic()
+                start_at = max(now, self._next_start.get(host, 0.0))
+                self._next_start[host] = start_at + self.min_interval_s
+            if start_at > now:
+                time.sleep(start_at - now)
+            yield
+        finally:
+            sem.release()
@@ -0,0 +1,191 @@
+# app/services/dnscache.py
+"""
+In-process DNS cache for the probes (services/fetcher.py, also used by agent.py).
+
+getaddrinfo() stays the resolver (hosts file, nsswitch...), its answer is kept
+per (host, port):
+  - for DNS_CACHE_TTL_S, or the record TTL when the optional dnspython package
+    is installed (pip install dnspython) - looked up in a background thread after
+    the answer is cached, never on the probe path;
+    clamped to [DNS_CACHE_MIN_TTL_S, DNS_CACHE_MAX_TTL_S]
+  - failures for DNS_NEGATIVE_TTL_S (a dead domain costs 1 lookup, not 1 per retry)
+Concurrent misses of one host share a single lookup. IP literals skip the cache.
+DNS_CACHE_TTL_S=0 turns it off (every connect resolves again).
+"""
+import ipaddress
+import socket
+import threading
+import time
+
+try:  # optional: pip install dnspython (real record TTLs)
+    import dns.resolver as _dns_resolver
+except ImportError:
+    _dns_resolver = None
+
+_settings = {"ttl_s": 300.0, "min_ttl_s": 30.0, "max_ttl_s": 3600.0, "negative_ttl_s": 30.0}
+
+_lock = threading.Lock()
+_cache: dict = {}  # (host, port) -> (expires monotonic, addrinfo list | OSError)
+_inflight: dict = {}  # (host, port) -> Lock held by the thread resolving it
+
+
+def init_app(app):
+    configure(
+        ttl_s=app.config.get("DNS_CACHE_TTL_S", 300),
+        min_ttl_s=app.config.get("DNS_CACHE_MIN_TTL_S", 30),
+        max_ttl_s=app.config.get("DNS_CACHE_MAX_TTL_S", 3600),
+        negative_ttl_s=app.config.get("DNS_NEGATIVE_TTL_S", 30),
+    )
+
+
+def configure(**settings):
+    for k, v in settings.items():
+        if k not in _settings:
+            raise TypeError(f"unknown dnscache setting {k}")
+        _settings[k] = float(v)
+    clear()
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+
+def resolve(host: str, port: int) -> tuple[list, int]:
+    """
+    getaddrinfo(host, port, SOCK_STREAM) through the cache.
+    Returns (addrinfos, dns_ms) - dns_ms is the lookup time, 0 on a cache hit.
+    """
+    if _settings["ttl_s"] <= 0 or _is_ip(host):
+        t0 = time.perf_counter()
+        addrs = _lookup(host, port)
+        return addrs, _ms(t0)
+
+    key = (host.lower(), port)
+    hit = _get(key)
+    if hit is not None:
+        return _unwrap(hit), 0
+
+    with _lock:
+        flight = _inflight.setdefault(key, threading.Lock())
+    with flight:
+        try:
+            hit = _get(key)  # resolved by another thread while we waited
+            if hit is not None:
+                return _unwrap(hit), 0
+            t0 = time.perf_counter()
+            try:
+                addrs = _lookup(host, port)
+            except OSError as e:
+                _put(key, e, _settings["negative_ttl_s"])
+                raise
+            dns_ms = _ms(t0)
+            _put(key, addrs, _clamp(_settings["ttl_s"]))
+            if _dns_resolver is not None:
+                threading.Thread(
+                    target=_refine_ttl, args=(key, host, addrs, time.monotonic()), name="dns-ttl", daemon=True,
+                ).start()
+            return addrs, dns_ms
+        finally:
+            with _lock:
+                _inflight.pop(key, None)
+
+
+def forget(host: str, port: int):
+    """Drop one entry (e.g. every cached address refused the connection)."""
+    with _lock:
+        _cache.pop((host.lower(), port), None)
+
+
+def create_connection(host: str, port: int, timeout_s: float, timings: dict | None = None) -> tuple[socket.socket, dict]:
+    """
+    socket.create_connection() with a cached lookup.
+    Returns (socket, timings) with timings {"dns_ms", "connect_ms"} filled in as the steps
+    finish (pass a dict to keep them when it raises); dns_ms is 0 on a cache hit.
+    """
+    timings = {} if timings is None else timings
+    t0 = time.perf_counter()
+    try:
+        addrs, timings["dns_ms"] = resolve(host, port)
+    except OSError:
+        timings["dns_ms"] = _ms(t0)
+        raise
+
+    t1 = time.perf_counter()
+    err = None
+    for family, type_, proto, _, addr in addrs:
+        sock = socket.socket(family, type_, proto)
+        try:
+            sock.settimeout(timeout_s)
+            sock.connect(addr)
+            timings["connect_ms"] = _ms(t1)
+            return sock, timings
+        except OSError as e:
+            sock.close()
+            err = e
+    timings["connect_ms"] = _ms(t1)
+    if not _is_ip(host) and not isinstance(err, socket.timeout):
+        forget(host, port)  # maybe the host moved: resolve again on the retry
+    raise err or OSError(f"no address for {host}")
+
+
+def _lookup(host: str, port: int) -> list:
+    return socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+
+def _clamp(ttl: float) -> float:
+    return min(max(ttl, _settings["min_ttl_s"]), _settings["max_ttl_s"])
+
+
+def _refine_ttl(key, host: str, addrs: list, cached_at: float):
+    """Background: expire the entry by the record TTL instead of DNS_CACHE_TTL_S."""
+    record_ttl = _record_ttl(host)
+    if record_ttl is None:
+        return
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[1] is addrs:  # not replaced / forgotten meanwhile
+            _cache[key] = (cached_at + _clamp(record_ttl), addrs)
+
+
+def _record_ttl(host: str) -> float | None:
+    """Lowest TTL of the A / AAAA answers, None when the DNS server has no answer (hosts file...)."""
+    ttls = []
+    for rdtype in ("A", "AAAA"):
+        try:
+            answer = _dns_resolver.resolve(host, rdtype, lifetime=2.0)
+        except Exception:
+            continue
+        ttls.append(answer.rrset.ttl)
+    return float(min(ttls)) if ttls else None
+
+
+def _get(key):
+    with _lock:
+        entry = _cache.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _put(key, value, ttl_s: float):
+    with _lock:
+        _cache[key] = (time.monotonic() + ttl_s, value)
+
+
+def _unwrap(value) -> list:
+    if isinstance(value, OSError):
+        raise type(value)(*value.args)  # fresh exception: no traceback piling up on the cached one
+    return value
+
+
+def _ms(t0: float) -> int:
+    return int((time.perf_counter() - t0) * 1000)
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
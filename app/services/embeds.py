@@ -0,0 +1,99 @@
+# app/services/embeds.py
+"""
+Small SVG images for embedding a target's status in other pages (no JS, no Chart.js):
+    uptime_bars   90 day bars, same colors / thresholds as the dashboard
+    sparkline     latency line of the last hours
+    badge         "uptime 30d | 99.9%" shields-style
+Rendered SVGs are cached in-process by ETag (newest poll of the target + current hour),
+so repeated embeds cost one indexed lookup and often a 304.
+"""
+import threading
+from xml.sax.saxutils import escape
+
+COLORS = {"ok": "#22c55e", "warn": "#f59e0b", "bad": "#ef4444", "unk": "#9ca3af"}
+MAX_CACHED = 1024
+
+_lock = threading.Lock()
+_cache: dict[str, bytes] = {}  # etag -> svg
+
+
+def cached(etag: str, render) -> bytes:
+    """Rendered SVG for etag, render() called on a miss."""
+    with _lock:
+        svg = _cache.get(etag)
+    if svg is None:
+        svg = render().encode("utf-8")
+        with _lock:
+            if len(_cache) >= MAX_CACHED:
+                _cache.clear()  # keys carry the hour: old ones are dead anyway
+            _cache[etag] = svg
+    return svg
+
+
+def uptime_bars(bars: list, bar_w: int = 3, gap: int = 1, height: int = 20) -> str:
+    """bars_90d() items ({date, pct, cls}) -> one rect per day, oldest left."""
+    width = len(bars) * (bar_w + gap) - gap
+    rects = []
+    for i, b in enumerate(bars):
+        tip = f"{b['date']}: " + ("no data" if b["pct"] is None else f"{b['pct']}%")
+        rects.append(
+            f'<rect x="{i * (bar_w + gap)}" width="{bar_w}" height="{height}" rx="1" '
+            f'fill="{COLORS[b["cls"]]}"><title>{escape(tip)}</title></rect>'
+        )
+    return _svg(width, height, "".join(rects))
+
+
+def sparkline(values: list, width: int = 120, height: int = 24, color: str = "#3b82f6") -> str:
+    """Line over the non-null points (None breaks the line), scaled 0..max."""
+    pad = 2
+    top = max((v for v in values if v is not None), default=None)
+    if top is None:
+        body = f'<line x1="0" y1="{height / 2}" x2="{width}" y2="{height / 2}" stroke="{COLORS["unk"]}" stroke-dasharray="3 3"/>'
+        return _svg(width, height, body)
+
+    step = (width - 2 * pad) / max(len(values) - 1, 1)
+    scale = (height - 2 * pad) / (top or 1)
+    lines, cur = [], []
+    for i, v in enumerate(values):
+        if v is None:
+            if cur:
+                lines.append(cur)
+            cur = []
+            continue
+        cur.append(f"{pad + i * step:.1f},{height - pad - v * scale:.1f}")
+    if cur:
+        lines.append(cur)
+
+    body = "".join(
+        f'<polyline points="{" ".join(pts)}" fill="none" stroke="{color}" stroke-width="1.5" '
+        f'stroke-linejoin="round" stroke-linecap="round"/>'
+        if len(pts) > 1 else
+        f'<circle cx="{pts[0].split(",")[0]}" cy="{pts[0].split(",")[1]}" r="1.5" fill="{color}"/>'
+        for pts in lines
+    )
+    last = next((v for v in reversed(values) if v is not None), None)
+    return _svg(width, height, f"<title>{last} ms</title>{body}")
+
+
+def badge(label: str, value: str, cls: str) -> str:
+    """Two-part badge, text width estimated (Verdana 11px ~ 6.5px per char)."""
+    lw = int(len(label) * 6.5) + 10
+    vw = int(len(value) * 6.5) + 10
+    w, label, value = lw + vw, escape(label), escape(value)
+    body = (
+        f'<title>{label}: {value}</title>'
+        f'<rect width="{lw}" height="20" fill="#555"/>'
+        f'<rect x="{lw}" width="{vw}" height="20" fill="{COLORS[cls]}"/>'
+        f'<g fill="#fff" text-anchor="middle" font-family="Verdana,DejaVu Sans,sans-serif" font-size="11">'
+        f'<text x="{lw / 2}" y="14">{label}</text>'
+        f'<text x="{lw + vw / 2}" y="14">{value}</text>'
+        f'</g>'
+    )
+    return _svg(w, 20, body)
+
+
+def _svg(width, height, body: str) -> str:
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" role="img">{body}</svg>'
+    )
@@ -1,117 +1,538 @@
 # app/services/fetcher.py
+import base64
+import http.client
 import json
+import os
+import socket
+import ssl
 import time
-from urllib.parse import urljoin
+import urllib.request
+import zlib
+from typing import Callable
+from urllib.parse import unquote, urljoin, urlsplit, urlunsplit
 
-import requests
+from urllib3.util.ssltransport import SSLTransport
 
+from . import dnscache
 
-def fetch_stats(base_url: str, stats_path: str = "/api/stats", timeout_s: int = 8, retries: int = 1):
+# ---- Probe registry ----
+# Every probe: fn(base_url, stats_path, timeout_s, retries, max_body_bytes) -> result dict
+# with the same keys as fetch_stats (so Snapshot/Event code does not care which probe ran).
+PROBES: dict[str, Callable[..., dict]] = {}
+DEFAULT_PROBE = "json"
+
+
+def register_probe(name: str):
+    def deco(fn):
+        PROBES[name] = fn
+        return fn
+    return deco
+
+
+def run_probe(
+    probe_type: str,
+    base_url: str,
+    stats_path: str = "/api/stats",
+    timeout_s: float = 8,
+    retries: int = 1,
+    max_body_bytes: int | None = None,
+) -> dict:
+    fn = PROBES.get(probe_type or DEFAULT_PROBE)
+    if fn is None:
+        return _fail(f"unknown_probe_{probe_type}", None, base_url)
+    return fn(
+        base_url, stats_path,
+        timeout_s=timeout_s, retries=retries,
+        max_body_bytes=max_body_bytes or DEFAULT_MAX_BODY_BYTES,
+    )
+
+
+# Known metric keys (same order of preference as before).
+CPU_KEYS = ["cpu_percent", "cpu", "cpuUsage", "cpu_usage"]
+MEM_KEYS = ["mem_percent", "memory_percent", "mem", "memoryUsage", "mem_usage"]
+DISK_KEYS = ["disk_percent", "disk", "diskUsage", "disk_usage"]
+SWAP_KEYS = ["swap_percent", "swap", "swapUsage", "swap_usage"]
+_NESTED_KEYS = ["percent", "pct", "value"]
+
+# JSON decode keeps only these keys (any object level) => small dicts no matter the payload
+_KEEP_KEYS = frozenset(CPU_KEYS + MEM_KEYS + DISK_KEYS + SWAP_KEYS + _NESTED_KEYS)
+
+DEFAULT_MAX_BODY_BYTES = 256 * 1024
+_CHUNK = 16 * 1024
+
+MAX_REDIRECTS = 30  # same as requests
+_REDIRECTS = frozenset((301, 302, 303, 307, 308))
+USER_AGENT = "DotStatus"
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+@register_probe("json")
+def fetch_stats(
+    base_url: str,
+    stats_path: str = "/api/stats",
+    timeout_s: float = 8,
+    retries: int = 1,
+    max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+):
     """
     Returns dict:
       ok(bool), http_status(int|None), latency_ms(int|None),
       cpu_percent(float|None), mem_percent(float|None), disk_percent(float|None), swap_percent(float|None),
-      raw_json(str|None), reason(str|None)
-    """
-    base = (base_url or "").rstrip("/") + "/"
-    path = (stats_path or "/api/stats").lstrip("/")
-    url = urljoin(base, path)
+      raw_json(str|None), reason(str|None), timings(dict)
 
-    last_latency = None
+    Body is streamed (gzip accepted and decoded) and capped at max_body_bytes decoded:
+      - bigger body (or Content-Length)  => reason "body_too_large"
+      - connection cut mid-body          => reason "body_truncated" (retried)
+      - broken gzip                      => reason "bad_encoding"
+    raw_json is the original body text (no parse/dump round-trip).
+    HTTP(S)_PROXY / NO_PROXY and REQUESTS_CA_BUNDLE from the environment are honoured
+    (see _proxy_for, _ssl_context).
+    timings = {dns_ms, connect_ms, tls_ms, ttfb_ms} (summed over redirects), also on failures
+    as far as the request got; through a proxy dns / connect are the proxy's.
+    """
+    url = _join_url(base_url, stats_path or "/api/stats")
 
+    last = None
     for attempt in range(retries + 1):
         t0 = time.perf_counter()
+        timings: dict = {}
         try:
-            r = requests.get(url, timeout=timeout_s, headers={"Accept": "application/json"})
-            latency_ms = int((time.perf_counter() - t0) * 1000)
-            last_latency = latency_ms
-            http_status = r.status_code
+            http_status, body = _http_get(url, timeout_s, max_body_bytes, timings)
+            latency_ms = _ms(t0)
 
             if http_status != 200:
                 # no retry for most HTTP codes (you can tweak)
-                return {
-                    "ok": False,
-                    "http_status": http_status,
-                    "latency_ms": latency_ms,
-                    "cpu_percent": None,
-                    "mem_percent": None,
-                    "disk_percent": None,
-                    "swap_percent": None,
-                    "raw_json": None,
-                    "reason": f"http_{http_status}",
-                    "url": url,
-                }
-
-            data = r.json()  # may raise ValueError
-            raw = json.dumps(data, ensure_ascii=False)
+                return _fail(f"http_{http_status}", latency_ms, url, http_status=http_status, timings=timings)
+
+            raw = body.decode("utf-8", errors="replace")
+            try:
+                data = json.loads(body, object_pairs_hook=_pick_metric_keys)
+            except ValueError:
+                # JSON parse error - no retry
+                return _fail("bad_json", latency_ms, url, http_status=http_status, raw_json=raw, timings=timings)
 
             if not isinstance(data, dict):
-                return {
-                    "ok": False,
-                    "http_status": http_status,
-                    "latency_ms": latency_ms,
-                    "cpu_percent": None,
-                    "mem_percent": None,
-                    "disk_percent": None,
-                    "swap_percent": None,
-                    "raw_json": raw,
-                    "reason": "json_not_object",
-                    "url": url,
-                }
-
-            cpu = _get_first_number(data, ["cpu_percent", "cpu", "cpuUsage", "cpu_usage"])
-            mem = _get_first_number(data, ["mem_percent", "memory_percent", "mem", "memoryUsage", "mem_usage"])
-            disk = _get_first_number(data, ["disk_percent", "disk", "diskUsage", "disk_usage"])
-            swap = _get_first_number(data, ["swap_percent", "swap", "swapUsage", "swap_usage"])
+                return _fail("json_not_object", latency_ms, url, http_status=http_status, raw_json=raw, timings=timings)
 
             return {
                 "ok": True,
                 "http_status": http_status,
                 "latency_ms": latency_ms,
-                "cpu_percent": cpu,
-                "mem_percent": mem,
-                "disk_percent": disk,
-                "swap_percent": swap,
+                **extract_metrics(data),
                 "raw_json": raw,
                 "reason": None,
                 "url": url,
+                "timings": timings,
             }
 
-        except requests.Timeout:
-            # retry on timeout
-            last_latency = int((time.perf_counter() - t0) * 1000)
-            if attempt < retries:
-                continue
-            return _fail("timeout", last_latency, url)
+        except _BodyTooLarge:
+            # misbehaving target - no retry
+            return _fail("body_too_large", _ms(t0), url, http_status=200, timings=timings)
+
+        except zlib.error:
+            # Content-Encoding: gzip but not gzip - no retry
+            return _fail("bad_encoding", _ms(t0), url, http_status=200, timings=timings)
+
+        except http.client.IncompleteRead:
+            # body cut short (early close / bad chunk) - retry
+            last = _fail("body_truncated", _ms(t0), url, http_status=200, timings=timings)
+
+        except Exception as e:
+            # timeout / refused / DNS / bad response - retry, except TLS problems
+            last = _fail(_conn_reason(e), _ms(t0), url, timings=timings)
+            if isinstance(e, ssl.SSLError):
+                return last
+
+    return last
 
-        except requests.RequestException:
-            # retry on request errors
-            last_latency = int((time.perf_counter() - t0) * 1000)
-            if attempt < retries:
+
+def _http_get(url: str, timeout_s: float, max_body_bytes: int, timings: dict) -> tuple[int, bytes | None]:
+    """GET url (following up to MAX_REDIRECTS redirects) -> (status, body of a 200 or None)."""
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"unsupported url {url}")
+
+        hop: dict = {}
+        try:
+            conn, target, headers = _connect_http(parts, timeout_s, hop)
+        finally:
+            for k, v in hop.items():
+                timings[k] = timings.get(k, 0) + v
+
+        try:
+            t_req = time.perf_counter()
+            headers.update({"Accept": "application/json", "Accept-Encoding": "gzip"})
+            conn.request("GET", target, headers=headers)
+            resp = conn.getresponse()
+            timings["ttfb_ms"] = timings.get("ttfb_ms", 0) + _ms(t_req)
+
+            location = resp.getheader("Location")
+            if resp.status in _REDIRECTS and location:
+                resp.close()
+                url = urljoin(url, location)
                 continue
-            return _fail("request_error", last_latency, url)
+            if resp.status != 200:
+                resp.close()
+                return resp.status, None
+            return resp.status, _read_body(resp, max_body_bytes)
+        finally:
+            conn.close()
+
+    raise http.client.HTTPException("too many redirects")
+
+
+def probe_key(probe_type: str, base_url: str, stats_path: str) -> str:
+    """
+    Identity of the request a probe makes; equal keys => one request can serve
+    all those targets (poll cycle coalescing).
+    """
+    probe_type = probe_type or DEFAULT_PROBE
+    if probe_type in ("tcp", "tls"):
+        parts = urlsplit(_join_url(base_url, ""))
+        host = (parts.hostname or "").lower()
+        port = parts.port or (443 if (probe_type == "tls" or parts.scheme == "https") else 80)
+        return f"{probe_type}:{host}:{port}"
+
+    parts = urlsplit(_join_url(base_url, stats_path or ""))
+    netloc = parts.netloc.lower()
+    return f"{probe_type}:{parts.scheme.lower()}://{netloc}{parts.path or '/'}?{parts.query}"
+
+
+# ---- Cheap probes (no body, no JSON) ----
+# raw_json of these = the latency breakdown, e.g. {"dns_ms": 0, "connect_ms": 3, "tls_ms": 12, "ttfb_ms": 40}
+
+@register_probe("tcp")
+def probe_tcp(base_url: str, stats_path: str = "", timeout_s: float = 8, retries: int = 1, **_):
+    """TCP connect to host:port only."""
+    return _probe_connect(base_url, timeout_s, retries, tls=False)
+
+
+@register_probe("tls")
+def probe_tls(base_url: str, stats_path: str = "", timeout_s: float = 8, retries: int = 1, **_):
+    """TCP connect + TLS handshake (certificate verified)."""
+    return _probe_connect(base_url, timeout_s, retries, tls=True)
+
+
+@register_probe("http_head")
+def probe_http_head(base_url: str, stats_path: str = "/", timeout_s: float = 8, retries: int = 1, **_):
+    """HEAD base_url + stats_path; OK when HTTP status < 400."""
+    url = _join_url(base_url, stats_path or "/")
+    parts = urlsplit(url)
+
+    last = None
+    for attempt in range(retries + 1):
+        t0 = time.perf_counter()
+        timings: dict = {}
+        conn = None
+        try:
+            # already connected (+ TLS): only time the request here
+            conn, target, headers = _connect_http(parts, timeout_s, timings)
+
+            t_req = time.perf_counter()
+            conn.request("HEAD", target, headers=headers)
+            resp = conn.getresponse()
+            timings["ttfb_ms"] = _ms(t_req)
+            resp.close()
+            conn.close()
+
+            latency_ms = _ms(t0)
+            http_status = resp.status
+            return _timing_result(
+                url, latency_ms, timings,
+                ok=http_status < 400,
+                http_status=http_status,
+                reason=None if http_status < 400 else f"http_{http_status}",
+            )
+
+        except Exception as e:
+            if conn is not None:
+                conn.close()
+            last = _fail(_conn_reason(e), _ms(t0), url, timings=timings)
+            if isinstance(e, ssl.SSLError):
+                return last  # cert/handshake problems don't fix themselves on retry
+
+    return last
+
+
+def _probe_connect(base_url: str, timeout_s: float, retries: int, tls: bool) -> dict:
+    url = _join_url(base_url, "")
+    parts = urlsplit(url)
+
+    last = None
+    for attempt in range(retries + 1):
+        t0 = time.perf_counter()
+        timings: dict = {}
+        try:
+            sock = _open_socket(parts, timeout_s, tls, timings)
+            sock.close()
+            return _timing_result(url, _ms(t0), timings, ok=True)
+        except Exception as e:
+            last = _fail(_conn_reason(e), _ms(t0), url, timings=timings)
+            if isinstance(e, ssl.SSLError):
+                return last
+
+    return last
+
+
+def _open_socket(parts, timeout_s: float, tls: bool, timings: dict) -> socket.socket:
+    """Connected (and optionally TLS-wrapped) socket; fills timings {dns_ms, connect_ms, tls_ms} step by step."""
+    host = parts.hostname or ""
+    port = parts.port or (443 if (tls or parts.scheme == "https") else 80)
 
-        except ValueError:
-            # JSON parse error - no retry
-            last_latency = int((time.perf_counter() - t0) * 1000)
-            return _fail("bad_json", last_latency, url)
+    sock, _ = dnscache.create_connection(host, port, timeout_s, timings)
+    return _wrap_tls(sock, host, timings) if tls else sock
 
-    # should never hit
-    return _fail("unknown", last_latency, url)
 
+def _wrap_tls(sock: socket.socket, host: str, timings: dict) -> socket.socket:
+    t1 = time.perf_counter()
+    try:
+        if isinstance(sock, ssl.SSLSocket):
+            # https:// proxy: TLS to the target inside the TLS to the proxy
+            return SSLTransport(sock, _ssl_context(), server_hostname=host)
+        return _ssl_context().wrap_socket(sock, server_hostname=host)
+    except Exception:
+        sock.close()
+        raise
+    finally:
+        timings["tls_ms"] = timings.get("tls_ms", 0) + _ms(t1)
 
-def _fail(reason: str, latency_ms: int | None, url: str):
+
+_ssl_contexts: dict[str, ssl.SSLContext] = {}
+
+
+def _ssl_context() -> ssl.SSLContext:
+    """
+    Verifying context with the CAs requests would use: REQUESTS_CA_BUNDLE / CURL_CA_BUNDLE
+    (file or directory), else certifi's bundle. One context per bundle (loading it is slow).
+    """
+    ca = os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("CURL_CA_BUNDLE") or _certifi_where()
+    ctx = _ssl_contexts.get(ca)
+    if ctx is None:
+        if not ca:
+            ctx = ssl.create_default_context()  # no certifi: system store
+        elif os.path.isdir(ca):
+            ctx = ssl.create_default_context(capath=ca)
+        else:
+            ctx = ssl.create_default_context(cafile=ca)
+        _ssl_contexts[ca] = ctx
+    return ctx
+
+
+def _certifi_where() -> str:
+    try:
+        import certifi  # installed with requests
+    except ImportError:
+        return ""
+    return certifi.where()
+
+
+def _connect_http(parts, timeout_s: float, timings: dict) -> tuple[http.client.HTTPConnection, str, dict]:
+    """
+    Connection for an HTTP probe, direct or through the environment proxy.
+    Returns (connection with its socket open, request target, headers).
+    """
+    https = parts.scheme == "https"
+    host = parts.hostname or ""
+    port = parts.port or (443 if https else 80)
+    target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    headers = {"User-Agent": USER_AGENT}
+
+    proxy = _proxy_for(parts)
+    if proxy is None:
+        sock = _open_socket(parts, timeout_s, https, timings)
+    elif proxy.scheme.startswith("socks"):
+        sock = _socks_connect(proxy, host, port, timeout_s, timings)
+        if https:
+            sock = _wrap_tls(sock, host, timings)
+    else:
+        auth = _proxy_auth(proxy)
+        sock = _open_socket(proxy, timeout_s, proxy.scheme == "https", timings)
+        if https:
+            try:
+                _tunnel(sock, host, port, auth)
+            except Exception:
+                sock.close()
+                raise
+            sock = _wrap_tls(sock, host, timings)
+        else:
+            # plain http through a proxy: absolute URL, the proxy connects
+            target = urlunsplit((parts.scheme, parts.netloc, parts.path or "/", parts.query, ""))
+            if auth:
+                headers["Proxy-Authorization"] = auth
+
+    conn_cls = http.client.HTTPSConnection if https else http.client.HTTPConnection
+    conn = conn_cls(host, port, timeout=timeout_s)
+    conn.sock = sock
+    return conn, target, headers
+
+
+def _proxy_for(parts):
+    """
+    Proxy for this URL from the environment (HTTP_PROXY / HTTPS_PROXY / NO_PROXY, same
+    variables requests reads; system settings on macOS / Windows), None => direct.
+    http:// and https:// proxies (CONNECT for https targets), socks4(a):// / socks5(h)://
+    with PySocks installed (same as requests[socks]).
+    """
+    proxy = urllib.request.getproxies().get(parts.scheme)
+    if not proxy or urllib.request.proxy_bypass(parts.netloc.rpartition("@")[2]):
+        return None
+    if "://" not in proxy:
+        proxy = "http://" + proxy
+    p = urlsplit(proxy)
+    if p.scheme not in _PROXY_SCHEMES:
+        raise ValueError(f"unsupported proxy {p.scheme}://")
+    return p
+
+
+_PROXY_SCHEMES = frozenset(("http", "https", "socks4", "socks4a", "socks5", "socks5h"))
+
+
+def _socks_connect(proxy, host: str, port: int, timeout_s: float, timings: dict) -> socket.socket:
+    """Socket to host:port through a SOCKS proxy; socks4a / socks5h: the proxy resolves host."""
+    try:
+        import socks
+    except ImportError:
+        raise OSError(f"{proxy.scheme}:// proxy needs PySocks (pip install PySocks)") from None
+
+    version = socks.SOCKS4 if proxy.scheme.startswith("socks4") else socks.SOCKS5
+    t1 = time.perf_counter()
+    try:
+        return socks.create_connection(
+            (host, port), timeout=timeout_s,
+            proxy_type=version, proxy_addr=proxy.hostname, proxy_port=proxy.port or 1080,
+            proxy_rdns=proxy.scheme in ("socks4a", "socks5h"),
+            proxy_username=unquote(proxy.username) if proxy.username else None,
+            proxy_password=unquote(proxy.password) if proxy.password else None,
+        )
+    finally:
+        timings["dns_ms"] = 0  # inside the proxy handshake
+        timings["connect_ms"] = _ms(t1)
+
+
+def _proxy_auth(p) -> str | None:
+    if not p.username:
+        return None
+    userpass = f"{unquote(p.username)}:{unquote(p.password or '')}"
+    return "Basic " + base64.b64encode(userpass.encode("utf-8")).decode("ascii")
+
+
+def _tunnel(sock: socket.socket, host: str, port: int, auth: str | None):
+    """CONNECT host:port through the proxy on sock (before the TLS handshake)."""
+    if not host.isascii():
+        host = host.encode("idna").decode("ascii")
+    authority = f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+    lines = [f"CONNECT {authority} HTTP/1.1", f"Host: {authority}"]
+    if auth:
+        lines.append(f"Proxy-Authorization: {auth}")
+    sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("ascii"))
+
+    resp = http.client.HTTPResponse(sock, method="CONNECT")
+    try:
+        resp.begin()
+    finally:
+        resp.close()  # the buffered reader only, the socket stays open
+    if resp.status != 200:
+        raise OSError(f"proxy CONNECT {authority}: {resp.status} {resp.reason}")
+
+
+def _timing_result(url: str, latency_ms: int, timings: dict, ok: bool,
+                   http_status: int | None = None, reason: str | None = None) -> dict:
+    return {
+        "ok": ok,
+        "http_status": http_status,
+        "latency_ms": latency_ms,
+        "cpu_percent": None,
+        "mem_percent": None,
+        "disk_percent": None,
+        "swap_percent": None,
+        "raw_json": json.dumps(timings),
+        "reason": reason,
+        "url": url,
+        "timings": timings,
+    }
+
+
+def _conn_reason(e: Exception) -> str:
+    if isinstance(e, ssl.SSLError):
+        return "tls_error"
+    if isinstance(e, (socket.timeout, TimeoutError)):
+        return "timeout"
+    return "request_error"
+
+
+def _join_url(base_url: str, path: str) -> str:
+    base = (base_url or "").rstrip("/") + "/"
+    return urljoin(base, (path or "").lstrip("/"))
+
+
+def _ms(t0: float) -> int:
+    return int((time.perf_counter() - t0) * 1000)
+
+
+def _read_body(resp: http.client.HTTPResponse, max_body_bytes: int) -> bytes:
+    """Read at most max_body_bytes of the response (decoded size for Content-Encoding: gzip)."""
+    declared = resp.getheader("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_body_bytes:
+        raise _BodyTooLarge()
+
+    encoding = (resp.getheader("Content-Encoding") or "").strip().lower()
+    gz = zlib.decompressobj(16 + zlib.MAX_WBITS) if encoding in ("gzip", "x-gzip") else None
+
+    buf = bytearray()
+    while True:
+        chunk = resp.read(_CHUNK)
+        if not chunk:
+            break
+        if gz is not None:
+            # bounded output: a small gzip bomb cannot blow up memory
+            chunk = gz.decompress(chunk, max_body_bytes + 1 - len(buf))
+        buf += chunk
+        if len(buf) > max_body_bytes:
+            raise _BodyTooLarge()
+    if resp.length:
+        # connection closed before Content-Length bytes (chunked bodies raise by themselves)
+        raise http.client.IncompleteRead(bytes(buf), resp.length)
+    if gz is not None:
+        buf += gz.flush()
+        if len(buf) > max_body_bytes:
+            raise _BodyTooLarge()
+        if not gz.eof:
+            raise http.client.IncompleteRead(bytes(buf))
+    return bytes(buf)
+
+
+def _pick_metric_keys(pairs: list[tuple]) -> dict:
+    return {k: v for k, v in pairs if k in _KEEP_KEYS}
+
+
+def _fail(reason: str, latency_ms: int | None, url: str, http_status: int | None = None,
+          raw_json: str | None = None, timings: dict | None = None):
     return {
         "ok": False,
-        "http_status": None,
+        "http_status": http_status,
         "latency_ms": latency_ms,
         "cpu_percent": None,
         "mem_percent": None,
         "disk_percent": None,
         "swap_percent": None,
-        "raw_json": None,
+        "raw_json": raw_json,
         "reason": reason,
         "url": url,
+        "timings": timings or {},
+    }
+
+
+def extract_metrics(data: dict) -> dict:
+    """cpu/mem/disk/swap percent from a stats payload (also used by push heartbeats)."""
+    return {
+        "cpu_percent": _get_first_number(data, CPU_KEYS),
+        "mem_percent": _get_first_number(data, MEM_KEYS),
+        "disk_percent": _get_first_number(data, DISK_KEYS),
+        "swap_percent": _get_first_number(data, SWAP_KEYS),
     }
 
 
@@ -128,7 +549,7 @@ def _get_first_number(data: dict, keys: list[str]):
             return float(v)
 
         if isinstance(v, dict):
-            for kk in ("percent", "pct", "value"):
+            for kk in _NESTED_KEYS:
                 vv = v.get(kk)
                 if isinstance(vv, (int, float)):
                     return float(vv)
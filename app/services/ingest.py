@@ -0,0 +1,243 @@
+# app/services/ingest.py
+import json
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.exc import IntegrityError
+
+from .. import db
+from ..models import Target, Snapshot, IngestKey
+from . import breaker, tsstore
+from .fetcher import extract_metrics
+from .scheduler import apply_result, rebuild_events, _floor_hour
+
+_INT_FIELDS = ("http_status", "latency_ms")
+_TIMING_FIELDS = ("dns_ms", "connect_ms", "tls_ms", "ttfb_ms")
+_FLOAT_FIELDS = ("cpu_percent", "mem_percent", "disk_percent", "swap_percent")
+
+
+def agent_targets(app, shard: int = 0, shards: int = 1) -> dict:
+    """
+    Work list for one probe agent: enabled targets with id % shards == shard,
+    plus the probe plan (circuit breaker / adaptive timeout) decided here.
+    """
+    tz = ZoneInfo(app.config.get("TIMEZONE", "Asia/Bangkok"))
+    hour_bucket = _floor_hour(datetime.now(tz))
+
+    q = Target.query.filter(Target.enabled.is_(True), Target.probe_type != "push")
+    if shards > 1:
+        q = q.filter(Target.id % shards == shard)
+
+    out = []
+    for t in q.order_by(Target.id.asc()).all():
+        plan = breaker.plan(app, t.id, hour_bucket)
+        out.append({
+            "id": t.id,
+            "probe_type": t.probe_type,
+            "base_url": t.base_url,
+            "stats_path": t.stats_path,
+            "probe": plan.probe,
+            "timeout_s": plan.timeout_s,
+            "retries": plan.retries,
+        })
+
+    return {"hour_bucket": hour_bucket.replace(tzinfo=None).isoformat(), "targets": out}
+
+
+def store_batch(app, items: list, keys: list | None = None) -> dict:
+    """
+    Bulk insert results pushed by agents:
+      item = {target_id, polled_at (ISO, with offset; naive = UTC), ok, http_status, latency_ms,
+              cpu_percent, mem_percent, disk_percent, swap_percent, raw_json, reason,
+              timings (optional {dns_ms, connect_ms, tls_ms, ttfb_ms})}
+    Each item lands in the hour_bucket of its polled_at (TIMEZONE). One commit for
+    all snapshots, then events are rebuilt per target from the oldest touched bucket.
+    keys: idempotency key per item (or None), saved in the same commit for the items
+    that are stored - a rejected item can be sent again with its key (store_heartbeats).
+    Returns {"stored": n, "rejected": [{"index": i, "error": "..."}]}.
+    """
+    tz = ZoneInfo(app.config.get("TIMEZONE", "Asia/Bangkok"))
+    max_raw = int(app.config.get("FETCH_MAX_BODY_BYTES", 256 * 1024))
+
+    rejected = []
+    accepted = []  # (index, target_id)
+    parsed: dict[tuple[int, datetime], tuple[datetime, dict]] = {}
+    for i, item in enumerate(items):
+        try:
+            target_id, polled_at, result = _parse_item(item, tz, max_raw)
+        except (TypeError, ValueError, KeyError) as e:
+            rejected.append({"index": i, "error": str(e) or e.__class__.__name__})
+            continue
+
+        if result.get("reason") == "circuit_open":
+            continue  # older agents report skipped probes: nothing measured, the hour stays unknown
+
+        accepted.append((i, target_id))
+        key = (target_id, _floor_hour(polled_at).replace(tzinfo=None))
+        # same target + hour twice in one batch: newest sample wins (same as upsert)
+        if key not in parsed or parsed[key][0] < polled_at:
+            parsed[key] = (polled_at, result)
+
+    if not parsed:
+        return {"stored": 0, "rejected": rejected}
+
+    target_ids = {tid for (tid, _) in parsed}
+    known = {
+        tid for (tid,) in
+        Target.query.with_entities(Target.id).filter(Target.id.in_(target_ids), Target.enabled.is_(True)).all()
+    }
+    for (tid, bucket) in list(parsed):
+        if tid not in known:
+            parsed.pop((tid, bucket))
+            rejected.append({"target_id": tid, "error": "unknown or disabled target"})
+    if not parsed:
+        return {"stored": 0, "rejected": rejected}
+
+    buckets = {bucket for (_, bucket) in parsed}
+    existing = {
+        (s.target_id, s.hour_bucket): s
+        for s in Snapshot.query.filter(
+            Snapshot.target_id.in_(known),
+            Snapshot.hour_bucket.in_(buckets),
+        ).all()
+    }
+
+    for key in sorted(parsed, key=lambda k: k[1]):
+        polled_at, result = parsed[key]
+        snap = existing.get(key)
+        if snap is None:
+            snap = Snapshot(target_id=key[0], hour_bucket=key[1])
+            db.session.add(snap)
+        apply_result(snap, result, polled_at.replace(tzinfo=None))
+        existing[key] = snap
+    for i, tid in accepted:
+        if keys and keys[i] and tid in known:
+            db.session.add(IngestKey(target_id=tid, key=keys[i]))
+
+    db.session.commit()
+    for key in sorted(parsed, key=lambda k: k[1]):
+        tsstore.record(app, key[0], existing[key])
+
+    # breaker + events, per target in bucket order
+    since: dict[int, datetime] = {}
+    reasons: dict[int, dict] = {}
+    for (tid, bucket) in sorted(parsed, key=lambda k: k[1]):
+        result = parsed[(tid, bucket)][1]
+        breaker.record(app, tid, bool(result.get("ok")), bucket.replace(tzinfo=tz))
+        since.setdefault(tid, bucket)
+        reasons.setdefault(tid, {})[bucket] = result.get("reason")
+
+    for tid, start in since.items():
+        rebuild_events(tid, start, reasons[tid])
+
+    return {"stored": len(parsed), "rejected": rejected}
+
+
+def store_heartbeats(app, target: Target, beats: list, raw_body: str | None = None) -> dict:
+    """
+    Push mode, see _store_heartbeats(). A concurrent request that commits one of the same
+    idempotency keys first makes our commit fail: roll back and store again without the keys
+    accepted meanwhile (they count as duplicates). Raises IntegrityError if it still conflicts.
+    """
+    for attempt in range(3):
+        try:
+            return _store_heartbeats(app, target, beats, raw_body)
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == 2:
+                raise
+
+
+def _store_heartbeats(app, target: Target, beats: list, raw_body: str | None = None) -> dict:
+    """
+    Push mode: the target reports itself (no outbound request).
+      beat = {"ts": ISO (optional, default now), "key": idempotency key (optional),
+              "ok": bool (optional, default true), "stats": {...} or stats keys inline}
+    Stats use the same keys as fetch_stats (extract_metrics). Beats whose key was
+    already accepted are skipped. Everything else goes through store_batch().
+    raw_body: original body of a single-beat push, stored as raw_json as-is.
+    """
+    now = datetime.now(timezone.utc)
+    max_raw = int(app.config.get("FETCH_MAX_BODY_BYTES", 256 * 1024))
+
+    keys = [str(b.get("key"))[:128] for b in beats if isinstance(b, dict) and b.get("key")]
+    seen = set()
+    if keys:
+        seen = {
+            k for (k,) in
+            IngestKey.query.with_entities(IngestKey.key)
+            .filter(IngestKey.target_id == target.id, IngestKey.key.in_(keys))
+            .all()
+        }
+
+    items, item_keys, origin, rejected, duplicates = [], [], [], [], 0
+    for i, b in enumerate(beats):
+        if not isinstance(b, dict):
+            rejected.append({"index": i, "error": "heartbeat must be an object"})
+            continue
+
+        key = str(b["key"])[:128] if b.get("key") else None
+        if key is not None:
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+
+        stats = b.get("stats") if isinstance(b.get("stats"), dict) else b
+        ok = bool(b.get("ok", True))
+        raw = raw_body if (raw_body is not None and len(beats) == 1) else json.dumps(stats, ensure_ascii=False)
+        items.append({
+            "target_id": target.id,
+            "polled_at": b.get("ts") or now.isoformat(),
+            "ok": ok,
+            "reason": None if ok else (b.get("reason") or "reported_down"),
+            **extract_metrics(stats),
+            "raw_json": raw[:max_raw],
+        })
+        item_keys.append(key)
+        origin.append(i)
+
+    out = store_batch(app, items, item_keys)
+
+    for r in out["rejected"]:
+        if "index" in r:
+            r["index"] = origin[r["index"]]  # back to the position in `beats`
+    out["rejected"] = rejected + out["rejected"]
+    out["duplicates"] = duplicates
+    return out
+
+
+def prune_ingest_keys(retention_hours: int):
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    IngestKey.query.filter(IngestKey.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _parse_item(item: dict, tz: ZoneInfo, max_raw: int):
+    target_id = int(item["target_id"])
+
+    polled_at = datetime.fromisoformat(str(item["polled_at"]))
+    if polled_at.tzinfo is None:
+        polled_at = polled_at.replace(tzinfo=timezone.utc)
+    polled_at = polled_at.astimezone(tz)
+
+    result = {"ok": bool(item.get("ok")), "reason": _opt_str(item.get("reason"), 255)}
+    for k in _INT_FIELDS:
+        v = item.get(k)
+        result[k] = None if v is None else int(v)
+    for k in _FLOAT_FIELDS:
+        v = item.get(k)
+        result[k] = None if v is None else float(v)
+    result["raw_json"] = _opt_str(item.get("raw_json"), max_raw)
+    timings = item.get("timings") or {}
+    if not isinstance(timings, dict):
+        raise ValueError("timings must be an object")
+    result["timings"] = {k: int(timings[k]) for k in _TIMING_FIELDS if timings.get(k) is not None}
+
+    return target_id, polled_at, result
+
+
+def _opt_str(v, max_len: int):
+    if v is None:
+        return None
+    return str(v)[:max_len]
@@ -0,0 +1,113 @@
+# app/services/jobs.py
+"""
+Owner background jobs ("add + test", import probing, update check).
+
+The job runs on the scheduler thread pool of the process that submitted it;
+its state is a row of the jobs table, so /owner/jobs/<id> answers from any
+web worker (RUN_SCHEDULER=0 setups). Finished jobs are kept JOB_RETENTION_S.
+"""
+import json
+import threading
+import uuid
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from .. import db
+from ..models import BackgroundJob
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = "queued"  # queued / running / done / error
+    target_id: int | None = None
+    created_at: float | None = None
+    finished_at: float | None = None
+    result: Any = None
+    error: str | None = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def submit(app, kind: str, fn: Callable, *args, target_id: int | None = None) -> Job:
+    """
+    Run fn(app, *args) in the background on the scheduler's thread pool
+    (same executor as the poll jobs). At most JOB_QUEUE_MAX jobs queued/running
+    (all processes), raises QueueFull beyond that. Call inside app context.
+    """
+    max_active = int(app.config.get("JOB_QUEUE_MAX", 16))
+    cutoff = datetime.utcnow() - timedelta(seconds=float(app.config.get("JOB_RETENTION_S", 900)))
+
+    BackgroundJob.query.filter(BackgroundJob.created_at < cutoff).delete(synchronize_session=False)
+    active = (
+        BackgroundJob.query
+        # a job of a process that died stays "running": it stops counting after the retention
+        .filter(BackgroundJob.status.in_(("queued", "running")), BackgroundJob.created_at >= cutoff)
+        .count()
+    )
+    if active >= max_active:
+        db.session.commit()
+        raise QueueFull()
+    row = BackgroundJob(id=uuid.uuid4().hex[:16], kind=kind, target_id=target_id)
+    db.session.add(row)
+    db.session.commit()
+    job = _to_job(row)
+
+    from .scheduler import get_scheduler
+    sched = get_scheduler()
+    if sched is not None and sched.running:
+        # no trigger => run once, now, on the scheduler executor
+        sched.add_job(_run, args=(app, job.id, fn, args), id=f"job-{job.id}", misfire_grace_time=None)
+    else:
+        # scheduler not started (e.g. reloader parent / scripts)
+        threading.Thread(target=_run, args=(app, job.id, fn, args), name=f"job-{job.id}", daemon=True).start()
+    return job
+
+
+def get(job_id: str) -> Job | None:
+    """Inside app context."""
+    row = db.session.get(BackgroundJob, job_id) if job_id else None
+    return _to_job(row) if row is not None else None
+
+
+def _run(app, job_id: str, fn: Callable, args: tuple):
+    with app.app_context():
+        _update(job_id, status="running")
+        try:
+            result = fn(app, *args)
+        except Exception as e:
+            db.session.rollback()
+            _update(job_id, status="error", error=str(e) or e.__class__.__name__, finished_at=datetime.utcnow())
+        else:
+            _update(job_id, status="done", result=json.dumps(result, default=str), finished_at=datetime.utcnow())
+        finally:
+            db.session.remove()
+
+
+def _update(job_id: str, **values):
+    BackgroundJob.query.filter_by(id=job_id).update(values, synchronize_session=False)
+    db.session.commit()
+
+
+def _to_job(row: BackgroundJob) -> Job:
+    return Job(
+        id=row.id,
+        kind=row.kind,
+        status=row.status,
+        target_id=row.target_id,
+        created_at=_ts(row.created_at),
+        finished_at=_ts(row.finished_at),
+        result=json.loads(row.result) if row.result else None,
+        error=row.error,
+    )
+
+
+def _ts(dt: datetime | None) -> float | None:
+    return dt.replace(tzinfo=timezone.utc).timestamp() if dt else None
@@ -0,0 +1,237 @@
+# app/services/live.py
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from .. import db
+from ..models import LiveEvent
+
+# how many recent messages each process keeps in memory for fast fan-out
+BUFFER_SIZE = 500
+# max rows replayed from DB when a client reconnects with an old Last-Event-ID
+BACKFILL_MAX = 500
+# default LIVE_LATE_WINDOW_S, see Seen
+LATE_WINDOW_S = 60
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def publish(kind: str, target_id: int | None, payload: dict):
+    """
+    Queue a live message in the current session.
+    Caller commits (same transaction as the snapshot/event it describes).
+    """
+    row = LiveEvent(
+        kind=kind,
+        target_id=target_id,
+        payload=json.dumps(payload, ensure_ascii=False, default=str),
+    )
+    db.session.add(row)
+    return row
+
+
+def prune(retention_hours: int):
+    """Delete notification rows older than retention_hours."""
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    LiveEvent.query.filter(LiveEvent.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def get_hub(app) -> "_Hub":
+    """One hub per web process; started lazily on first subscriber."""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = _Hub(app)
+            _hub.start()
+        return _hub
+
+
+def format_sse(msg: dict) -> str:
+    if msg.get("late"):
+        # no id: line => the browser keeps its Last-Event-ID (a higher id it already got)
+        return f"event: {msg['kind']}\ndata: {msg['data']}\n\n"
+    return f"id: {msg['id']}\nevent: {msg['kind']}\ndata: {msg['data']}\n\n"
+
+
+def _to_msg(row: LiveEvent) -> dict:
+    return {"id": row.id, "kind": row.kind, "data": row.payload}
+
+
+class Seen:
+    """
+    Ids tailed during the last window_s seconds, to catch rows that became visible
+    after a higher id was already read. PostgreSQL hands out ids at insert but
+    transactions commit in any order, so "id > cursor" alone skips a row whose
+    transaction committed late. SQLite writes one transaction at a time (ids show
+    up in order), the extra query only finds nothing there.
+    The window must be longer than the longest transaction that publishes (default 60s).
+    Use inside app context.
+    """
+
+    def __init__(self, window_s: float = LATE_WINDOW_S):
+        self.window_s = window_s
+        self.ids: dict[int, datetime] = {}  # id -> created_at
+
+    def add(self, rows):
+        """rows: LiveEvent rows / tuples with .id and .created_at"""
+        for r in rows:
+            self.ids[r.id] = r.created_at
+
+    def seed(self, cursor: int):
+        """Everything up to cursor counts as read (start / full rebuild)."""
+        self.ids.clear()
+        if self.window_s > 0:
+            self.add(self._window(cursor))
+
+    def missed(self, cursor: int) -> list[int]:
+        """Ids <= cursor inside the window that were never tailed."""
+        if self.window_s <= 0:
+            return []
+        since = self._since()
+        self.ids = {i: at for i, at in self.ids.items() if at >= since}
+        return [r.id for r in self._window(cursor) if r.id not in self.ids]
+
+    def _since(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.window_s)
+
+    def _window(self, cursor: int) -> list:
+        return (
+            db.session.query(LiveEvent.id, LiveEvent.created_at)
+            .filter(LiveEvent.created_at >= self._since(), LiveEvent.id <= cursor)
+            .all()
+        )
+
+
+class _Hub:
+    """
+    Tails live_events by id (DB-backed cursor, works across processes)
+    and wakes every SSE generator in this process.
+      - floor: everything with floor < id <= cursor is in buffer
+      - older ids are replayed straight from DB (reconnect w/ Last-Event-ID)
+      - rows committed after a higher id (see Seen) are appended as "late"
+        messages; buffer order is arrival order, connected clients follow seq
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.cond = threading.Condition()
+        self.buffer: deque[dict] = deque(maxlen=BUFFER_SIZE)
+        self.cursor = 0
+        self.floor = 0
+        self.seq = 0  # arrival counter of this hub (buffer position)
+        self.seen = Seen(float(app.config.get("LIVE_LATE_WINDOW_S", LATE_WINDOW_S)))
+        self.thread: threading.Thread | None = None
+
+    def start(self):
+        with self.app.app_context():
+            last = db.session.query(db.func.max(LiveEvent.id)).scalar() or 0
+            self.seen.seed(last)
+            db.session.remove()
+        self.cursor = last
+        self.floor = last
+
+        self.thread = threading.Thread(target=self._run, name="live-hub", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        interval = float(self.app.config.get("LIVE_POLL_INTERVAL_S", 2))
+        while True:
+            try:
+                self._tail()
+            except Exception:
+                # DB busy / locked: try again next tick
+                pass
+            time.sleep(interval)
+
+    def _tail(self):
+        with self.app.app_context():
+            missed = self.seen.missed(self.cursor)
+            late = (
+                LiveEvent.query.filter(LiveEvent.id.in_(missed)).order_by(LiveEvent.id.asc()).all()
+                if missed else []
+            )
+            rows = (
+                LiveEvent.query
+                .filter(LiveEvent.id > self.cursor)
+                .order_by(LiveEvent.id.asc())
+                .limit(BUFFER_SIZE)
+                .all()
+            )
+            self.seen.add(late)
+            self.seen.add(rows)
+            msgs = [dict(_to_msg(r), late=True) for r in late] + [_to_msg(r) for r in rows]
+            db.session.remove()
+
+        if not msgs:
+            return
+
+        with self.cond:
+            for m in msgs:
+                if len(self.buffer) == self.buffer.maxlen:
+                    self.floor = max(self.floor, self.buffer[0]["id"])
+                self.seq += 1
+                m["seq"] = self.seq
+                self.buffer.append(m)
+            if rows:
+                self.cursor = rows[-1].id
+            self.cond.notify_all()
+
+    def _backfill(self, last_id: int) -> list[dict]:
+        with self.app.app_context():
+            rows = (
+                LiveEvent.query
+                .filter(LiveEvent.id > last_id, LiveEvent.id <= self.cursor)
+                .order_by(LiveEvent.id.asc())
+                .limit(BACKFILL_MAX)
+                .all()
+            )
+            msgs = [_to_msg(r) for r in rows]
+            db.session.remove()
+        return msgs
+
+    def wait(self, last_id: int, timeout: float, seq: int | None = None) -> tuple[list[dict], int, int]:
+        """
+        Messages after the client's position (blocks up to timeout when there are none).
+        First call: seq=None, position = last_id (Last-Event-ID). Then pass back what
+        was returned: seq follows the buffer, so late messages (lower id) still arrive.
+        Returns (messages, new_last_id, new_seq).
+        """
+        if seq is not None:
+            with self.cond:
+                if not self.buffer or self.buffer[0]["seq"] <= seq + 1:
+                    msgs = [m for m in self.buffer if m["seq"] > seq]
+                    if not msgs:
+                        self.cond.wait(timeout)
+                        msgs = [m for m in self.buffer if m["seq"] > seq]
+                    return msgs, _last_id(msgs, last_id), (msgs[-1]["seq"] if msgs else seq)
+            # slow client: its position left the buffer -> go on by id
+
+        if last_id > self.cursor:
+            # client ahead of this hub (hub restarted, other process tailed further):
+            # resume from our cursor, a few repeats are harmless (updates are idempotent)
+            last_id = self.cursor
+        if last_id < self.floor:
+            # client is behind the in-memory buffer -> replay from DB
+            seq = self.seq
+            msgs = self._backfill(last_id)
+            if msgs:
+                return msgs, msgs[-1]["id"], seq
+            # replay window already pruned: continue from buffer
+            last_id = self.floor
+
+        with self.cond:
+            msgs = [m for m in self.buffer if m["id"] > last_id]
+            if not msgs:
+                self.cond.wait(timeout)
+                msgs = [m for m in self.buffer if m["id"] > last_id]
+            seq = msgs[-1]["seq"] if msgs else self.seq
+
+        return msgs, _last_id(msgs, last_id), seq
+
+
+def _last_id(msgs: list[dict], last_id: int) -> int:
+    return max([last_id] + [m["id"] for m in msgs if not m.get("late")])
@@ -1,7 +1,13 @@
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
-from ..models import Snapshot
+from sqlalchemy import and_, case, func, or_
+
+from .. import db
+from ..models import Event, Snapshot, Target
+from . import archive, tsstore
+
+UPTIME_WINDOWS = {"24h": 24, "7d": 24 * 7, "30d": 24 * 30, "90d": 24 * 90}
 
 
 def get_latest_snapshot(target_id: int):
@@ -13,11 +19,28 @@ def get_latest_snapshot(target_id: int):
     )
 
 
-def latency_series(target_id: int, hours: int = 48, tz_name: str = "Asia/Bangkok"):
+PHASES = ("dns", "connect", "tls", "ttfb")
+
+
+def last_poll(target_id: int):
+    """polled_at of the newest snapshot (index seek + 1 row), None when never polled."""
+    row = (
+        Snapshot.query
+        .with_entities(Snapshot.polled_at)
+        .filter(Snapshot.target_id == target_id)
+        .order_by(Snapshot.hour_bucket.desc())
+        .first()
+    )
+    return row.polled_at if row else None
+
+
+def latency_series(target_id: int, hours: int = 48, tz_name: str = "Asia/Bangkok", phases: bool = False):
     """
     Return JSON-ready payload for Chart.js:
     { labels: [...], values: [...] }
     Only points that exist in DB are included.
+    phases=True adds the breakdown per point (SQL, the columnar store has no phase columns):
+    { ..., phases: {dns: [...], connect: [...], tls: [...], ttfb: [...], total: [...]} }
     """
     tz = ZoneInfo(tz_name)
     end = datetime.now(tz).replace(minute=0, second=0, microsecond=0)
@@ -26,8 +49,20 @@ def latency_series(target_id: int, hours: int = 48, tz_name: str = "Asia/Bangkok
     start_n = start.replace(tzinfo=None)
     end_n = end.replace(tzinfo=None)
 
+    if phases:
+        return _phase_series(target_id, start_n, end_n)
+
+    series = _series(target_id)
+    if series is not None:
+        lo, hi = series.span(start_n, end_n)
+        return {
+            "labels": [tsstore.from_ts(t).strftime("%m-%d %H:%M") for t in series.ts[lo:hi]],
+            "values": [tsstore.value("latency_ms", v) for v in series.slice("latency_ms", lo, hi)],
+        }
+
     rows = (
         Snapshot.query
+        .with_entities(Snapshot.hour_bucket, Snapshot.latency_ms)
         .filter(
             Snapshot.target_id == target_id,
             Snapshot.hour_bucket >= start_n,
@@ -47,6 +82,44 @@ def latency_series(target_id: int, hours: int = 48, tz_name: str = "Asia/Bangkok
     return {"labels": labels, "values": values}
 
 
+def _phase_series(target_id: int, start: datetime, end: datetime) -> dict:
+    cols = [getattr(Snapshot, f"{p}_ms") for p in PHASES]
+    rows = (
+        Snapshot.query
+        .with_entities(Snapshot.hour_bucket, Snapshot.latency_ms, *cols)
+        .filter(
+            Snapshot.target_id == target_id,
+            Snapshot.hour_bucket >= start,
+            Snapshot.hour_bucket < end,
+        )
+        .order_by(Snapshot.hour_bucket.asc())
+        .all()
+    )
+    out = {p: [] for p in PHASES + ("total",)}
+    for r in rows:
+        for i, p in enumerate(PHASES):
+            out[p].append(r[2 + i])
+        out["total"].append(r.latency_ms)
+    return {
+        "labels": [r.hour_bucket.strftime("%m-%d %H:%M") for r in rows],
+        "values": out["total"],
+        "phases": out,
+    }
+
+
+def _series(target_id: int):
+    """Columnar store view when it is enabled + built, else None (SQL path)."""
+    return tsstore.open_series(target_id) if tsstore.ready() else None
+
+
+def _pct(ok_col) -> float | None:
+    # ok column slice (0/1 bytes) -> uptime %, None when empty
+    total = len(ok_col)
+    if total == 0:
+        return None
+    return ok_col.tobytes().count(1) * 100.0 / total
+
+
 def _classify(pct: float) -> str:
     # <10 đỏ, 10-80 vàng, >80 xanh
     if pct < 10:
@@ -68,6 +141,16 @@ def uptime_percent(target_id: int, hours: int, tz_name: str):
     start_n = start.replace(tzinfo=None)
     end_n = end.replace(tzinfo=None)
 
+    h = archive.horizon()
+    if h is not None and start_n < h:
+        pct = uptime_range(target_id, start_n, end_n)["pct"]
+        return None if pct is None else round(pct, 1)
+
+    series = _series(target_id)
+    if series is not None:
+        pct = _pct(series.slice("ok", *series.span(start_n, end_n)))
+        return None if pct is None else round(pct, 1)
+
     rows = (
         Snapshot.query
         .with_entities(Snapshot.ok)
@@ -87,6 +170,32 @@ def uptime_percent(target_id: int, hours: int, tz_name: str):
     return round(ok * 100.0 / total, 1)
 
 
+def uptime_range(target_id: int, start: datetime, end: datetime) -> dict:
+    """
+    Uptime for start <= hour_bucket < end (naive local) over the live DB + cold archive.
+    Long ranges (SLA reports): 1 aggregate query + the archive index.
+    """
+    total, ok = (
+        db.session.query(func.count(Snapshot.id), func.sum(case((Snapshot.ok.is_(True), 1), else_=0)))
+        .filter(Snapshot.target_id == target_id, Snapshot.hour_bucket >= start, Snapshot.hour_bucket < end)
+        .one()
+    )
+    total, ok = int(total or 0), int(ok or 0)
+
+    a_total = a_ok = 0
+    h = archive.horizon()
+    if h is not None and start < h:
+        a_total, a_ok = archive.ok_counts(target_id, start, min(end, h))
+
+    n = total + a_total
+    return {
+        "rows": n,
+        "ok": ok + a_ok,
+        "archived_rows": a_total,
+        "pct": round((ok + a_ok) * 100.0 / n, 3) if n else None,
+    }
+
+
 def bars_90d(target_id: int, tz_name: str):
     """
     90 days daily bars:
@@ -96,6 +205,7 @@ def bars_90d(target_id: int, tz_name: str):
     tz = ZoneInfo(tz_name)
     today = datetime.now(tz).date()
     out = []
+    series = _series(target_id)
 
     for i in range(89, -1, -1):
         d = today - timedelta(days=i)
@@ -105,6 +215,14 @@ def bars_90d(target_id: int, tz_name: str):
         s = day_start.replace(tzinfo=None)
         e = day_end.replace(tzinfo=None)
 
+        if series is not None:
+            pct = _pct(series.slice("ok", *series.span(s, e)))
+            if pct is None:
+                out.append({"date": d.isoformat(), "pct": None, "cls": "unk"})
+            else:
+                out.append({"date": d.isoformat(), "pct": round(pct, 1), "cls": _classify(pct)})
+            continue
+
         rows = (
             Snapshot.query
             .with_entities(Snapshot.ok)
@@ -126,3 +244,208 @@ def bars_90d(target_id: int, tz_name: str):
         out.append({"date": d.isoformat(), "pct": round(pct, 1), "cls": _classify(pct)})
 
     return out
+
+
+# ---- Dashboard (large fleets): status in SQL, stats batched per page ----
+def _latest_join(q):
+    """LEFT JOIN each target's newest snapshot (none => unknown)."""
+    latest = (
+        db.session.query(Snapshot.target_id.label("target_id"), func.max(Snapshot.hour_bucket).label("hb"))
+        .group_by(Snapshot.target_id)
+        .subquery()
+    )
+    return (
+        q.outerjoin(latest, latest.c.target_id == Target.id)
+        .outerjoin(Snapshot, and_(Snapshot.target_id == Target.id, Snapshot.hour_bucket == latest.c.hb))
+    )
+
+
+def _status_expr():
+    return case((Snapshot.id.is_(None), "unknown"), (Snapshot.ok.is_(True), "up"), else_="down")
+
+
+def status_summary() -> dict:
+    """{"up": n, "down": n, "unknown": n, "total": n} in one aggregate query."""
+    status = _status_expr().label("status")
+    rows = _latest_join(db.session.query(status, func.count(Target.id)).select_from(Target)).group_by(status).all()
+    out = {"up": 0, "down": 0, "unknown": 0}
+    out.update({k: int(n) for k, n in rows})
+    out["total"] = sum(out.values())
+    return out
+
+
+def card_page(status: str = "", after: int = 0, limit: int | None = 24, ids: list[int] | None = None) -> list:
+    """
+    One page of targets (keyset on id) with their newest snapshot columns.
+    status: "up" / "down" / "unknown" / "" (all) - filtered in SQL.
+    ids / limit=None: given targets / all of them (status board).
+    """
+    q = _latest_join(
+        db.session.query(
+            Target.id, Target.name, Target.base_url, Target.public_click, Target.enabled,
+            Snapshot.ok, Snapshot.latency_ms, Snapshot.hour_bucket, Snapshot.polled_at,
+            _status_expr().label("status"),
+        ).select_from(Target)
+    )
+    if status in ("up", "down", "unknown"):
+        q = q.filter(_status_expr() == status)
+    if after:
+        q = q.filter(Target.id > after)
+    if ids is not None:
+        q = q.filter(Target.id.in_(ids))
+    q = q.order_by(Target.id.asc())
+    return (q.limit(limit) if limit is not None else q).all()
+
+
+def card_stats(target_ids: list[int], tz_name: str) -> dict:
+    """
+    Uptime windows + 90 day bars for a page of targets in 2 grouped queries
+    (same numbers as uptime_percent / bars_90d, which cost 1 + 90 queries per target).
+    Returns {target_id: {"uptime": {"24h": pct|None, ...}, "bars_90d": [...]}}.
+    """
+    if not target_ids:
+        return {}
+    if tsstore.ready():
+        return {
+            tid: {
+                "uptime": {name: uptime_percent(tid, hours, tz_name) for name, hours in UPTIME_WINDOWS.items()},
+                "bars_90d": bars_90d(tid, tz_name),
+            }
+            for tid in target_ids
+        }
+    tz = ZoneInfo(tz_name)
+    end = datetime.now(tz).replace(minute=0, second=0, microsecond=0).replace(tzinfo=None)
+
+    cols = []
+    for name, hours in UPTIME_WINDOWS.items():
+        inside = Snapshot.hour_bucket >= end - timedelta(hours=hours)
+        cols.append(func.sum(case((inside, 1), else_=0)).label(f"n_{name}"))
+        cols.append(func.sum(case((and_(inside, Snapshot.ok.is_(True)), 1), else_=0)).label(f"ok_{name}"))
+
+    uptime = {}
+    rows = (
+        db.session.query(Snapshot.target_id, *cols)
+        .filter(
+            Snapshot.target_id.in_(target_ids),
+            Snapshot.hour_bucket >= end - timedelta(hours=max(UPTIME_WINDOWS.values())),
+            Snapshot.hour_bucket < end,
+        )
+        .group_by(Snapshot.target_id)
+        .all()
+    )
+    for r in rows:
+        m = r._mapping
+        uptime[r.target_id] = {
+            name: (round(m[f"ok_{name}"] * 100.0 / m[f"n_{name}"], 1) if m[f"n_{name}"] else None)
+            for name in UPTIME_WINDOWS
+        }
+
+    today = datetime.now(tz).date()
+    first = today - timedelta(days=89)
+    day = func.date(Snapshot.hour_bucket)
+    per_day: dict[int, dict[str, tuple[int, int]]] = {}
+    rows = (
+        db.session.query(
+            Snapshot.target_id, day.label("day"),
+            func.count(Snapshot.id), func.sum(case((Snapshot.ok.is_(True), 1), else_=0)),
+        )
+        .filter(
+            Snapshot.target_id.in_(target_ids),
+            Snapshot.hour_bucket >= datetime(first.year, first.month, first.day),
+            Snapshot.hour_bucket < datetime(today.year, today.month, today.day) + timedelta(days=1),
+        )
+        .group_by(Snapshot.target_id, day)
+        .all()
+    )
+    for tid, d, total, ok in rows:
+        per_day.setdefault(tid, {})[str(d)[:10]] = (int(total), int(ok or 0))
+
+    out = {}
+    for tid in target_ids:
+        days = per_day.get(tid, {})
+        bars = []
+        for i in range(89, -1, -1):
+            d = (today - timedelta(days=i)).isoformat()
+            total, ok = days.get(d, (0, 0))
+            if total == 0:
+                bars.append({"date": d, "pct": None, "cls": "unk"})
+                continue
+            pct = ok * 100.0 / total
+            bars.append({"date": d, "pct": round(pct, 1), "cls": _classify(pct)})
+        out[tid] = {"uptime": uptime.get(tid, {name: None for name in UPTIME_WINDOWS}), "bars_90d": bars}
+    return out
+
+
+# ---- Event history / incident stats ----
+def event_page(target_id: int, before: tuple[datetime, int] | None = None, limit: int = 50) -> list:
+    """
+    DOWN events of one target, newest first, keyset on (started_at, id)
+    so it walks ix_events_target_started_state instead of OFFSET.
+    """
+    q = db.session.query(
+        Event.id, Event.started_at, Event.ended_at, Event.reason, Event.http_status,
+    ).filter(Event.target_id == target_id, Event.state == "down")
+    if before:
+        started, eid = before
+        q = q.filter(or_(
+            Event.started_at < started,
+            and_(Event.started_at == started, Event.id < eid),
+        ))
+    return q.order_by(Event.started_at.desc(), Event.id.desc()).limit(limit).all()
+
+
+def incident_stats(target_id: int, days: int, tz_name: str) -> dict:
+    """
+    Incidents overlapping the last `days` days, one aggregate query:
+      incidents, downtime_min (clipped to the window, ongoing = until now),
+      mttr_min (mean duration of resolved incidents), mtbf_min (uptime / incidents).
+    """
+    now = datetime.now(ZoneInfo(tz_name)).replace(tzinfo=None)
+    start = now - timedelta(days=days)
+    window_min = days * 24 * 60.0
+
+    ended = func.coalesce(Event.ended_at, now)
+    clipped = _minutes(_greatest(Event.started_at, start), _least(ended, now))
+    resolved = Event.ended_at.isnot(None)
+
+    row = (
+        db.session.query(
+            func.count(Event.id),
+            func.sum(clipped),
+            func.sum(case((resolved, 1), else_=0)),
+            func.sum(case((resolved, _minutes(Event.started_at, Event.ended_at)), else_=0)),
+        )
+        .filter(
+            Event.target_id == target_id,
+            Event.state == "down",
+            Event.started_at < now,
+            or_(Event.ended_at.is_(None), Event.ended_at > start),
+        )
+        .one()
+    )
+    count, downtime, n_resolved, resolved_min = row
+    count = int(count or 0)
+    downtime = max(0.0, float(downtime or 0.0))
+
+    return {
+        "days": days,
+        "incidents": count,
+        "downtime_min": round(downtime, 1),
+        "mttr_min": round(float(resolved_min) / n_resolved, 1) if n_resolved else None,
+        "mtbf_min": round((window_min - downtime) / count, 1) if count else None,
+    }
+
+
+def _minutes(a, b):
+    """SQL expression: minutes from a to b (SQLite julianday / PostgreSQL epoch)."""
+    if db.engine.dialect.name == "postgresql":
+        return func.extract("epoch", b - a) / 60.0
+    return (func.julianday(b) - func.julianday(a)) * 1440.0
+
+
+def _greatest(a, b):
+    return func.greatest(a, b) if db.engine.dialect.name == "postgresql" else func.max(a, b)
+
+
+def _least(a, b):
+    return func.least(a, b) if db.engine.dialect.name == "postgresql" else func.min(a, b)
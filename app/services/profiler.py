@@ -0,0 +1,227 @@
+# app/services/profiler.py
+"""
+Opt-in sampling profiler (PROFILE_ENABLED=1).
+
+A poll cycle or request is sampled while it runs (one sampler thread per
+process, sys._current_frames() every PROFILE_INTERVAL_MS, only while something
+is watched). The samples are kept only when it turned out slow:
+    poll_all  > PROFILE_POLL_BUDGET_S   (0 = POLL_WINDOW_S + 120)
+    request   > PROFILE_REQUEST_MS
+and written as collapsed stacks ("thread;outer;...;inner count" per line, same
+as py-spy --format raw) to instance/profiles/*.folded - open with speedscope
+or flamegraph.pl.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import g, request
+
+SUFFIX = ".folded"
+_NAME_RE = re.compile(r"^[\w.\-]+\.folded$")
+
+_sampler = None
+_sampler_lock = threading.Lock()
+_labels: dict = {}  # code object -> frame label
+
+
+def enabled(app) -> bool:
+    return bool(app.config.get("PROFILE_ENABLED"))
+
+
+def init_app(app):
+    """Request hook: sample every request, keep the slow ones."""
+    if not enabled(app):
+        return
+    skip = {e.strip() for e in app.config.get("PROFILE_SKIP_ENDPOINTS", "").split(",") if e.strip()}
+    threshold_s = float(app.config.get("PROFILE_REQUEST_MS", 1000)) / 1000.0
+
+    @app.before_request
+    def _start():
+        if request.endpoint in skip or request.endpoint == "static":
+            return
+        me = threading.get_ident()
+        prof = _Profile(lambda ident, name: ident == me)
+        _get_sampler(app).add(prof)
+        g._profile = (prof, time.perf_counter())
+
+    @app.teardown_request
+    def _stop(exc=None):
+        started = g.pop("_profile", None)
+        if started is None:
+            return
+        prof, t0 = started
+        _get_sampler(app).remove(prof)
+        dt = time.perf_counter() - t0
+        if dt >= threshold_s and prof.samples:
+            save(app, prof, "request", f"{request.method}-{request.endpoint or 'none'}", dt)
+
+
+@contextmanager
+def watch(app, kind: str, label: str, budget_s: float, thread_prefix: str = ""):
+    """
+    Sample the calling thread (+ threads named thread_prefix*) while the block runs,
+    write the profile if it took budget_s or more.
+    """
+    if not enabled(app):
+        yield
+        return
+    me = threading.get_ident()
+    prof = _Profile(lambda ident, name: ident == me or (thread_prefix and name.startswith(thread_prefix)))
+    sampler = _get_sampler(app)
+    sampler.add(prof)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        sampler.remove(prof)
+        dt = time.perf_counter() - t0
+        if dt >= budget_s and prof.samples:
+            save(app, prof, kind, label, dt)
+
+
+def poll_budget_s(app) -> float:
+    budget = float(app.config.get("PROFILE_POLL_BUDGET_S", 0))
+    return budget if budget > 0 else float(app.config.get("POLL_WINDOW_S", 600)) + 120
+
+
+# ---- files ----
+def profile_dir(app) -> str:
+    return os.path.join(app.instance_path, "profiles")
+
+
+def save(app, prof: "_Profile", kind: str, label: str, duration_s: float) -> str:
+    d = profile_dir(app)
+    os.makedirs(d, exist_ok=True)
+    label = re.sub(r"[^\w.\-]+", "_", label)[:60]
+    name = f"{kind}-{datetime.now():%Y%m%d-%H%M%S}-{label}-{int(duration_s * 1000)}ms{SUFFIX}"
+    tmp = os.path.join(d, name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for stack, n in sorted(prof.counts.copy().items()):
+            f.write(f"{stack} {n}\n")
+    os.replace(tmp, os.path.join(d, name))
+    _prune(d, int(app.config.get("PROFILE_KEEP", 50)))
+    app.logger.warning("profiler: %s %s took %.2fs, %d samples -> %s", kind, label, duration_s, prof.samples, name)
+    return name
+
+
+def list_profiles(app) -> list[dict]:
+    """Newest first: name, kind, label, duration_ms, size, created (local time)."""
+    d = profile_dir(app)
+    out = []
+    try:
+        names = [n for n in os.listdir(d) if _NAME_RE.match(n)]
+    except OSError:
+        return out
+    for name in names:
+        st = os.stat(os.path.join(d, name))
+        parts = name[: -len(SUFFIX)].split("-")
+        out.append({
+            "name": name,
+            "kind": parts[0],
+            "label": "-".join(parts[3:-1]),
+            "duration_ms": int(parts[-1].rstrip("ms")) if parts[-1].rstrip("ms").isdigit() else None,
+            "size": st.st_size,
+            "created": datetime.fromtimestamp(st.st_mtime).isoformat(timespec="seconds"),
+        })
+    out.sort(key=lambda p: p["created"], reverse=True)
+    return out
+
+
+def is_profile_name(name: str) -> bool:
+    return bool(_NAME_RE.match(name))
+
+
+def _prune(d: str, keep: int):
+    files = sorted(
+        (os.path.join(d, n) for n in os.listdir(d) if _NAME_RE.match(n)),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for path in files[max(keep, 1):]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# ---- sampling ----
+class _Profile:
+    def __init__(self, match):
+        self.match = match  # (thread ident, thread name) -> bool
+        self.counts: dict[str, int] = {}
+        self.samples = 0
+
+
+class _Sampler:
+    """One daemon thread; sleeps until a profile is watched."""
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self.profiles: set = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self.thread.start()
+
+    def add(self, prof: _Profile):
+        with self.lock:
+            self.profiles.add(prof)
+            self.wake.set()
+
+    def remove(self, prof: _Profile):
+        with self.lock:
+            self.profiles.discard(prof)
+            if not self.profiles:
+                self.wake.clear()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            self.wake.wait()
+            with self.lock:
+                profiles = list(self.profiles)
+            if profiles:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                frames = sys._current_frames()
+                for ident, frame in frames.items():
+                    if ident == me:
+                        continue
+                    name = names.get(ident, str(ident))
+                    stack = None
+                    for prof in profiles:
+                        if not prof.match(ident, name):
+                            continue
+                        if stack is None:
+                            stack = f"{name};{_collapse(frame)}"
+                        prof.counts[stack] = prof.counts.get(stack, 0) + 1
+                for prof in profiles:
+                    prof.samples += 1
+                del frames
+            time.sleep(self.interval_s)
+
+
+def _get_sampler(app) -> _Sampler:
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = _Sampler(max(float(app.config.get("PROFILE_INTERVAL_MS", 10)), 1.0) / 1000.0)
+        return _sampler
+
+
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        label = _labels.get(code)
+        if label is None:
+            path = code.co_filename.replace("\\", "/").split("/")
+            label = f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+            _labels[code] = label
+        parts.append(label)
+        frame = frame.f_back
+    return ";".join(reversed(parts))
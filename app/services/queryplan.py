@@ -0,0 +1,120 @@
+# app/services/queryplan.py
+"""
+Query-plan regression check for the hot read paths (SQLite).
+
+Each check runs the real code (metrics / breaker / owner + public routes),
+captures the SQL it sends, and asks SQLite for EXPLAIN QUERY PLAN:
+  - "index":    snapshots / events must never be read by a plain table SCAN
+  - "covering": ... and only through a COVERING INDEX (no table rows, no raw_json)
+Run: python manage.py plan-check (also tests/test_query_plans.py on a temp DB)
+"""
+import re
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import event
+
+from .. import db
+
+HOT_TABLES = ("snapshots", "events")
+
+
+@contextmanager
+def capture():
+    """Collect (statement, parameters) sent to the engine inside the block."""
+    seen = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            seen.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        yield seen
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+
+def explain(statement: str, parameters) -> list[str]:
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [r[-1] for r in rows]  # (id, parent, notused, detail)
+
+
+def problems(plan: list[str], expect: str) -> list[str]:
+    out = []
+    for line in plan:
+        m = re.match(r"^(SCAN|SEARCH) (\w+)", line)
+        if not m or m.group(2) not in HOT_TABLES:
+            continue
+        if m.group(1) == "SCAN" and "INDEX" not in line:
+            out.append(f"table scan: {line}")
+        elif expect == "covering" and "COVERING INDEX" not in line and "INTEGER PRIMARY KEY" not in line:
+            out.append(f"not covering: {line}")
+    return out
+
+
+def checks(app):
+    """(name, expect, callable) - callables run inside app context."""
+    from ..models import Target
+    from . import breaker, metrics
+
+    tz = app.config["TIMEZONE"]
+    tid = db.session.query(Target.id).order_by(Target.id.asc()).limit(1).scalar() or 1
+
+    def get(url, owner=False):
+        def run():
+            client = app.test_client()
+            if owner:
+                with client.session_transaction() as s:
+                    s["_user_id"] = "owner"
+                    s["_fresh"] = True
+            # own app context: a request reuses the active one (and its cached g.user)
+            with app.app_context():
+                client.get(url).get_data()  # streamed CSV runs its query here
+        return run
+
+    return [
+        ("metrics.uptime_percent", "covering", lambda: metrics.uptime_percent(tid, 24 * 90, tz)),
+        ("metrics.latency_series", "covering", lambda: metrics.latency_series(tid, 48, tz)),
+        ("metrics.latency_series(phases)", "index", lambda: metrics.latency_series(tid, 48, tz, phases=True)),
+        ("metrics.last_poll", "index", lambda: metrics.last_poll(tid)),
+        ("metrics.bars_90d", "covering", lambda: metrics.bars_90d(tid, tz)),
+        ("metrics.card_stats", "covering", lambda: metrics.card_stats([tid], tz)),
+        ("metrics.status_summary", "covering", metrics.status_summary),
+        ("metrics.card_page(down)", "index", lambda: metrics.card_page(status="down")),
+        ("metrics.event_page", "index", lambda: metrics.event_page(tid)),
+        ("metrics.incident_stats", "covering", lambda: metrics.incident_stats(tid, 30, tz)),
+        ("breaker.adaptive_timeout", "covering", lambda: breaker.adaptive_timeout(app, tid)),
+        ("breaker._seed_failures", "covering", lambda: breaker._seed_failures(tid)),
+        ("GET / (recent events)", "index", get("/")),
+        ("GET /owner/db", "index", get("/owner/db", owner=True)),
+        ("GET /owner/db?target_id", "index", get(f"/owner/db?target_id={tid}&status=down", owner=True)),
+        ("GET /owner/db/snapshots.csv", "index", get("/owner/db/snapshots.csv?start=2026-01-01", owner=True)),
+    ]
+
+
+def run_checks(app=None) -> list[dict]:
+    """-> [{"name", "expect", "plans": [[lines]], "problems": [...]}]"""
+    app = app or current_app
+    if db.engine.dialect.name != "sqlite":
+        raise RuntimeError("plan-check uses EXPLAIN QUERY PLAN (SQLite only)")
+
+    results = []
+    was = app.config.get("TSSTORE_ENABLED")
+    app.config["TSSTORE_ENABLED"] = False  # check the SQL path
+    try:
+        for name, expect, fn in checks(app):
+            with capture() as seen:
+                fn()
+            plans, found = [], []
+            for statement, parameters in seen:
+                if not any(t in statement for t in HOT_TABLES):
+                    continue
+                plan = explain(statement, parameters)
+                plans.append(plan)
+                found += problems(plan, expect)
+            results.append({"name": name, "expect": expect, "plans": plans, "problems": found})
+    finally:
+        app.config["TSSTORE_ENABLED"] = was
+    return results
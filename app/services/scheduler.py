@@ -1,13 +1,24 @@
 # app/services/scheduler.py
-from datetime import datetime
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor as ProbePool, as_completed
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+from flask import current_app
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 from .. import db
 from ..models import Target, Snapshot, Event
-from .fetcher import fetch_stats
+from .fetcher import probe_key, run_probe
+from . import archive, board, breaker, counters, live, profiler, tsstore, updates
+from .dispatch import HostLimiter, host_key, stagger_offset
+
+# keep the whole poll window inside the hour it is stored in
+MAX_POLL_WINDOW_S = 50 * 60
 
 _scheduler: BackgroundScheduler | None = None
 
@@ -19,31 +30,318 @@ def start_scheduler(app):
         return _scheduler
 
     tz_name = app.config.get("TIMEZONE", "Asia/Bangkok")
-    _scheduler = BackgroundScheduler(timezone=tz_name)
+    # one pool for cron jobs + background jobs (services/jobs.py)
+    _scheduler = BackgroundScheduler(
+        timezone=tz_name,
+        executors={"default": ThreadPoolExecutor(int(app.config.get("SCHEDULER_WORKERS", 10)))},
+    )
+
+    # LOCAL_POLLING=0: probes come from agents (/api/ingest), this process only stores
+    if app.config.get("LOCAL_POLLING", True):
+        _scheduler.add_job(
+            func=lambda: poll_all(app),
+            trigger=CronTrigger(minute=0),
+            id="poll_all_targets",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=15 * 60,
+        )
+
+    # push targets: mark DOWN when heartbeats stop
+    _scheduler.add_job(
+        func=lambda: check_push_targets(app),
+        trigger="interval",
+        seconds=int(app.config.get("PUSH_CHECK_INTERVAL_S", 60)),
+        id="check_push_targets",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # status board for the public pages: follow live_events, full rebuild every hour
+    if board.enabled(app):
+        _scheduler.add_job(
+            func=lambda: board.sync(app),
+            trigger="interval",
+            seconds=max(1.0, float(app.config.get("BOARD_SYNC_S", 5))),
+            next_run_time=datetime.now(ZoneInfo(tz_name)),
+            id="sync_status_board",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
+    # cold storage: once a day, off the poll minute
+    if archive.enabled(app):
+        _scheduler.add_job(
+            func=lambda: archive_old(app),
+            trigger=CronTrigger(hour=3, minute=30),
+            id="archive_old_snapshots",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
 
+    # row counts: recount now (a crashed process lost its pending deltas), then every N hours
     _scheduler.add_job(
-        func=lambda: poll_all(app),
-        trigger=CronTrigger(minute=0),
-        id="poll_all_targets",
+        func=lambda: recount(app),
+        trigger="interval",
+        hours=max(1.0, float(app.config.get("COUNTER_RECOUNT_H", 24))),
+        next_run_time=datetime.now(ZoneInfo(tz_name)),
+        id="recount_rows",
         replace_existing=True,
         max_instances=1,
         coalesce=True,
-        misfire_grace_time=15 * 60,
     )
+
+    # update checker: warm the release cache now, then revalidate every TTL
+    # (force: checked_at is stamped after the request, a TTL-old cache may still look fresh)
+    if app.config.get("GITHUB_REPO"):
+        _scheduler.add_job(
+            func=lambda: updates.refresh(app, force=True),
+            trigger="interval",
+            seconds=max(60, int(app.config.get("UPDATE_CHECK_TTL_S", 6 * 3600))),
+            next_run_time=datetime.now(ZoneInfo(tz_name)),
+            id="refresh_update_info",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
     _scheduler.start()
     return _scheduler
 
 
-def poll_all(app):
-    """Poll all enabled targets for current hour bucket."""
+def get_scheduler() -> BackgroundScheduler | None:
+    return _scheduler
+
+
+def poll_all(app, spread: bool = True):
+    """
+    Poll all enabled targets for current hour bucket.
+    Probes are spread over POLL_WINDOW_S (deterministic hash offset per target)
+    and run on a small pool with per-host caps. DB writes stay on this thread,
+    every result goes to the bucket of the cycle start.
+    spread=False: fire everything now (startup poll).
+    """
+    tz = ZoneInfo(app.config.get("TIMEZONE", "Asia/Bangkok"))
+    now = datetime.now(tz)
+    hour_bucket = _floor_hour(now)
+
+    window_s = min(float(app.config.get("POLL_WINDOW_S", 600)), MAX_POLL_WINDOW_S) if spread else 0.0
+
+    budget_s = profiler.poll_budget_s(app) if spread else 120.0
+    with app.app_context(), profiler.watch(app, "poll", "poll_all", budget_s, thread_prefix="probe"):
+        # push targets report themselves (see check_push_targets)
+        targets = Target.query.filter(Target.enabled.is_(True), Target.probe_type != "push").all()
+
+        stats, _ = _probe_and_store(app, targets, now, hour_bucket, window_s)
+
+        stats["started_at"] = now.replace(tzinfo=None).isoformat(timespec="seconds")
+        _write_cycle_stats(app, stats)
+        app.logger.info(
+            "poll cycle: %(targets)d targets, %(requests)d requests, %(saved)d saved by coalescing, "
+            "%(circuit_open)d circuit open, %(duration_s)ss", stats,
+        )
+
+        live.prune(app.config.get("LIVE_RETENTION_HOURS", 24))
+        counters.refresh_db_size()
+
+
+def archive_old(app):
+    with app.app_context():
+        try:
+            archive.run(app)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("archive run failed")
+        counters.refresh_db_size()
+
+
+def recount(app):
+    with app.app_context():
+        try:
+            counters.seed(force=True)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("row recount failed")
+
+
+def test_targets(app, target_ids: list[int]) -> dict:
+    """
+    Background job for bulk import: probe many targets at once (no stagger,
+    bounded pool + per-host caps, breaker bypassed). Returns {target_id: summary}.
+    """
     tz = ZoneInfo(app.config.get("TIMEZONE", "Asia/Bangkok"))
     now = datetime.now(tz)
     hour_bucket = _floor_hour(now)
 
     with app.app_context():
-        targets = Target.query.filter_by(enabled=True).all()
+        targets = (
+            Target.query
+            .filter(Target.id.in_(target_ids), Target.enabled.is_(True), Target.probe_type != "push")
+            .all()
+        )
+        _, snaps = _probe_and_store(app, targets, now, hour_bucket, 0.0, manual=True)
+        return {
+            str(tid): {"ok": s.ok, "http_status": s.http_status, "latency_ms": s.latency_ms}
+            for tid, s in snaps.items()
+        }
+
+
+def _probe_and_store(app, targets: list, now: datetime, hour_bucket: datetime, window_s: float,
+                     manual: bool = False) -> tuple[dict, dict]:
+    """
+    Core of a poll cycle (inside app context):
+      - coalesce targets with the same probe (type + URL) into one request
+      - probes run on POLL_WORKERS threads, start at their stagger offset, per-host caps
+      - results are stored here, on the calling thread (one DB writer)
+    Returns (stats, {target_id: Snapshot}).
+    """
+    tz = ZoneInfo(app.config.get("TIMEZONE", "Asia/Bangkok"))
+    workers = int(app.config.get("POLL_WORKERS", 8))
+    max_body = int(app.config.get("FETCH_MAX_BODY_BYTES", 256 * 1024))
+    limiter = HostLimiter(
+        concurrency=int(app.config.get("POLL_HOST_CONCURRENCY", 2)),
+        min_interval_s=float(app.config.get("POLL_HOST_MIN_INTERVAL_S", 0.5)),
+    )
+    t0 = time.monotonic()
+
+    # Coalesce: targets with the same probe (type + URL) share one request
+    groups: dict[str, list] = {}
+    for t in targets:
+        plan = breaker.plan(app, t.id, hour_bucket, manual=manual)
+        groups.setdefault(probe_key(t.probe_type, t.base_url, t.stats_path), []).append((t, plan))
+
+    stats = {"targets": len(targets), "requests": 0, "saved": 0, "circuit_open": 0}
+    snaps = {}
+    jobs = []
+    for members in groups.values():
+        probing = [p for (_, p) in members if p.probe]
+        if not probing:
+            # Circuit open: no request and no sample - the hour stays unknown (not counted
+            # as down), the open event keeps running until a real probe ends it
+            stats["circuit_open"] += len(members)
+            continue
+
+        # most generous plan of the group (one open-circuit member must not shorten it)
+        plan = breaker.ProbePlan(
+            probe=True,
+            state="closed",
+            timeout_s=max(p.timeout_s for p in probing),
+            retries=max(p.retries for p in probing),
+        )
+        first = members[0][0]
+        due = t0 + stagger_offset(first.id, first.base_url, window_s)
+        ids = [t.id for (t, _) in members]
+        jobs.append((ids, due, first.probe_type, first.base_url, first.stats_path, plan))
+        stats["requests"] += 1
+        stats["saved"] += len(ids) - 1
+
+    # the pool is FIFO and a worker sleeps until its job is due: submit by due time,
+    # else an early job waits behind workers sleeping on late ones (and runs past the window)
+    jobs.sort(key=lambda j: j[1])
+    with ProbePool(max_workers=max(1, workers), thread_name_prefix="probe") as ex:
+        futures = {
+            ex.submit(_probe_at, limiter, due, probe_type, base_url, stats_path, plan, max_body): ids
+            for (ids, due, probe_type, base_url, stats_path, plan) in jobs
+        }
+        for fut in as_completed(futures):
+            try:
+                result = fut.result()
+            except Exception:
+                result = _no_probe_result("probe_error")
+            # fan out the one result to every target of the group
+            for target_id in futures[fut]:
+                breaker.record(app, target_id, bool(result.get("ok")), hour_bucket)
+                snaps[target_id] = _store_result(target_id, result, datetime.now(tz), hour_bucket)
+
+    stats["duration_s"] = round(time.monotonic() - t0, 2)
+    return stats, snaps
+
+
+def last_cycle_stats(app) -> dict:
+    """Stats of the last poll_all() run (owner page), from the file the poller writes:
+    the web workers are not the process that polls."""
+    try:
+        with open(_cycle_path(app), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cycle_stats(app, stats: dict):
+    path = _cycle_path(app)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        app.logger.warning("poll cycle stats not written (%s): %s", path, e)
+
+
+def _cycle_path(app) -> str:
+    return os.path.join(app.instance_path, "poll_cycle.json")
+
+
+def check_push_targets(app):
+    """
+    Missed-heartbeat detector for push targets: no OK heartbeat for PUSH_GRACE_S
+    => store a DOWN snapshot (reason missed_heartbeat) in the current hour bucket,
+    which opens the event like a failed probe would.
+    """
+    from .ingest import prune_ingest_keys
+
+    tz = ZoneInfo(app.config.get("TIMEZONE", "Asia/Bangkok"))
+    now = datetime.now(tz)
+    hour_bucket = _floor_hour(now)
+    grace = timedelta(seconds=int(app.config.get("PUSH_GRACE_S", 900)))
+    now_n = now.replace(tzinfo=None)
+
+    with app.app_context():
+        targets = Target.query.filter(Target.enabled.is_(True), Target.probe_type == "push").all()
         for t in targets:
-            _poll_one_target(t.id, now, hour_bucket)
+            last_ok = (
+                db.session.query(db.func.max(Snapshot.polled_at))
+                .filter(Snapshot.target_id == t.id, Snapshot.ok.is_(True))
+                .scalar()
+            )
+            # never reported: count from creation (created_at is UTC)
+            if last_ok is None:
+                created = t.created_at.replace(tzinfo=ZoneInfo("UTC")).astimezone(tz).replace(tzinfo=None)
+                last_ok = created
+            if now_n - last_ok < grace:
+                continue
+
+            cur = Snapshot.query.filter_by(target_id=t.id, hour_bucket=hour_bucket.replace(tzinfo=None)).first()
+            if cur is not None and not cur.ok and cur.polled_at >= last_ok:
+                continue  # already marked for this hour
+
+            _store_result(t.id, _no_probe_result("missed_heartbeat"), now, hour_bucket)
+
+        prune_ingest_keys(int(app.config.get("PUSH_KEY_RETENTION_HOURS", 48)))
+        counters.refresh_db_size()  # also covers agent/push writes when LOCAL_POLLING=0
+
+
+def _probe_at(
+    limiter: HostLimiter,
+    due: float,
+    probe_type: str,
+    base_url: str,
+    stats_path: str,
+    plan: "breaker.ProbePlan",
+    max_body: int,
+) -> dict:
+    """Worker thread: wait for the target's slot in the window, then fetch (no DB here)."""
+    delay = due - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+    with limiter.slot(host_key(base_url)):
+        return run_probe(
+            probe_type, base_url, stats_path,
+            timeout_s=plan.timeout_s, retries=plan.retries, max_body_bytes=max_body,
+        )
 
 
 def poll_target(app, target_id: int, force: bool = True):
@@ -61,42 +359,80 @@ def poll_target(app, target_id: int, force: bool = True):
             return None
         if (not t.enabled) and (not force):
             return None
-        return _poll_one_target(t.id, now, hour_bucket)
+        if t.probe_type == "push":
+            return None  # nothing to probe, wait for its heartbeat
+        return _poll_one_target(t.id, now, hour_bucket, manual=True)
+
+
+def test_target(app, target_id: int) -> dict | None:
+    """
+    Owner "add + test" (background job): poll now, return a JSON-ready summary.
+    """
+    tz = ZoneInfo(app.config.get("TIMEZONE", "Asia/Bangkok"))
+    now = datetime.now(tz)
+    hour_bucket = _floor_hour(now)
+
+    with app.app_context():
+        t = Target.query.get(target_id)
+        if not t:
+            return None
+        if t.probe_type == "push":
+            return {"target_id": target_id, "skipped": "push target, waiting for heartbeat"}
 
+        snap = _poll_one_target(t.id, now, hour_bucket, manual=True)
+        if snap is None:
+            return None
+        return {
+            "target_id": target_id,
+            "ok": snap.ok,
+            "http_status": snap.http_status,
+            "latency_ms": snap.latency_ms,
+            "hour_bucket": snap.hour_bucket.isoformat(),
+        }
 
-def _poll_one_target(target_id: int, polled_at_tz: datetime, hour_bucket_tz: datetime):
+
+def _poll_one_target(target_id: int, polled_at_tz: datetime, hour_bucket_tz: datetime, manual: bool = False):
     t = Target.query.get(target_id)
     if not t or not t.enabled:
         return None
 
-    # Fetch (ALWAYS returns dict with ok/http_status/latency_ms/.../raw_json/reason)
-    result = fetch_stats(t.base_url, t.stats_path, timeout_s=8, retries=1)
+    # Circuit breaker: long outages are re-probed with exponential backoff
+    app = current_app._get_current_object()
+    plan = breaker.plan(app, t.id, hour_bucket_tz, manual=manual)
+
+    if not plan.probe:
+        # Circuit open: nothing measured, store nothing (the hour stays unknown)
+        return None
+
+    # Probe (ALWAYS returns dict with ok/http_status/latency_ms/.../raw_json/reason)
+    result = run_probe(
+        t.probe_type, t.base_url, t.stats_path,
+        timeout_s=plan.timeout_s, retries=plan.retries,
+        max_body_bytes=int(app.config.get("FETCH_MAX_BODY_BYTES", 256 * 1024)),
+    )
+    breaker.record(app, t.id, bool(result.get("ok")), hour_bucket_tz)
+    return _store_result(t.id, result, polled_at_tz, hour_bucket_tz)
 
+
+def _store_result(target_id: int, result: dict, polled_at_tz: datetime, hour_bucket_tz: datetime):
+    """Upsert the snapshot of (target, hour_bucket) + update events + notify live stream."""
     # Store as naive datetimes in SQLite
     polled_at = polled_at_tz.replace(tzinfo=None)
     hour_bucket = hour_bucket_tz.replace(tzinfo=None)
 
     # Upsert snapshot for (target_id, hour_bucket)
-    snap = Snapshot.query.filter_by(target_id=t.id, hour_bucket=hour_bucket).first()
+    snap = Snapshot.query.filter_by(target_id=target_id, hour_bucket=hour_bucket).first()
     if snap is None:
-        snap = Snapshot(target_id=t.id, hour_bucket=hour_bucket)
+        snap = Snapshot(target_id=target_id, hour_bucket=hour_bucket)
         db.session.add(snap)
 
-    snap.polled_at = polled_at
-    snap.ok = bool(result.get("ok"))
-    snap.http_status = result.get("http_status")
-    snap.latency_ms = result.get("latency_ms")
-    snap.cpu_percent = result.get("cpu_percent")
-    snap.mem_percent = result.get("mem_percent")
-    snap.disk_percent = result.get("disk_percent")
-    snap.swap_percent = result.get("swap_percent")
-    snap.raw_json = result.get("raw_json")
-
+    apply_result(snap, result, polled_at)
     db.session.commit()
+    tsstore.record(current_app._get_current_object(), target_id, snap)
 
     # Update events (DOWN periods only)
     _update_events(
-        target_id=t.id,
+        target_id=target_id,
         hour_bucket=hour_bucket,
         is_ok=snap.ok,
         reason=result.get("reason"),
@@ -106,6 +442,34 @@ def _poll_one_target(target_id: int, polled_at_tz: datetime, hour_bucket_tz: dat
     return snap
 
 
+def apply_result(snap: Snapshot, result: dict, polled_at: datetime):
+    """Copy a probe result onto a snapshot row + queue the live notification (no commit)."""
+    snap.polled_at = polled_at
+    snap.ok = bool(result.get("ok"))
+    snap.http_status = result.get("http_status")
+    snap.latency_ms = result.get("latency_ms")
+    timings = result.get("timings") or {}
+    snap.dns_ms = timings.get("dns_ms")
+    snap.connect_ms = timings.get("connect_ms")
+    snap.tls_ms = timings.get("tls_ms")
+    snap.ttfb_ms = timings.get("ttfb_ms")
+    snap.cpu_percent = result.get("cpu_percent")
+    snap.mem_percent = result.get("mem_percent")
+    snap.disk_percent = result.get("disk_percent")
+    snap.swap_percent = result.get("swap_percent")
+    snap.raw_json = result.get("raw_json")
+
+    live.publish("snapshot", snap.target_id, {
+        "target_id": snap.target_id,
+        "hour_bucket": snap.hour_bucket.isoformat(),
+        "polled_at": polled_at.isoformat(),
+        "ok": snap.ok,
+        "http_status": snap.http_status,
+        "latency_ms": snap.latency_ms,
+        "reason": result.get("reason"),
+    })
+
+
 def _update_events(target_id: int, hour_bucket: datetime, is_ok: bool, reason: str | None, http_status: int | None):
     prev = (
         Snapshot.query
@@ -127,6 +491,9 @@ def _update_events(target_id: int, hour_bucket: datetime, is_ok: bool, reason: s
             http_status=http_status,
         )
         db.session.add(ev)
+        db.session.flush()
+        live.publish("status", target_id, {"target_id": target_id, "ok": False, "at": hour_bucket.isoformat()})
+        live.publish("event", target_id, _event_payload(ev))
         db.session.commit()
         return
 
@@ -138,9 +505,116 @@ def _update_events(target_id: int, hour_bucket: datetime, is_ok: bool, reason: s
             .order_by(Event.started_at.desc())
             .first()
         )
+        live.publish("status", target_id, {"target_id": target_id, "ok": True, "at": hour_bucket.isoformat()})
         if open_ev:
             open_ev.ended_at = hour_bucket
-            db.session.commit()
+            live.publish("event", target_id, _event_payload(open_ev))
+        db.session.commit()
+
+
+def rebuild_events(target_id: int, since: datetime, reasons: dict | None = None):
+    """
+    Re-derive DOWN events of a target from its snapshots with hour_bucket >= since.
+    Used when results arrive in batches / out of order (agents, push), where the
+    incremental _update_events() (compare with previous snapshot) is not enough.
+    Same semantics: UP->DOWN opens, DOWN->UP closes, no event at first data point,
+    and the same status / event live messages per transition.
+    reasons: {hour_bucket: reason} for newly opened events.
+    """
+    reasons = reasons or {}
+
+    prev = (
+        Snapshot.query
+        .with_entities(Snapshot.ok)
+        .filter(Snapshot.target_id == target_id, Snapshot.hour_bucket < since)
+        .order_by(Snapshot.hour_bucket.desc())
+        .first()
+    )
+    state = prev.ok if prev else None
+
+    # events that started inside the range get reconciled (kept if still valid)
+    existing = {
+        ev.started_at: ev
+        for ev in Event.query.filter(Event.target_id == target_id, Event.started_at >= since).all()
+    }
+    # the event open before `since` (if any) is re-closed by the scan
+    open_ev = (
+        Event.query
+        .filter(Event.target_id == target_id, Event.state == "down", Event.started_at < since)
+        .order_by(Event.started_at.desc())
+        .first()
+    )
+    if open_ev is not None and state is False and (open_ev.ended_at is None or open_ev.ended_at >= since):
+        open_ev.ended_at = None
+    else:
+        open_ev = None
+
+    rows = (
+        Snapshot.query
+        .with_entities(Snapshot.hour_bucket, Snapshot.ok, Snapshot.http_status)
+        .filter(Snapshot.target_id == target_id, Snapshot.hour_bucket >= since)
+        .order_by(Snapshot.hour_bucket.asc())
+        .all()
+    )
+    changed = []  # (event or None, ok, bucket) per UP/DOWN transition
+    for bucket, ok, http_status in rows:
+        if state is True and not ok:
+            ev = existing.pop(bucket, None)
+            if ev is None:
+                ev = Event(
+                    target_id=target_id,
+                    state="down",
+                    started_at=bucket,
+                    reason=reasons.get(bucket),
+                    http_status=http_status,
+                )
+                db.session.add(ev)
+            ev.ended_at = None
+            open_ev = ev
+            changed.append((ev, False, bucket))
+        elif state is False and ok:
+            if open_ev is not None:
+                open_ev.ended_at = bucket
+            changed.append((open_ev, True, bucket))
+            open_ev = None
+        state = ok
+
+    for ev in existing.values():
+        db.session.delete(ev)
+
+    db.session.flush()
+    for ev, ok, bucket in changed:
+        live.publish("status", target_id, {"target_id": target_id, "ok": ok, "at": bucket.isoformat()})
+        if ev is not None:
+            live.publish("event", target_id, _event_payload(ev))
+    db.session.commit()
+
+
+def _no_probe_result(reason: str) -> dict:
+    return {
+        "ok": False,
+        "http_status": None,
+        "latency_ms": None,
+        "cpu_percent": None,
+        "mem_percent": None,
+        "disk_percent": None,
+        "swap_percent": None,
+        "raw_json": None,
+        "reason": reason,
+    }
+
+
+def _event_payload(ev: Event) -> dict:
+    return {
+        "id": ev.id,
+        "target_id": ev.target_id,
+        "target_name": ev.target.name if ev.target else None,
+        "state": ev.state,
+        "started_at": ev.started_at.isoformat() if ev.started_at else None,
+        "ended_at": ev.ended_at.isoformat() if ev.ended_at else None,
+        "reason": ev.reason,
+        "http_status": ev.http_status,
+    }
 
 
 def _floor_hour(dt: datetime) -> datetime:
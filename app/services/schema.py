@@ -0,0 +1,79 @@
+# app/services/schema.py
+from contextlib import contextmanager
+
+from sqlalchemy import inspect, text
+
+from .. import db
+
+# pg_advisory_lock key: several web workers may start at once against one PostgreSQL DB
+_STARTUP_LOCK_KEY = 0x446F7453  # "DotS"
+
+# indexes replaced by a wider one in models.py (same leading columns)
+SUPERSEDED_INDEXES = {
+    "snapshots": ["ix_snapshots_target_hour"],
+    "events": ["ix_events_target_started"],
+}
+
+
+@contextmanager
+def startup_lock():
+    """Serialize create_all / upgrade_schema / counter seeding across processes (PostgreSQL only)."""
+    if db.engine.dialect.name != "postgresql":
+        yield
+        return
+    with db.engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": _STARTUP_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _STARTUP_LOCK_KEY})
+            conn.commit()
+
+
+def upgrade_schema():
+    """
+    Tiny additive migration run after db.create_all():
+      - ADD COLUMN for model columns missing in existing tables
+      - CREATE INDEX for model indexes missing in existing tables
+      - DROP INDEX only for the superseded ones listed above
+    create_all() only creates missing tables, so older DBs need this when
+    a model gains a column or an index. Never drops or alters data.
+    Call inside app context.
+    """
+    engine = db.engine
+    insp = inspect(engine)
+    existing_tables = set(insp.get_table_names())
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            have = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in have:
+                    continue
+                conn.execute(text(_add_column_sql(engine.dialect, table.name, col)))
+
+            have_idx = {i["name"] for i in insp.get_indexes(table.name)}
+            for idx in table.indexes:
+                if idx.name not in have_idx:
+                    idx.create(conn)
+            for name in SUPERSEDED_INDEXES.get(table.name, []):
+                if name in have_idx:
+                    conn.execute(text(f"DROP INDEX {engine.dialect.identifier_preparer.quote(name)}"))
+
+
+def _add_column_sql(dialect, table_name: str, col) -> str:
+    prep = dialect.identifier_preparer
+    col_type = col.type.compile(dialect=dialect)
+    sql = f"ALTER TABLE {prep.quote(table_name)} ADD COLUMN {prep.quote(col.name)} {col_type}"
+
+    # NOT NULL only works with a server default on existing rows
+    if col.server_default is not None:
+        default = col.server_default.arg
+        default = default.text if hasattr(default, "text") else str(default)
+        sql += f" DEFAULT '{default}'"
+        if not col.nullable:
+            sql += " NOT NULL"
+    return sql
@@ -0,0 +1,168 @@
+# app/services/targets_io.py
+import csv
+import io
+import json
+import secrets
+from urllib.parse import urlsplit
+
+from .. import db
+from ..models import Target
+from . import live
+from .fetcher import PROBES
+
+FIELDS = ["name", "base_url", "stats_path", "probe_type", "enabled", "public_click"]
+PROBE_TYPES = set(PROBES) | {"push"}
+# probes that speak HTTP; tcp / tls only need a host (any scheme, e.g. tcp://db:5432)
+HTTP_PROBES = {"json", "http_head"}
+
+
+def parse_upload(filename: str, data: bytes) -> list[dict]:
+    """
+    JSON: [{...}, ...] or {"targets": [...]}
+    CSV : header row with FIELDS (name + base_url required)
+    Raises ValueError on unreadable files.
+    """
+    text = data.decode("utf-8-sig")
+    is_json = (filename or "").lower().endswith(".json") or text.lstrip().startswith(("[", "{"))
+
+    if is_json:
+        doc = json.loads(text)
+        rows = doc.get("targets") if isinstance(doc, dict) else doc
+        if not isinstance(rows, list):
+            raise ValueError("JSON must be a list of targets or {\"targets\": [...]}")
+        return rows
+
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or "name" not in reader.fieldnames or "base_url" not in reader.fieldnames:
+        raise ValueError("CSV needs a header with at least name,base_url")
+    return list(reader)
+
+
+def import_rows(rows: list) -> list[dict]:
+    """
+    Validate every row, insert the valid ones in ONE transaction.
+    Returns per-row results: {line, name, probe_type, status: created/duplicate/invalid, error, target_id}.
+    """
+    existing = {
+        (b, p) for (b, p) in
+        db.session.query(Target.base_url, Target.stats_path).all()
+    }
+
+    results, created = [], []
+    seen = set()
+    for i, row in enumerate(rows, start=1):
+        res = {"line": i, "name": None, "probe_type": None, "status": "invalid", "error": None, "target_id": None}
+        results.append(res)
+
+        try:
+            fields = _clean(row)
+        except ValueError as e:
+            res["error"] = str(e)
+            if isinstance(row, dict):
+                res["name"] = str(row.get("name") or "")[:120]
+            continue
+
+        res["name"] = fields["name"]
+        res["probe_type"] = fields["probe_type"]
+        key = (fields["base_url"], fields["stats_path"])
+        if key in existing or key in seen:
+            # same endpoint twice (in the DB or earlier in the file)
+            res["status"] = "duplicate"
+            res["error"] = "same base_url + stats_path already exists"
+            continue
+        seen.add(key)
+
+        t = Target(**fields)
+        if t.probe_type == "push":
+            t.push_token = secrets.token_urlsafe(24)
+        db.session.add(t)
+        created.append((res, t))
+
+    if created:
+        db.session.flush()
+        for res, t in created:
+            res["status"] = "created"
+            res["target_id"] = t.id
+            live.publish("target", t.id, {"target_id": t.id, "change": "added"})
+        db.session.commit()
+
+    return results
+
+
+def export_rows() -> list[dict]:
+    rows = []
+    for t in Target.query.order_by(Target.id.asc()).all():
+        rows.append({
+            "name": t.name,
+            "base_url": t.base_url,
+            "stats_path": t.stats_path,
+            "probe_type": t.probe_type,
+            "enabled": bool(t.enabled),
+            "public_click": bool(t.public_click),
+        })
+    return rows
+
+
+def export_csv(rows: list[dict]) -> str:
+    out = io.StringIO()
+    w = csv.DictWriter(out, fieldnames=FIELDS)
+    w.writeheader()
+    for r in rows:
+        w.writerow({**r, "enabled": int(r["enabled"]), "public_click": int(r["public_click"])})
+    return out.getvalue()
+
+
+def _clean(row) -> dict:
+    if not isinstance(row, dict):
+        raise ValueError("row must be an object")
+
+    name = str(row.get("name") or "").strip()
+    base_url = str(row.get("base_url") or "").strip().rstrip("/")
+    stats_path = str(row.get("stats_path") or "/api/stats").strip()
+    probe_type = str(row.get("probe_type") or "json").strip()
+
+    if not name or len(name) > 120:
+        raise ValueError("name required (max 120)")
+    if probe_type not in PROBE_TYPES:
+        raise ValueError(f"probe_type must be one of {', '.join(sorted(PROBE_TYPES))}")
+    error = base_url_error(probe_type, base_url)
+    if error:
+        raise ValueError(error)
+    if not stats_path.startswith("/") or len(stats_path) > 256:
+        raise ValueError("stats_path must start with / (max 256)")
+
+    return {
+        "name": name,
+        "base_url": base_url,
+        "stats_path": stats_path,
+        "probe_type": probe_type,
+        "enabled": _bool(row.get("enabled"), True),
+        "public_click": _bool(row.get("public_click"), True),
+    }
+
+
+def base_url_error(probe_type: str, base_url: str) -> str | None:
+    """Same rule for the owner add form and imports: what the probe of that type can use."""
+    if not base_url or len(base_url) > 512:
+        return "base_url required (max 512)"
+    if probe_type == "push":
+        return None  # the target calls us, base_url is only shown
+    try:
+        parts = urlsplit(base_url)
+        parts.port  # ValueError on a bad port
+    except ValueError:
+        return "base_url is not a valid URL"
+    if probe_type in HTTP_PROBES:
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            return "base_url must be http(s)://host (max 512)"
+    elif not parts.scheme or not parts.hostname:
+        return f"base_url must be scheme://host[:port] for {probe_type} (e.g. tcp://db:5432)"
+    return None
+
+
+def _bool(v, default: bool) -> bool:
+    if v is None or v == "":
+        return default
+    if isinstance(v, bool):
+        return v
+    return str(v).strip().lower() in ("1", "true", "yes", "y", "on")
@@ -0,0 +1,348 @@
+# app/services/tsstore.py
+"""
+Optional columnar copy of the hot snapshot columns (TSSTORE_ENABLED=1).
+
+One directory per target, one append-only file per column, fixed width:
+    ts.q (int64 hour_bucket, seconds since 1970 naive local) / ok.B / latency_ms.i (-1 = null)
+    cpu_percent.f / mem_percent.f / disk_percent.f / swap_percent.f (NaN = null)
+Rows are sorted by ts (1 per hour bucket). Readers mmap the files and slice
+memoryviews (no copy); metrics.py uses it once `manage.py ts-rebuild` has
+filled it from SQLite (READY marker), before that everything stays on SQL.
+SQLite remains the source of truth.
+
+The column files live in a generation directory <target>/g<N>/ named by
+<target>/CURRENT. Appends go in place (ts last); full rewrites (backfill, trim,
+rebuild) fill g<N+1> and then swap CURRENT, so a reader never mixes columns of
+two rewrites. The previous generation is kept until the next rewrite for readers
+that already picked it. On Windows a generation still mmapped by a reader cannot
+be deleted: it is skipped and removed by a later rewrite.
+Writes to a target hold <target>/LOCK (flock / msvcrt), so web workers storing
+ingest / push results and the poller never rewrite the same target at once.
+A failed write leaves <target>/STALE: that series is read from SQL until ts-rebuild.
+"""
+import math
+import mmap
+import os
+import shutil
+import threading
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from flask import current_app
+
+EPOCH = datetime(1970, 1, 1)
+NAN = float("nan")
+
+# name, array typecode, null value
+COLUMNS = (
+    ("ts", "q", None),
+    ("ok", "B", None),
+    ("latency_ms", "i", -1),
+    ("cpu_percent", "f", NAN),
+    ("mem_percent", "f", NAN),
+    ("disk_percent", "f", NAN),
+    ("swap_percent", "f", NAN),
+)
+_CODES = {name: code for name, code, _ in COLUMNS}
+_WIDTH = {name: array(code).itemsize for name, code, _ in COLUMNS}
+
+_write_lock = threading.Lock()
+
+
+def enabled(app=None) -> bool:
+    app = app or current_app
+    return bool(app.config.get("TSSTORE_ENABLED"))
+
+
+def ready(app=None) -> bool:
+    """Readable: enabled and filled by ts-rebuild at least once."""
+    app = app or current_app
+    return enabled(app) and os.path.exists(os.path.join(_root(app), "READY"))
+
+
+def to_ts(dt: datetime) -> int:
+    return int((dt.replace(tzinfo=None) - EPOCH).total_seconds())
+
+
+def from_ts(ts: int) -> datetime:
+    return EPOCH + timedelta(seconds=ts)
+
+
+# ---- read ----
+class Series:
+    """Zero-copy view of one target's columns (memoryviews over mmaps)."""
+
+    def __init__(self, target_id: int, root: str):
+        d = os.path.join(root, str(target_id))
+        # pinned: later col() calls read the same generation (none yet => no files, empty)
+        self._dir = _current(d) or d
+        self._cols: dict[str, memoryview] = {}
+        self.ts = self.col("ts")
+        self.n = len(self.ts)
+
+    def col(self, name: str) -> memoryview:
+        if name not in self._cols:
+            self._cols[name] = _map(os.path.join(self._dir, f"{name}.{_CODES[name]}"), _CODES[name])
+        mv = self._cols[name]
+        return mv[: self.n] if name != "ts" else mv
+
+    def span(self, start: datetime, end: datetime) -> tuple[int, int]:
+        """Row range [lo, hi) with start <= hour_bucket < end."""
+        return bisect_left(self.ts, to_ts(start)), bisect_left(self.ts, to_ts(end))
+
+    def slice(self, name: str, lo: int, hi: int) -> memoryview:
+        return self.col(name)[lo:hi]
+
+
+def open_series(target_id: int, app=None) -> Series | None:
+    """None when the target has no rows or a write failed (STALE) => caller uses SQL."""
+    app = app or current_app
+    root = _root(app)
+    if os.path.exists(os.path.join(root, str(target_id), "STALE")):
+        return None
+    s = Series(target_id, root)
+    return s if s.n else None
+
+
+def value(name: str, v):
+    """memoryview item -> python value (None for nulls)."""
+    if name == "ok":
+        return bool(v)
+    if name == "latency_ms":
+        return None if v == -1 else v
+    if name.endswith("_percent"):
+        return None if math.isnan(v) else round(v, 2)
+    return v
+
+
+# ---- write ----
+def record(app, target_id: int, snap) -> None:
+    """Write path hook (after commit): upsert the row of snap.hour_bucket."""
+    if not enabled(app):
+        return
+    row = _row(snap)
+    d = os.path.join(_root(app), str(target_id))
+    try:
+        with _locked(d):
+            _upsert(d, row)
+    except OSError as e:
+        _mark_stale(app, d, e)
+
+
+def drop(app, target_id: int) -> None:
+    if enabled(app):
+        shutil.rmtree(os.path.join(_root(app), str(target_id)), ignore_errors=True)
+
+
+def trim(app, before: datetime) -> None:
+    """Drop rows with hour_bucket < before (moved to the archive, see services/archive.py)."""
+    if not enabled(app):
+        return
+    root = _root(app)
+    if not os.path.isdir(root):
+        return
+    cut = to_ts(before)
+    for name in os.listdir(root):
+        d = os.path.join(root, name)
+        if not name.isdigit() or not os.path.isdir(d):
+            continue
+        try:
+            with _locked(d):
+                g = _current(d)
+                if g is None:
+                    continue
+                ts = _map(os.path.join(g, "ts.q"), "q")
+                n, pos = len(ts), bisect_left(ts, cut)
+                ts.release()
+                if pos:
+                    _write_all(d, _read_all(g, n)[pos:])
+        except OSError as e:
+            _mark_stale(app, d, e)
+
+
+def rebuild(app, target_ids: list[int] | None = None) -> dict:
+    """
+    Refill from SQLite (inside app context). All targets => marks the store READY.
+    Returns {target_id: rows}.
+    """
+    from .. import db
+    from ..models import Snapshot, Target
+
+    root = _root(app)
+    os.makedirs(root, exist_ok=True)
+    full = target_ids is None
+    if full:
+        target_ids = [tid for (tid,) in db.session.query(Target.id).order_by(Target.id.asc()).all()]
+        for name in os.listdir(root):
+            if name.isdigit() and int(name) not in target_ids:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    out = {}
+    for tid in target_ids:
+        q = (
+            db.session.query(
+                Snapshot.hour_bucket, Snapshot.ok, Snapshot.latency_ms,
+                Snapshot.cpu_percent, Snapshot.mem_percent, Snapshot.disk_percent, Snapshot.swap_percent,
+            )
+            .filter(Snapshot.target_id == tid)
+            .order_by(Snapshot.hour_bucket.asc(), Snapshot.id.asc())
+        )
+        rows: dict[int, dict] = {}
+        for r in q.yield_per(5000):
+            rows[to_ts(r.hour_bucket)] = _row(r)  # duplicate bucket: last id wins
+        d = os.path.join(root, str(tid))
+        with _locked(d):
+            _write_all(d, [rows[k] for k in sorted(rows)])
+            try:
+                os.remove(os.path.join(d, "STALE"))  # filled from SQL again
+            except FileNotFoundError:
+                pass
+        out[tid] = len(rows)
+
+    if full:
+        with open(os.path.join(root, "READY"), "w") as f:
+            f.write(datetime.utcnow().isoformat())
+    return out
+
+
+def _root(app) -> str:
+    return app.config.get("TSSTORE_DIR") or os.path.join(app.instance_path, "tsstore")
+
+
+def _row(s) -> dict:
+    def f(v):
+        return NAN if v is None else float(v)
+
+    return {
+        "ts": to_ts(s.hour_bucket),
+        "ok": 1 if s.ok else 0,
+        "latency_ms": -1 if s.latency_ms is None else int(s.latency_ms),
+        "cpu_percent": f(s.cpu_percent),
+        "mem_percent": f(s.mem_percent),
+        "disk_percent": f(s.disk_percent),
+        "swap_percent": f(s.swap_percent),
+    }
+
+
+def _map(path: str, code: str) -> memoryview:
+    try:
+        with open(path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            size -= size % array(code).itemsize  # ignore a torn last record
+            if size == 0:
+                return memoryview(b"").cast(code)
+            mm = mmap.mmap(fh.fileno(), size, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return memoryview(b"").cast(code)
+    return memoryview(mm).cast(code)
+
+
+@contextmanager
+def _locked(d: str):
+    """Exclusive writer of target dir d: threads of this process + other processes (<d>/LOCK)."""
+    os.makedirs(d, exist_ok=True)
+    with _write_lock, open(os.path.join(d, "LOCK"), "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)  # released when fh closes
+            yield
+            return
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)  # retries for ~10s, then OSError
+        try:
+            yield
+        finally:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _mark_stale(app, d: str, err: OSError):
+    """Failed write: this series is behind SQLite, readers use SQL until ts-rebuild."""
+    try:
+        open(os.path.join(d, "STALE"), "w").close()
+    except OSError:
+        pass
+    app.logger.warning("tsstore: %s not updated (%s), read from SQL until ts-rebuild", d, err)
+
+
+def _current(d: str) -> str | None:
+    """Generation directory of target dir d, None when there is none yet (new target)."""
+    try:
+        with open(os.path.join(d, "CURRENT")) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(d, name) if name else None
+
+
+def _upsert(d: str, row: dict):
+    g = _current(d)
+    if g is None:
+        _write_all(d, [row])  # first row of this target
+        return
+
+    ts_path = os.path.join(g, "ts.q")
+    n = os.path.getsize(ts_path) // _WIDTH["ts"] if os.path.exists(ts_path) else 0
+
+    if n:
+        ts = _map(ts_path, "q")
+        last = ts[n - 1]
+        if row["ts"] > last:
+            pos = n  # common case: new hour => append
+        else:
+            pos = bisect_left(ts, row["ts"], 0, n)
+            if pos == n or ts[pos] != row["ts"]:
+                # backfill of a missing older bucket (agents): rewrite this target
+                rows = _read_all(g, n)
+                rows.insert(pos, row)
+                del ts
+                _write_all(d, rows)
+                return
+        del ts
+    else:
+        pos = 0
+
+    # ts last: readers size everything by ts, so a new row appears only when complete
+    for name, code, _ in sorted(COLUMNS, key=lambda c: c[0] == "ts"):
+        path = os.path.join(g, f"{name}.{code}")
+        with open(path, "r+b" if os.path.exists(path) else "wb") as fh:
+            fh.seek(pos * _WIDTH[name])
+            fh.write(array(code, [row[name]]).tobytes())
+
+
+def _read_all(d: str, n: int) -> list[dict]:
+    cols = {name: _map(os.path.join(d, f"{name}.{code}"), code) for name, code, _ in COLUMNS}
+    rows = [{name: cols[name][i] for name in cols} for i in range(n)]
+    for mv in cols.values():
+        mv.release()
+    return rows
+
+
+def _write_all(d: str, rows: list[dict]):
+    """Rewrite target dir d: new generation, then swap CURRENT (readers see old or new, never a mix)."""
+    os.makedirs(d, exist_ok=True)
+    cur = _current(d)
+    gen = int(os.path.basename(cur)[1:]) + 1 if cur else 1
+    g = os.path.join(d, f"g{gen}")
+    shutil.rmtree(g, ignore_errors=True)  # left by a crashed rewrite
+    os.makedirs(g)
+    for name, code, _ in COLUMNS:
+        with open(os.path.join(g, f"{name}.{code}"), "wb") as fh:
+            fh.write(array(code, [r[name] for r in rows]).tobytes())
+
+    tmp = os.path.join(d, "CURRENT.tmp")
+    with open(tmp, "w") as f:
+        f.write(f"g{gen}")
+    os.replace(tmp, os.path.join(d, "CURRENT"))  # CURRENT is never mmapped: fine on Windows too
+
+    # keep g<gen-1> (readers may have just picked it), drop older ones
+    for name in os.listdir(d):
+        if name[:1] == "g" and name[1:].isdigit() and int(name[1:]) < gen - 1:
+            shutil.rmtree(os.path.join(d, name), ignore_errors=True)  # Windows: still mapped => next time
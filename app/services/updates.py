@@ -1,7 +1,9 @@
 # app/services/updates.py
 import os
 import re
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime
 from typing import Optional
 
 import requests
@@ -20,6 +22,12 @@ class UpdateInfo:
     asset_url: str  # optional
 
 
+# per-process cache of the latest release (see refresh())
+_cache = {"repo": None, "info": None, "etag": None, "fetched_at": None, "checked_at": None, "error": None}
+_lock = threading.Lock()
+_refreshing = threading.Lock()
+
+
 def _norm_ver(v: str) -> tuple[int, int, int]:
     v = (v or "").strip()
     v = v[1:] if v.lower().startswith("v") else v
@@ -35,16 +43,88 @@ def _is_newer(remote: str, local: str) -> bool:
 
 def check_update(app) -> Optional[UpdateInfo]:
     """
+    Cached release info, never blocks on the network:
+      - None if GITHUB_REPO is not set
+      - last known UpdateInfo otherwise (refreshed by the scheduler, see refresh())
+    Raises RuntimeError while nothing was fetched yet (with the last error if any).
+    """
+    repo = _repo(app)
+    if not repo:
+        return None
+
+    with _lock:
+        info = _cache["info"] if _cache["repo"] == repo else None
+        err = _cache["error"]
+    if info is None:
+        raise RuntimeError(f"Update check failed: {err}" if err else "Checking for updates…")
+
+    # local version may change on restart, the cached release does not
+    return replace(info, local_version=__version__, has_update=_is_newer(info.latest_version, __version__))
+
+
+def cache_state() -> dict:
+    """checked_at / fetched_at (UTC) + last error, for the owner page."""
+    with _lock:
+        return {k: _cache[k] for k in ("checked_at", "fetched_at", "error")}
+
+
+def is_stale(app) -> bool:
+    ttl = int(app.config.get("UPDATE_CHECK_TTL_S", 6 * 3600))
+    with _lock:
+        checked = _cache["checked_at"]
+        same_repo = _cache["repo"] == _repo(app)
+        if _cache["error"]:
+            ttl = min(ttl, 300)  # retry failures sooner
+    return not same_repo or checked is None or (datetime.utcnow() - checked).total_seconds() >= ttl
+
+
+def refresh(app, force: bool = False) -> Optional[UpdateInfo]:
+    """
+    Revalidate the cached release (scheduler job / "Check now"):
+      - skipped while the cache is younger than UPDATE_CHECK_TTL_S (unless force)
+      - If-None-Match with the last ETag; 304 keeps the cached info
+    A failed request keeps the previous info and records the error.
     Uses GitHub Releases latest endpoint:
-      https://api.github.com/repos/{owner}/{repo}/releases/latest
+      {GITHUB_API_URL}/repos/{owner}/{repo}/releases/latest
     Needs env/config:
       GITHUB_REPO="TroLyAmazon/VietUptime"
       optional GITHUB_TOKEN (private repo / higher rate limit)
     """
-    repo = app.config.get("GITHUB_REPO", "") or os.getenv("GITHUB_REPO", "")
+    repo = _repo(app)
     if not repo:
         return None
-
+    if not force and not is_stale(app):
+        return _cache["info"]
+    if not _refreshing.acquire(blocking=False):
+        return _cache["info"]  # another thread is already asking GitHub
+
+    try:
+        with _lock:
+            etag = _cache["etag"] if _cache["repo"] == repo else None
+
+        try:
+            status, info, new_etag = _fetch(app, repo, etag)
+        except (requests.RequestException, ValueError) as e:
+            with _lock:
+                if _cache["repo"] != repo:
+                    _cache.update(repo=repo, info=None, etag=None, fetched_at=None)
+                _cache["error"] = str(e) or e.__class__.__name__
+                _cache["checked_at"] = datetime.utcnow()
+            return _cache["info"]
+
+        now = datetime.utcnow()
+        with _lock:
+            if status != 304:
+                _cache.update(repo=repo, info=info, etag=new_etag, fetched_at=now)
+            _cache["checked_at"] = now
+            _cache["error"] = None
+            return _cache["info"]
+    finally:
+        _refreshing.release()
+
+
+def _fetch(app, repo: str, etag: Optional[str]):
+    """-> (http status, UpdateInfo or None on 304, etag)"""
     local = __version__
     repo_url = f"https://github.com/{repo}"
     release_url = f"https://github.com/{repo}/releases/latest"
@@ -56,13 +136,20 @@ def check_update(app) -> Optional[UpdateInfo]:
     }
     if token:
         headers["Authorization"] = f"Bearer {token}"
+    if etag:
+        # 304 responses do not count against the GitHub rate limit
+        headers["If-None-Match"] = etag
+
+    base = app.config.get("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+    api = f"{base}/repos/{repo}/releases/latest"
+    r = requests.get(api, headers=headers, timeout=float(app.config.get("UPDATE_CHECK_TIMEOUT_S", 12)))
 
-    api = f"https://api.github.com/repos/{repo}/releases/latest"
-    r = requests.get(api, headers=headers, timeout=12)
+    if r.status_code == 304:
+        return 304, None, etag
 
     if r.status_code == 404:
         # no release yet
-        return UpdateInfo(
+        return 404, UpdateInfo(
             local_version=local,
             latest_version="",
             has_update=False,
@@ -70,7 +157,7 @@ def check_update(app) -> Optional[UpdateInfo]:
             repo_url=repo_url,
             release_url=release_url,
             asset_url="",
-        )
+        ), r.headers.get("ETag")
 
     r.raise_for_status()
     data = r.json()
@@ -84,7 +171,7 @@ def check_update(app) -> Optional[UpdateInfo]:
     if assets:
         asset_url = (assets[0].get("browser_download_url") or "").strip()
 
-    return UpdateInfo(
+    return r.status_code, UpdateInfo(
         local_version=local,
         latest_version=latest,
         has_update=_is_newer(latest, local),
@@ -92,4 +179,8 @@ def check_update(app) -> Optional[UpdateInfo]:
         repo_url=repo_url,
         release_url=release_url,
         asset_url=asset_url,
-    )
+    ), r.headers.get("ETag")
+
+
+def _repo(app) -> str:
+    return app.config.get("GITHUB_REPO", "") or os.getenv("GITHUB_REPO", "")
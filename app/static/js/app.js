@@ -41,6 +41,207 @@ function getDefaultTargetId() {
   return Number.isFinite(n) ? n : null;
 }
 
+function setText(el, text) {
+  if (el) el.textContent = text;
+}
+
+function applySnapshot(d, svc) {
+  svc = svc || document.querySelector(`.service[data-target-id="${d.target_id}"]`);
+  if (!svc) return;
+
+  const dot = svc.querySelector('[data-field="dot"]');
+  if (dot) {
+    dot.classList.toggle("ok", !!d.ok);
+    dot.classList.toggle("bad", !d.ok);
+  }
+  setText(svc.querySelector('[data-field="rt"]'), d.latency_ms != null ? `${d.latency_ms}ms` : "—");
+  // hour_bucket: "YYYY-MM-DDTHH:MM:SS" -> "YYYY-MM-DD HH:MM"
+  setText(svc.querySelector('[data-field="last"]'), (d.hour_bucket || "").replace("T", " ").slice(0, 16) || "—");
+}
+
+function setSummary(summary) {
+  for (const [k, v] of Object.entries(summary || {})) {
+    setText(document.querySelector(`[data-count="${k}"]`), v);
+  }
+}
+
+// Up/Down counts: re-read from the server (messages may repeat, counting them would drift).
+// Debounced, after the next status board sync (data-summary-delay ms).
+let summaryTimer;
+function refreshSummary() {
+  const list = document.getElementById("serviceList");
+  const data = document.getElementById("dotstatusData");
+  if (!list) return;
+  clearTimeout(summaryTimer);
+  summaryTimer = setTimeout(async () => {
+    const res = await fetch(`${list.dataset.cardsUrl}?limit=1`, { headers: { Accept: "application/json" } });
+    if (res.ok) setSummary((await res.json()).summary);
+  }, parseInt((data && data.dataset.summaryDelay) || "1000", 10));
+}
+
+// status = UP <-> DOWN transition: dot from the message (idempotent) + fresh counts
+function applyStatus(d) {
+  const svc = document.querySelector(`.service[data-target-id="${d.target_id}"]`);
+  const dot = svc && svc.querySelector('[data-field="dot"]');
+  if (dot) {
+    dot.classList.toggle("ok", !!d.ok);
+    dot.classList.toggle("bad", !d.ok);
+  }
+  refreshSummary();
+}
+
+function eventDetail(ev) {
+  let s = `Down: ${(ev.started_at || "").replace("T", " ")} → `;
+  s += ev.ended_at ? `Up: ${ev.ended_at.replace("T", " ")}` : "ONGOING";
+  if (ev.http_status) s += ` · HTTP ${ev.http_status}`;
+  if (ev.reason) s += ` · ${ev.reason}`;
+  return s;
+}
+
+function applyEvent(ev) {
+  const list = document.getElementById("eventsList");
+  if (!list) return;
+
+  let row = list.querySelector(`.event[data-event-id="${ev.id}"]`);
+  if (!row) {
+    const empty = document.getElementById("eventsEmpty");
+    if (empty) empty.remove();
+
+    row = document.createElement("div");
+    row.className = "event";
+    row.dataset.eventId = ev.id;
+
+    const title = document.createElement("div");
+    title.className = "event-title";
+    title.textContent = ev.target_name || `Target #${ev.target_id}`;
+
+    const detail = document.createElement("div");
+    detail.className = "muted event-detail";
+
+    row.append(title, detail);
+    list.prepend(row);
+  }
+  setText(row.querySelector(".event-detail"), eventDetail(ev));
+}
+
+// Services: cards are loaded page by page (keyset "after") from /api/cards
+function renderCard(c) {
+  const tpl = document.getElementById("serviceTpl");
+  const svc = tpl.content.firstElementChild.cloneNode(true);
+  svc.dataset.targetId = c.id;
+
+  setText(svc.querySelector('[data-field="name"]'), c.name);
+  const host = svc.querySelector('[data-field="host"]');
+  if (c.href) {
+    const a = document.createElement("a");
+    a.href = c.href;
+    a.target = "_blank";
+    a.rel = "noopener noreferrer";
+    a.textContent = c.host;
+    host.append(a);
+  } else {
+    setText(host, c.host);
+  }
+
+  for (const [k, v] of Object.entries(c.uptime || {})) {
+    setText(svc.querySelector(`[data-uptime="${k}"]`), v != null ? `${v}%` : "—");
+  }
+
+  const bars = svc.querySelector('[data-field="bars"]');
+  for (const b of c.bars_90d || []) {
+    const bar = document.createElement("div");
+    bar.className = `bar ${b.cls}`;
+    bar.title = `${b.date} · ${b.pct == null ? "no data" : `${b.pct}%`}`;
+    bars.append(bar);
+  }
+
+  const dot = svc.querySelector('[data-field="dot"]');
+  dot.classList.add(c.last && c.last.ok ? "ok" : "bad");
+  if (c.last) applySnapshot({ target_id: c.id, ...c.last }, svc);
+  return svc;
+}
+
+// chart <select>: the page renders only the default target, the rest come with the card pages
+function addTargetOptions(cards) {
+  const select = document.getElementById("targetSelect");
+  if (!select) return;
+  const have = new Set(Array.from(select.options, (o) => o.value));
+  for (const c of cards) {
+    if (have.has(String(c.id))) continue;
+    const opt = document.createElement("option");
+    opt.value = c.id;
+    opt.textContent = c.enabled ? c.name : `${c.name} (disabled)`;
+    select.append(opt);
+  }
+}
+
+function initServices() {
+  const list = document.getElementById("serviceList");
+  if (!list) return;
+  const more = document.getElementById("serviceMore");
+  let next = 0;
+  let loading = false;
+
+  const loadPage = async () => {
+    if (loading || next === null) return;
+    loading = true;
+    const params = new URLSearchParams({ limit: list.dataset.pageSize || "24" });
+    if (list.dataset.status) params.set("status", list.dataset.status);
+    if (next) params.set("after", next);
+
+    try {
+      const res = await fetch(`${list.dataset.cardsUrl}?${params}`, { headers: { Accept: "application/json" } });
+      if (!res.ok) return;
+      const data = await res.json();
+
+      const frag = document.createDocumentFragment();
+      data.cards.forEach((c) => frag.append(renderCard(c)));
+      list.append(frag);
+      addTargetOptions(data.cards);
+
+      if (data.summary) setSummary(data.summary);
+      next = data.next;
+      more.hidden = next === null;
+      document.getElementById("serviceEmpty").hidden = list.children.length > 0;
+    } finally {
+      loading = false;
+    }
+  };
+
+  more.addEventListener("click", loadPage);
+  // next page when the "Load more" button scrolls into view
+  if (window.IntersectionObserver) {
+    new IntersectionObserver((entries) => {
+      if (entries.some((e) => e.isIntersecting)) loadPage();
+    }, { rootMargin: "400px" }).observe(more);
+  }
+  loadPage();
+}
+
+// SSE: server pushes new data when the poller writes (no more 30s polling)
+function subscribeLive(select) {
+  if (!window.EventSource) return false;
+
+  const es = new EventSource("/api/stream");
+
+  es.addEventListener("snapshot", (e) => {
+    const d = JSON.parse(e.data);
+    applySnapshot(d);
+    if (String(d.target_id) === select.value) loadLatency(select.value);
+  });
+
+  es.addEventListener("status", (e) => {
+    applyStatus(JSON.parse(e.data));
+  });
+
+  es.addEventListener("event", (e) => {
+    applyEvent(JSON.parse(e.data));
+  });
+
+  // EventSource tự reconnect (gửi Last-Event-ID) khi mất kết nối
+  return true;
+}
+
 function init() {
   const select = document.getElementById("targetSelect");
   if (!select) return;
@@ -58,10 +259,72 @@ function init() {
     loadLatency(select.value);
   });
 
-  // Refresh chart data mỗi 30s (UI-only)
-  setInterval(() => {
-    loadLatency(select.value);
-  }, 30000);
+  if (!subscribeLive(select)) {
+    // Browser không có EventSource: refresh chart data mỗi 30s
+    setInterval(() => {
+      loadLatency(select.value);
+    }, 30000);
+  }
+}
+
+// Owner: poll background job status (add target + test)
+function watchJob() {
+  const el = document.getElementById("jobStatus");
+  if (!el) return;
+
+  const label = (j) => {
+    if (j.status === "done" && j.result) {
+      if (j.result.skipped) return j.result.skipped;
+      return one(j.result);
+    }
+    if (j.status === "error") return `error: ${j.error}`;
+    return j.status;
+  };
+
+  const one = (r) => {
+    const rt = r.latency_ms != null ? ` · ${r.latency_ms}ms` : "";
+    const http = r.http_status ? ` · HTTP ${r.http_status}` : "";
+    return `${r.ok ? "UP" : "DOWN"}${http}${rt}`;
+  };
+
+  const tick = async () => {
+    const res = await fetch(el.dataset.jobUrl, { headers: { Accept: "application/json" } });
+    const b = el.querySelector("b");
+    if (!res.ok) {
+      // 404: job expired (JOB_RETENTION_S) or unknown
+      if (b) b.textContent = res.status === 404 ? "error: job not found" : `error: HTTP ${res.status}`;
+      return;
+    }
+    const j = await res.json();
+
+    // import: result = {target_id: {ok, http_status, latency_ms}}
+    if (j.kind === "import_test") {
+      if (b) b.textContent = j.status === "error" ? `error: ${j.error}` : j.status;
+      for (const [tid, r] of Object.entries(j.result || {})) {
+        const cell = document.querySelector(`[data-probe-for="${tid}"]`);
+        if (cell) cell.textContent = one(r);
+      }
+    } else if (b) {
+      b.textContent = label(j);
+    }
+    if (j.status === "queued" || j.status === "running") setTimeout(tick, 1500);
+  };
+  tick();
+}
+
+// Owner DB viewer: load raw_json only when a row is opened
+function lazyRaw() {
+  document.querySelectorAll("details.raw[data-raw-url]").forEach((el) => {
+    el.addEventListener("toggle", async () => {
+      if (!el.open || el.dataset.loaded) return;
+      el.dataset.loaded = "1";
+      const res = await fetch(el.dataset.rawUrl);
+      el.querySelector("pre").textContent = res.ok ? (await res.text()) || "(empty)" : `HTTP ${res.status}`;
+    });
+  });
 }
 
 document.addEventListener("DOMContentLoaded", init);
+document.addEventListener("DOMContentLoaded", initServices);
+document.addEventListener("DOMContentLoaded", watchJob);
+document.addEventListener("DOMContentLoaded", lazyRaw);
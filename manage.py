@@ -0,0 +1,192 @@
+# manage.py - maintenance commands (no scheduler is started)
+#
+#   python manage.py ts-rebuild [--target ID]
+#   python manage.py ts-bench [--targets 20] [--repeat 5]
+#   python manage.py plan-check [-v]
+#   python manage.py archive [--dry-run] [--vacuum]
+#   python manage.py db-copy --from instance/status.sqlite [--truncate]   (into DATABASE_URL)
+#   python manage.py db-copy --to backup.sqlite                           (out of DATABASE_URL)
+import argparse
+import sys
+import time
+
+from app import create_app, db
+
+
+def cmd_ts_rebuild(app, args):
+    from app.services import tsstore
+
+    if not tsstore.enabled(app):
+        print("TSSTORE_ENABLED=1 is not set; the store would not be fed or read.")
+        return 2
+    t = time.perf_counter()
+    out = tsstore.rebuild(app, [args.target] if args.target else None)
+    print(f"rebuilt {len(out)} target(s), {sum(out.values())} row(s) in {time.perf_counter() - t:.2f}s")
+    if not args.target:
+        print("store marked READY, metrics now read from it")
+    return 0
+
+
+def cmd_ts_bench(app, args):
+    """Same metrics calls on the SQL path and on the columnar store."""
+    from app.models import Target
+    from app.services import metrics, tsstore
+
+    if not tsstore.ready(app):
+        print("Store not ready: set TSSTORE_ENABLED=1 and run `python manage.py ts-rebuild` first.")
+        return 2
+
+    tz = app.config["TIMEZONE"]
+    ids = [tid for (tid,) in db.session.query(Target.id).order_by(Target.id.asc()).limit(args.targets).all()]
+    if not ids:
+        print("No targets.")
+        return 1
+
+    calls = {
+        "latency_series 48h": lambda tid: metrics.latency_series(tid, 48, tz),
+        "uptime_percent 90d": lambda tid: metrics.uptime_percent(tid, 24 * 90, tz),
+        "bars_90d": lambda tid: metrics.bars_90d(tid, tz),
+    }
+
+    def run(fn):
+        best = None
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            for tid in ids:
+                fn(tid)
+            dt = time.perf_counter() - t
+            best = dt if best is None else min(best, dt)
+        return best * 1000.0 / len(ids)
+
+    print(f"{len(ids)} target(s), best of {args.repeat}, ms per target")
+    print(f"{'call':<22}{'sql':>10}{'tsstore':>10}{'speedup':>10}")
+    for name, fn in calls.items():
+        app.config["TSSTORE_ENABLED"] = False
+        sql_ms = run(fn)
+        app.config["TSSTORE_ENABLED"] = True
+        store_ms = run(fn)
+        same = all(fn(tid) == _sql(app, fn, tid) for tid in ids)
+        print(f"{name:<22}{sql_ms:>10.2f}{store_ms:>10.2f}{sql_ms / store_ms if store_ms else 0:>9.1f}x"
+              f"{'' if same else '  (results differ, run ts-rebuild)'}")
+    return 0
+
+
+def _sql(app, fn, tid):
+    app.config["TSSTORE_ENABLED"] = False
+    try:
+        return fn(tid)
+    finally:
+        app.config["TSSTORE_ENABLED"] = True
+
+
+def cmd_plan_check(app, args):
+    """EXPLAIN QUERY PLAN of the hot queries; exit 1 on a table scan / lost covering index."""
+    from app.services import queryplan
+
+    try:
+        results = queryplan.run_checks(app)
+    except RuntimeError as e:
+        print(e)
+        return 2
+    failed = 0
+    for r in results:
+        ok = not r["problems"]
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {r['name']} ({r['expect']})")
+        for p in r["problems"]:
+            print(f"       {p}")
+        if args.verbose:
+            for plan in r["plans"]:
+                for line in plan:
+                    print(f"       | {line}")
+    print(f"{failed} failing check(s)" if failed else "all query plans ok")
+    return 1 if failed else 0
+
+
+def cmd_archive(app, args):
+    """Move months older than ARCHIVE_AFTER_DAYS to cold storage (same as the daily job)."""
+    from sqlalchemy import text
+
+    from app.services import archive, counters
+
+    if not archive.enabled(app):
+        print("ARCHIVE_AFTER_DAYS is not set (0); nothing is archived.")
+        return 2
+    print(f"cutoff: {archive.cutoff(app):%Y-%m-%d} (older months are archived)")
+    out = archive.run(app, dry_run=args.dry_run)
+    for m in out:
+        if args.dry_run:
+            print(f"{m['month']}: {m['moved']} row(s) would move")
+        else:
+            print(f"{m['month']}: moved {m['moved']} row(s), {m['rows']} in archive file")
+    if not out:
+        print("nothing to archive")
+    if args.vacuum and not args.dry_run and db.engine.dialect.name == "sqlite":
+        # deleted pages are only reused, the file shrinks with VACUUM
+        db.session.commit()
+        with db.engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+        counters.refresh_db_size()
+        print("vacuumed")
+    return 0
+
+
+def cmd_db_copy(app, args):
+    """SQLite <-> PostgreSQL: copy every table between DATABASE_URL and another DB, ids kept."""
+    from app.services import counters, dbcopy
+
+    other = dbcopy.engine_for(args.source or args.dest, app)
+    src, dst = (other, db.engine) if args.source else (db.engine, other)
+    print(f"{src.url.render_as_string(hide_password=True)} -> {dst.url.render_as_string(hide_password=True)}")
+    db.session.remove()  # no open transaction on the app DB while copying
+    try:
+        out = dbcopy.copy(src, dst, batch=args.batch, truncate=args.truncate)
+    except RuntimeError as e:
+        print(f"error: {e}")
+        return 1
+    finally:
+        other.dispose()
+    if args.source:
+        counters.seed(force=True)
+    print(f"copied {sum(out.values())} row(s) in {len(out)} table(s)")
+    return 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="DotStatus maintenance")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("ts-rebuild", help="refill the columnar store from SQLite")
+    p.add_argument("--target", type=int, help="only this target (does not mark the store READY)")
+    p.set_defaults(fn=cmd_ts_rebuild)
+
+    p = sub.add_parser("ts-bench", help="compare metrics reads: SQL vs columnar store")
+    p.add_argument("--targets", type=int, default=20)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(fn=cmd_ts_bench)
+
+    p = sub.add_parser("plan-check", help="assert index usage of the hot queries (SQLite)")
+    p.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    p.set_defaults(fn=cmd_plan_check)
+
+    p = sub.add_parser("archive", help="move old snapshots to cold storage (ARCHIVE_AFTER_DAYS)")
+    p.add_argument("--dry-run", action="store_true", help="only count rows per month")
+    p.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite file afterwards")
+    p.set_defaults(fn=cmd_archive)
+
+    p = sub.add_parser("db-copy", help="copy all data between DATABASE_URL and another DB (SQLite <-> PostgreSQL)")
+    g = p.add_mutually_exclusive_group(required=True)
+    g.add_argument("--from", dest="source", help="source URL or SQLite file, copied into DATABASE_URL")
+    g.add_argument("--to", dest="dest", help="destination URL or SQLite file, DATABASE_URL is copied into it")
+    p.add_argument("--truncate", action="store_true", help="empty the destination tables first")
+    p.add_argument("--batch", type=int, default=2000)
+    p.set_defaults(fn=cmd_db_copy)
+
+    args = ap.parse_args()
+    app = create_app(with_scheduler=False)
+    with app.app_context():
+        sys.exit(args.fn(app, args))
+
+
+if __name__ == "__main__":
+    main()
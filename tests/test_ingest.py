@@ -0,0 +1,115 @@
+"""
+Agent / push results arriving in batches, out of order: store_batch() + rebuild_events()
+must end with the events (and live messages) an in-order poller would have produced.
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from app import create_app, db
+from app.config import Config
+from app.models import Event, LiveEvent, Target
+from app.services import ingest
+
+_tmp = tempfile.mkdtemp(prefix="dotstatus-ingest-test-")
+# Config reads the environment once, when the first test module imports app: patch the class
+TEST_CONFIG = {
+    "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(_tmp, "test.sqlite"),
+    "SQLALCHEMY_ENGINE_OPTIONS": {},
+    "BOARD_PATH": os.path.join(_tmp, "board.json"),
+    "BOARD_ENABLED": False,
+    "TSSTORE_ENABLED": False,
+    "LOCAL_POLLING": False,
+    "RUN_SCHEDULER": False,
+    "SEED_TARGET_BASE_URL": "",
+}
+
+# hour -> ok: down from hour 2 to 4 and from 5 to 6
+OK = {0: True, 1: True, 2: False, 3: False, 4: True, 5: False, 6: True, 7: True}
+
+
+class OutOfOrderBatchTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with mock.patch.multiple(Config, **TEST_CONFIG):
+            cls.app = create_app(with_scheduler=False)
+        tz = ZoneInfo(cls.app.config["TIMEZONE"])
+        cls.base = datetime.now(tz).replace(minute=0, second=0, microsecond=0) - timedelta(hours=10)
+        with cls.app.app_context():
+            t = Target(name="agent-fed", base_url="http://agent-fed.example")
+            db.session.add(t)
+            db.session.commit()
+            cls.target_id = t.id
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(_tmp, ignore_errors=True)
+
+    def hour(self, h: int) -> datetime:
+        """hour_bucket as stored (naive, TIMEZONE)"""
+        return (self.base + timedelta(hours=h)).replace(tzinfo=None)
+
+    def push(self, hours: list[int]) -> list[tuple]:
+        """store one batch; -> status messages it published as (ok, hour)"""
+        items = [
+            {
+                "target_id": self.target_id,
+                "polled_at": (self.base + timedelta(hours=h, minutes=5)).isoformat(),
+                "ok": OK[h],
+                "http_status": 200 if OK[h] else 503,
+                "reason": None if OK[h] else "http_503",
+            }
+            for h in hours
+        ]
+        with self.app.app_context():
+            after = db.session.query(db.func.max(LiveEvent.id)).scalar() or 0
+            out = ingest.store_batch(self.app, items)
+            self.assertEqual(out, {"stored": len(hours), "rejected": []})
+            rows = LiveEvent.query.filter(LiveEvent.id > after, LiveEvent.kind == "status").order_by(LiveEvent.id).all()
+            return [(json.loads(r.payload)["ok"], json.loads(r.payload)["at"]) for r in rows]
+
+    def events(self) -> list[tuple]:
+        with self.app.app_context():
+            return [
+                (e.started_at, e.ended_at)
+                for e in Event.query.filter_by(target_id=self.target_id).order_by(Event.started_at).all()
+            ]
+
+    def test_interleaved_batches(self):
+        # first data point DOWN: no event yet
+        self.assertEqual(self.push([7, 3]), [(True, self.hour(7).isoformat())])
+        self.assertEqual(self.events(), [])
+
+        # older hours arrive: 1 UP before 3 DOWN opens an event, closed by 7
+        self.push([5, 1, 0])
+        self.assertEqual(self.events(), [(self.hour(3), self.hour(7))])
+
+        # the gaps: the event moves to hour 2, ends at 4, and 5..6 is a second one
+        status = self.push([6, 2, 4])
+        self.assertEqual(self.events(), [(self.hour(2), self.hour(4)), (self.hour(5), self.hour(6))])
+        self.assertEqual(status, [
+            (False, self.hour(2).isoformat()),
+            (True, self.hour(4).isoformat()),
+            (False, self.hour(5).isoformat()),
+            (True, self.hour(6).isoformat()),
+        ])
+        with self.app.app_context():
+            # reason of the batch that holds the opening hour (snapshots do not keep it)
+            first = Event.query.filter_by(target_id=self.target_id, started_at=self.hour(2)).one()
+            self.assertEqual(first.reason, "http_503")
+
+        # same results again (agent retry): nothing changes
+        self.push([0, 1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(self.events(), [(self.hour(2), self.hour(4)), (self.hour(5), self.hour(6))])
+
+
+if __name__ == "__main__":
+    unittest.main()
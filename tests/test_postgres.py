@@ -0,0 +1,170 @@
+"""
+PostgreSQL-only paths: db-copy round trip (sequence reset), startup lock, live_events
+rows committed after a higher id (live.Seen). Skipped unless TEST_POSTGRES_URL points
+to a scratch database - its tables are dropped.
+  TEST_POSTGRES_URL=postgresql://postgres:pw@localhost/scratch python -m pytest tests/
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from sqlalchemy import create_engine, select, text
+
+from app import create_app, db
+from app.config import Config, _engine_options, normalize_db_url
+from app.models import Event, LiveEvent, Snapshot, Target
+from app.services import dbcopy, live
+from app.services.schema import _STARTUP_LOCK_KEY, startup_lock
+
+PG_URL = os.getenv("TEST_POSTGRES_URL", "")
+
+_tmp = tempfile.mkdtemp(prefix="dotstatus-pg-test-")
+# Config reads the environment once, when the first test module imports app: patch the class
+TEST_CONFIG = {
+    "BOARD_PATH": os.path.join(_tmp, "board.json"),
+    "BOARD_ENABLED": False,
+    "TSSTORE_ENABLED": False,
+    "LOCAL_POLLING": False,
+    "RUN_SCHEDULER": False,
+    "SEED_TARGET_BASE_URL": "",
+}
+
+
+def _fill(engine):
+    """Source SQLite DB with gaps in the ids (the sequences must follow MAX(id), not the row count)."""
+    db.metadata.create_all(engine)
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    with engine.begin() as c:
+        c.execute(Target.__table__.insert(), [
+            {"id": 5, "name": "a", "base_url": "http://a.example"},
+            {"id": 9, "name": "b", "base_url": "http://b.example", "enabled": False},
+        ])
+        c.execute(Snapshot.__table__.insert(), [
+            {"id": 100 + h, "target_id": 5, "hour_bucket": now - timedelta(hours=h),
+             "polled_at": now - timedelta(hours=h), "ok": h != 2, "http_status": 200, "latency_ms": 40 + h}
+            for h in range(5)
+        ])
+        c.execute(Event.__table__.insert(), [
+            {"id": 7, "target_id": 5, "state": "down", "started_at": now - timedelta(hours=2),
+             "ended_at": now - timedelta(hours=1)},
+        ])
+        c.execute(LiveEvent.__table__.insert(), [
+            {"id": 50, "kind": "snapshot", "target_id": 5, "payload": "{}"},
+        ])
+
+
+def _dump(engine) -> dict:
+    with engine.connect() as c:
+        return {
+            t.name: c.execute(select(t).order_by(*t.primary_key.columns)).all()
+            for t in db.metadata.sorted_tables if t.name not in dbcopy.SKIP_TABLES
+        }
+
+
+@unittest.skipUnless(PG_URL, "TEST_POSTGRES_URL not set")
+class PostgresTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        url = normalize_db_url(PG_URL)
+        engine = create_engine(url)
+        db.metadata.drop_all(engine)
+        engine.dispose()
+        db_config = {"SQLALCHEMY_DATABASE_URI": url, "SQLALCHEMY_ENGINE_OPTIONS": _engine_options(url)}
+        with mock.patch.multiple(Config, **TEST_CONFIG, **db_config):
+            cls.app = create_app(with_scheduler=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.session.remove()
+            db.metadata.drop_all(db.engine)
+            db.engine.dispose()
+        shutil.rmtree(_tmp, ignore_errors=True)
+
+    def test_copy_round_trip(self):
+        src = create_engine("sqlite:///" + os.path.join(_tmp, "src.sqlite"))
+        back = create_engine("sqlite:///" + os.path.join(_tmp, "back.sqlite"))
+        _fill(src)
+        with self.app.app_context():
+            pg = db.engine
+            db.session.remove()
+            out = dbcopy.copy(src, pg, truncate=True, log=lambda *_: None)
+            self.assertEqual((out["targets"], out["snapshots"], out["events"]), (2, 5, 1))
+            with self.assertRaises(RuntimeError):
+                dbcopy.copy(src, pg, log=lambda *_: None)  # not empty, no truncate
+
+            dbcopy.copy(pg, back, log=lambda *_: None)
+            self.assertEqual(_dump(back), _dump(src))
+
+            # sequences continue after MAX(id) of the copied rows
+            t = Target(name="c", base_url="http://c.example")
+            db.session.add(t)
+            row = live.publish("status", None, {})
+            db.session.commit()
+            self.assertEqual((t.id, row.id), (10, 51))
+        src.dispose()
+        back.dispose()
+
+    def test_startup_lock(self):
+        def try_lock():
+            with self.app.app_context(), db.engine.connect() as c:
+                got = c.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _STARTUP_LOCK_KEY}).scalar()
+                if got:
+                    c.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _STARTUP_LOCK_KEY})
+                return got
+
+        results = []
+
+        def other_process():
+            results.append(try_lock())
+
+        with self.app.app_context():
+            with startup_lock():
+                t = threading.Thread(target=other_process)
+                t.start()
+                t.join()
+            self.assertEqual(results, [False])
+            self.assertTrue(try_lock())
+
+    def test_late_row(self):
+        """A row whose transaction commits after a higher id was tailed still reaches SSE clients."""
+        with self.app.app_context():
+            hub = live._Hub(self.app)  # not started: _tail() by hand
+            hub.cursor = hub.floor = db.session.query(db.func.max(LiveEvent.id)).scalar() or 0
+            hub.seen.seed(hub.cursor)
+            db.session.remove()
+
+            slow = db.engine.connect()
+            self.addCleanup(slow.close)  # rolls back on a failure: drop_all would wait on it
+            tx = slow.begin()
+            late_id = slow.execute(
+                LiveEvent.__table__.insert().returning(LiveEvent.id),
+                {"kind": "snapshot", "target_id": None, "payload": '{"n": 1}'},
+            ).scalar()
+
+            live.publish("snapshot", None, {"n": 2})
+            db.session.commit()
+            db.session.remove()
+
+        hub._tail()
+        msgs, last_id, seq = hub.wait(0, timeout=0, seq=0)
+        self.assertEqual([m["data"] for m in msgs], ['{"n": 2}'])
+        self.assertGreater(last_id, late_id)
+
+        tx.commit()
+        hub._tail()
+        msgs, last_id2, seq = hub.wait(last_id, timeout=0, seq=seq)
+        self.assertEqual([(m["id"], m.get("late")) for m in msgs], [(late_id, True)])
+        self.assertEqual(last_id2, last_id)  # the client keeps its higher Last-Event-ID
+        self.assertFalse(live.format_sse(msgs[0]).startswith("id:"))
+
+        hub._tail()
+        self.assertEqual(hub.wait(last_id2, timeout=0, seq=seq)[0], [])  # delivered once
+
+
+if __name__ == "__main__":
+    unittest.main()
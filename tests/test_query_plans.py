@@ -0,0 +1,76 @@
+"""
+Query-plan regression test: `manage.py plan-check` on a throwaway SQLite DB.
+Run: python -m pytest tests/ (or python -m unittest discover tests)
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from app import create_app, db
+from app.config import Config
+from app.models import Event, Snapshot, Target
+from app.services import queryplan
+
+_tmp = tempfile.mkdtemp(prefix="dotstatus-test-")
+# Config reads the environment once, when the first test module imports app
+# (DATABASE_URL would be the real instance DB): patch the class instead
+TEST_CONFIG = {
+    "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(_tmp, "test.sqlite"),
+    "SQLALCHEMY_ENGINE_OPTIONS": {},
+    "BOARD_PATH": os.path.join(_tmp, "board.json"),
+    "BOARD_ENABLED": False,
+    "TSSTORE_ENABLED": False,
+    "LOCAL_POLLING": False,
+    "RUN_SCHEDULER": False,
+    "SEED_TARGET_BASE_URL": "",
+}
+
+
+def _fill():
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    for i in range(3):
+        t = Target(name=f"t{i}", base_url=f"http://t{i}.example", enabled=True)
+        db.session.add(t)
+        db.session.flush()
+        for h in range(72):
+            db.session.add(Snapshot(
+                target_id=t.id, polled_at=now - timedelta(hours=h), hour_bucket=now - timedelta(hours=h),
+                ok=h % 10 != 0, http_status=200, latency_ms=50 + h,
+                dns_ms=0, connect_ms=5, tls_ms=10, ttfb_ms=30,
+            ))
+        db.session.add(Event(target_id=t.id, state="down", started_at=now - timedelta(hours=5), ended_at=now))
+    db.session.commit()
+
+
+class QueryPlanTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with mock.patch.multiple(Config, **TEST_CONFIG):
+            cls.app = create_app(with_scheduler=False)
+        with cls.app.app_context():
+            _fill()
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(_tmp, ignore_errors=True)
+
+    def test_hot_queries_use_indexes(self):
+        with self.app.app_context():
+            results = queryplan.run_checks(self.app)
+        names = {r["name"] for r in results}
+        self.assertIn("metrics.latency_series(phases)", names)
+        self.assertIn("metrics.last_poll", names)
+        for r in results:
+            with self.subTest(check=r["name"]):
+                self.assertTrue(r["plans"], "no query on snapshots / events captured")
+                self.assertEqual(r["problems"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Update checker (services/updates.py) against a local stand-in for the GitHub API:
+200 + ETag, revalidation answered 304, failed request.
+"""
+import json
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+
+from app.services import updates
+
+
+class _GitHub(BaseHTTPRequestHandler):
+    etag = '"r1"'
+    fail = False
+    seen: list = []
+
+    def do_GET(self):
+        type(self).seen.append((self.path, self.headers.get("If-None-Match")))
+        if self.fail:
+            self.send_response(502)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.send_header("ETag", self.etag)
+            self.end_headers()
+            return
+        body = json.dumps({"tag_name": "v99.0.0", "body": "notes", "assets": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class UpdateCheckTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _GitHub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.app = SimpleNamespace(config={
+            "GITHUB_REPO": "owner/repo",
+            "GITHUB_API_URL": f"http://127.0.0.1:{cls.server.server_port}",
+            "GITHUB_TOKEN": "",
+            "UPDATE_CHECK_TTL_S": 3600,
+            "UPDATE_CHECK_TIMEOUT_S": 5,
+        })
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _GitHub.fail = False
+        _GitHub.seen = []
+        updates._cache.update(repo=None, info=None, etag=None, fetched_at=None, checked_at=None, error=None)
+        # no proxy from the environment for the local server
+        env = mock.patch.dict(os.environ, {"NO_PROXY": "127.0.0.1", "no_proxy": "127.0.0.1"})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_etag_then_304(self):
+        info = updates.refresh(self.app)
+        self.assertEqual(info.latest_version, "v99.0.0")
+        self.assertTrue(info.has_update)
+        self.assertEqual(updates._cache["etag"], '"r1"')
+        fetched_at = updates._cache["fetched_at"]
+
+        # fresh cache: no request without force
+        updates.refresh(self.app)
+        self.assertEqual(len(_GitHub.seen), 1)
+
+        info = updates.refresh(self.app, force=True)
+        self.assertEqual(_GitHub.seen[-1], ("/repos/owner/repo/releases/latest", '"r1"'))
+        self.assertEqual(info.latest_version, "v99.0.0")
+        self.assertEqual(updates._cache["fetched_at"], fetched_at)  # 304 keeps the cached info
+        self.assertGreaterEqual(updates._cache["checked_at"], fetched_at)
+        self.assertIsNone(updates._cache["error"])
+
+    def test_error_keeps_last_info(self):
+        updates.refresh(self.app)
+        _GitHub.fail = True
+        info = updates.refresh(self.app, force=True)
+        self.assertEqual(info.latest_version, "v99.0.0")
+        self.assertIn("502", updates.cache_state()["error"])
+        self.assertFalse(updates.is_stale(self.app))  # retried after min(TTL, 300s)
+        self.assertEqual(updates.check_update(self.app).latest_version, "v99.0.0")
+
+    def test_error_before_first_fetch(self):
+        _GitHub.fail = True
+        self.assertIsNone(updates.refresh(self.app))
+        with self.assertRaises(RuntimeError) as cm:
+            updates.check_update(self.app)
+        self.assertIn("502", str(cm.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()